@@ -1,12 +1,22 @@
 import streamlit as st
-import time
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from src.logic.scoring import ScoringEngine
-from src.logic.coaching import JSONCoachingEngine
+from src.logic.scoring import ScoringEngine, SYMPTOM_KEYS, get_scoring_engine
+from src.logic.coaching import JSONCoachingEngine, get_profiler, advice_severity
+from src.logic.incremental import IncrementalAssessment
+from src.logic.assessment import Assessment
+from src.logic.adaptive import AdaptiveQuestionnaire
+from src.logic.schema import CHOICE_FIELDS, BOOLEAN_FIELDS, PROMPTS, SCALE_LABELS
+from src.logic.whatif import analyze
+from src.logic.cache import get_shared_cache
+from src.logic.thresholds import get_thresholds
+from src.logic.trace import explain, REQUIRED_MISSING
+from src.metrics import RequestTimer, REGISTRY
+from src.patients import get_patient_tracker
+from src.reports import RISK_LABELS, severity_table, unique_advice
 
 # ============================================
 # 1. PAGE CONFIGURATION & STYLING
@@ -58,21 +68,62 @@ def get_scale_input(label, key, help_text=None):
         help=help_text
     )
 
-def display_confidence_bar(disorder_name, score):
-    # Determine Status
-    if score >= 75:
-        color_bar = ":red" # Streamlit color notation
-        status = "HIGH PROBABILITY"
-    elif score >= 50:
-        color_bar = ":orange"
-        status = "MODERATE RISK"
-    else:
-        color_bar = ":green"
-        status = "LOW RISK"
+# Linear weights unless EXLEEP_SCORING_ENGINE=bayes; the adaptive intake,
+# what-if and incremental live updates reason about the linear weights
+scoring_engine = get_scoring_engine()
+linear_scoring = scoring_engine is ScoringEngine
+# Flag / high-probability cutoffs per disorder (50% / 75% unless configured)
+thresholds = get_thresholds(engine=scoring_engine.name)
+
+def display_confidence_bar(disorder_name, score, bounds=None):
+    # Adaptive intake: skipped symptoms leave a range, both ends in the same band
+    low, high = bounds if bounds is not None else (score, score)
+    # Determine Status (same bands as the CLI and exported reports)
+    status = RISK_LABELS[thresholds.level(disorder_name, low)]
 
     st.markdown(f"**{disorder_name}**")
-    st.progress(int(score))
-    st.caption(f"Confidence: **{score:.1f}%** — {status}")
+    st.progress(int(low))
+    if low == high:
+        st.caption(f"Confidence: **{low:.1f}%** — {status}")
+    else:
+        st.caption(f"Confidence: **{low:.1f}–{high:.1f}%** (questions skipped) — {status}")
+
+def question_input(key):
+    """The widget for one questionnaire key (adaptive intake)."""
+    label = PROMPTS[key]
+    if key in CHOICE_FIELDS:
+        return st.selectbox(label, CHOICE_FIELDS[key], key=f"q_{key}")
+    if key in BOOLEAN_FIELDS:
+        return st.radio(label, ["Yes", "No"], horizontal=True, key=f"q_{key}") == "Yes"
+    low, high = SCALE_LABELS.get(key, ("Never", "Always"))
+    return st.slider(label, 1, 5, 1 if key in SYMPTOM_KEYS else 3, key=f"q_{key}",
+                     help=f"1={low}, 5={high}")
+
+def adaptive_intake():
+    # One question per step; returns the questionnaire once nothing left can change the result
+    intake = st.session_state.get("adaptive_intake")
+    if intake is None:
+        intake = st.session_state["adaptive_intake"] = AdaptiveQuestionnaire(threshold=thresholds)
+
+    key = intake.next_question()
+    if key is None:
+        summary = intake.summary()
+        st.success(f"Intake complete: {summary['asked']} of {summary['total']} questions asked, "
+                   f"the other {summary['skipped']} could not change the result.")
+        if st.button("Start over"):
+            del st.session_state["adaptive_intake"]
+            st.rerun()
+        return intake
+
+    remaining = len(intake.pending())
+    asked = len(intake.asked)
+    st.progress(asked / (asked + remaining), text=f"Question {asked + 1} · at most {remaining - 1} more")
+    with st.form("adaptive_question"):
+        value = question_input(key)
+        if st.form_submit_button("Next", type="primary"):
+            intake.answer(key, value)
+            st.rerun()
+    return None
 
 # ============================================
 # 3. SIDEBAR
@@ -88,6 +139,18 @@ with st.sidebar:
         """
     )
     st.write("---")
+    live_mode = st.toggle("⚡ Live results", help="Update the analysis as you move the sliders.")
+    debug_mode = st.toggle("🔧 Debug timings", help="Show per-stage latency for each analysis.")
+    adaptive_mode = st.toggle("🧭 Adaptive intake", disabled=not linear_scoring,
+                              help="Ask one question at a time, skipping those that can't change the result.")
+    whatif_mode = st.toggle("🔍 What-if analysis", disabled=not linear_scoring,
+                            help="Show the smallest answer changes that would change each result.")
+    explain_mode = st.toggle("🔎 Explain results",
+                             help="Show each answer's contribution and why each piece of advice was or wasn't given.")
+    # Longitudinal tracking is on when EXLEEP_PATIENTS_DIR is set
+    tracker = get_patient_tracker()
+    patient_id = st.text_input("🧑 Patient ID", help="Reassess weekly under the same ID to track progress.") \
+        if tracker is not None else ""
 
 # ============================================
 # 4. MAIN ASSESSMENT FORM
@@ -95,178 +158,351 @@ with st.sidebar:
 st.title("Comprehensive Sleep Assessment")
 st.markdown("### 📝 Patient Intake Form")
 
-with st.form("sleep_assessment_form"):
-
-    # --- TABS FOR CLEANER UI ---
-    tab1, tab2, tab3, tab4 = st.tabs(["👤 Profile", "☕ Habits", "🧠 Health", "🩺 Symptoms"])
-
-    # TAB 1: DEMOGRAPHICS
-    with tab1:
-        col1, col2 = st.columns(2)
-        with col1:
-            gender = st.selectbox("Gender", ["Male", "Female"])
-            age = st.selectbox("Age Group", ["Child", "Adolescent", "Adult", "Elderly"])
-            phys_act = get_scale_input("Physical Activity Level", "act", "1=Sedentary, 5=Athlete")
-        with col2:
-            sleep_hrs = st.selectbox("Average Sleep Duration", ["< 4", "4-6", "6-8", "8-10", "10 <"])
-            shifts = get_scale_input("Work in rotating/night shifts?", "shift")
-            irregular = get_scale_input("Irregular sleep schedule?", "irreg")
-
-    # TAB 2: HABITS
-    with tab2:
-        col3, col4 = st.columns(2)
-        with col3:
-            room_qual = get_scale_input("Room Quality (Dark/Quiet/Cool)", "room", "1=Poor, 5=Perfect")
-            caff_pm = get_scale_input("Caffeine after 6 PM?", "caff")
-            alc_bed = get_scale_input("Alcohol before bed?", "alc")
-        with col4:
-            heavy_meal = get_scale_input("Heavy meals near bedtime?", "meal")
-            tech_int = get_scale_input("Does tech interfere with sleep?", "tech")
-            avoid_scr = get_scale_input("Do you avoid screens before bed?", "scr", "1=Never, 5=Always")
+# Adaptive intake asks one question at a time and skips those that can't change the result
+if adaptive_mode:
+    intake = adaptive_intake()
+    submit_button = intake is not None
+else:
+    intake = None
+    # In live mode the inputs sit in a plain container so every change reruns the script
+    form_container = st.container() if live_mode else st.form("sleep_assessment_form")
+
+    with form_container:
+
+        # --- TABS FOR CLEANER UI ---
+        tab1, tab2, tab3, tab4 = st.tabs(["👤 Profile", "☕ Habits", "🧠 Health", "🩺 Symptoms"])
+
+        # TAB 1: DEMOGRAPHICS
+        with tab1:
+            col1, col2 = st.columns(2)
+            with col1:
+                gender = st.selectbox("Gender", ["Male", "Female"])
+                age = st.selectbox("Age Group", ["Child", "Adolescent", "Adult", "Elderly"])
+                phys_act = get_scale_input("Physical Activity Level", "act", "1=Sedentary, 5=Athlete")
+            with col2:
+                sleep_hrs = st.selectbox("Average Sleep Duration", ["< 4", "4-6", "6-8", "8-10", "10 <"])
+                shifts = get_scale_input("Work in rotating/night shifts?", "shift")
+                irregular = get_scale_input("Irregular sleep schedule?", "irreg")
+
+        # TAB 2: HABITS
+        with tab2:
+            col3, col4 = st.columns(2)
+            with col3:
+                room_qual = get_scale_input("Room Quality (Dark/Quiet/Cool)", "room", "1=Poor, 5=Perfect")
+                caff_pm = get_scale_input("Caffeine after 6 PM?", "caff")
+                alc_bed = get_scale_input("Alcohol before bed?", "alc")
+            with col4:
+                heavy_meal = get_scale_input("Heavy meals near bedtime?", "meal")
+                tech_int = get_scale_input("Does tech interfere with sleep?", "tech")
+                avoid_scr = get_scale_input("Do you avoid screens before bed?", "scr", "1=Never, 5=Always")
         
-        st.divider()
-        c5, c6 = st.columns(2)
-        with c5:
-            naps = get_scale_input("Nap >30 mins during the day?", "naps")
-        with c6:
-            bed_usage = st.radio("Do you use your bed ONLY for sleep?", ["Yes", "No"], horizontal=True)
-            bed_usage_bool = True if bed_usage == "Yes" else False
-
-    # TAB 3: HEALTH
-    with tab3:
-        st.subheader("Mental & Social")
-        col5, col6 = st.columns(2)
-        with col5:
-            stress = get_scale_input("Stress/Racing thoughts at night?", "stress")
-            social_lonely = get_scale_input("Feeling lonely/lack support?", "lonely")
-        with col6:
-            mood = get_scale_input("Mood changes affect sleep?", "mood")
+            st.divider()
+            c5, c6 = st.columns(2)
+            with c5:
+                naps = get_scale_input("Nap >30 mins during the day?", "naps")
+            with c6:
+                bed_usage = st.radio("Do you use your bed ONLY for sleep?", ["Yes", "No"], horizontal=True)
+                bed_usage_bool = True if bed_usage == "Yes" else False
+
+        # TAB 3: HEALTH
+        with tab3:
+            st.subheader("Mental & Social")
+            col5, col6 = st.columns(2)
+            with col5:
+                stress = get_scale_input("Stress/Racing thoughts at night?", "stress")
+                social_lonely = get_scale_input("Feeling lonely/lack support?", "lonely")
+            with col6:
+                mood = get_scale_input("Mood changes affect sleep?", "mood")
         
-        st.subheader("Medical History")
-        m_col1, m_col2, m_col3 = st.columns(3)
-        with m_col1:
-            pain = st.radio("Chronic Pain?", ["No", "Yes"])
-        with m_col2:
-            meds = st.radio("Sleep-altering Meds?", ["No", "Yes"])
-        with m_col3:
-            neuro = st.radio("Neuro/Resp Disorder?", ["No", "Yes"])
-
-        # Boolean conversion
-        pain_bool = True if pain == "Yes" else False
-        meds_bool = True if meds == "Yes" else False
-        neuro_bool = True if neuro == "Yes" else False
-
-    # TAB 4: SYMPTOMS
-    with tab4:
-        st.info("Rate symptom frequency: **1 (Never)** to **5 (Always)**")
-        symptoms = {}
+            st.subheader("Medical History")
+            m_col1, m_col2, m_col3 = st.columns(3)
+            with m_col1:
+                pain = st.radio("Chronic Pain?", ["No", "Yes"])
+            with m_col2:
+                meds = st.radio("Sleep-altering Meds?", ["No", "Yes"])
+            with m_col3:
+                neuro = st.radio("Neuro/Resp Disorder?", ["No", "Yes"])
+
+            # Boolean conversion
+            pain_bool = True if pain == "Yes" else False
+            meds_bool = True if meds == "Yes" else False
+            neuro_bool = True if neuro == "Yes" else False
+
+        # TAB 4: SYMPTOMS
+        with tab4:
+            st.info("Rate symptom frequency: **1 (Never)** to **5 (Always)**")
+            symptoms = {}
         
-        with st.expander("Insomnia Symptoms", expanded=True):
-            cols = st.columns(2)
-            symptoms['insomnia_fall'] = cols[0].slider("Difficulty falling asleep", 1, 5, 1, key="i1")
-            symptoms['insomnia_stay'] = cols[1].slider("Wake up frequently", 1, 5, 1, key="i2")
-            symptoms['insomnia_early'] = cols[0].slider("Wake up too early", 1, 5, 1, key="i3")
-            symptoms['insomnia_tired'] = cols[1].slider("Tired after sleep", 1, 5, 1, key="i4")
-
-        with st.expander("Sleep Apnea Symptoms"):
-            cols = st.columns(2)
-            symptoms['apnea_snore'] = cols[0].slider("Loud Snoring", 1, 5, 1, key="a1")
-            symptoms['apnea_choke'] = cols[1].slider("Wake up choking", 1, 5, 1, key="a2")
-            symptoms['apnea_headache'] = cols[0].slider("Morning Headache", 1, 5, 1, key="a3")
-            symptoms['apnea_sleepy'] = cols[1].slider("Daytime Sleepiness", 1, 5, 1, key="a4")
-
-        with st.expander("Movement (RLS) Symptoms"):
-            cols = st.columns(2)
-            symptoms['rls_urge'] = cols[0].slider("Urge to move legs", 1, 5, 1, key="r1")
-            symptoms['rls_worse_night'] = cols[1].slider("Worse at night", 1, 5, 1, key="r2")
-            symptoms['rls_move_help'] = cols[0].slider("Movement helps", 1, 5, 1, key="r3")
-
-        with st.expander("Narcolepsy Symptoms"):
-            cols = st.columns(2)
-            symptoms['narco_attack'] = cols[0].slider("Sleep Attacks", 1, 5, 1, key="n1")
-            symptoms['narco_cata'] = cols[1].slider("Muscle Weakness", 1, 5, 1, key="n2")
-            symptoms['narco_hallu'] = cols[0].slider("Hallucinations", 1, 5, 1, key="n3")
-            symptoms['narco_paralysis'] = cols[1].slider("Sleep Paralysis", 1, 5, 1, key="n4")
-
-        with st.expander("Circadian Rhythm (CRSD)"):
-            cols = st.columns(2)
-            symptoms['crsd_timing'] = cols[0].slider("Sleep times off-schedule", 1, 5, 1, key="c1")
-            symptoms['crsd_social'] = cols[1].slider("Struggle with social hours", 1, 5, 1, key="c2")
-            symptoms['crsd_alert_night'] = cols[0].slider("Alert at night", 1, 5, 1, key="c3")
-
-        with st.expander("Parasomnia"):
-            cols = st.columns(2)
-            symptoms['para_act'] = cols[0].slider("Sleepwalking", 1, 5, 1, key="p1")
-            symptoms['para_nightmare'] = cols[1].slider("Nightmares", 1, 5, 1, key="p2")
-            symptoms['para_dream'] = cols[0].slider("Act out dreams", 1, 5, 1, key="p3")
-
-    # --- SUBMIT ---
-    st.write("")
-    submit_button = st.form_submit_button("Generate Analysis", type="primary")
+            with st.expander("Insomnia Symptoms", expanded=True):
+                cols = st.columns(2)
+                symptoms['insomnia_fall'] = cols[0].slider("Difficulty falling asleep", 1, 5, 1, key="i1")
+                symptoms['insomnia_stay'] = cols[1].slider("Wake up frequently", 1, 5, 1, key="i2")
+                symptoms['insomnia_early'] = cols[0].slider("Wake up too early", 1, 5, 1, key="i3")
+                symptoms['insomnia_tired'] = cols[1].slider("Tired after sleep", 1, 5, 1, key="i4")
+
+            with st.expander("Sleep Apnea Symptoms"):
+                cols = st.columns(2)
+                symptoms['apnea_snore'] = cols[0].slider("Loud Snoring", 1, 5, 1, key="a1")
+                symptoms['apnea_choke'] = cols[1].slider("Wake up choking", 1, 5, 1, key="a2")
+                symptoms['apnea_headache'] = cols[0].slider("Morning Headache", 1, 5, 1, key="a3")
+                symptoms['apnea_sleepy'] = cols[1].slider("Daytime Sleepiness", 1, 5, 1, key="a4")
+
+            with st.expander("Movement (RLS) Symptoms"):
+                cols = st.columns(2)
+                symptoms['rls_urge'] = cols[0].slider("Urge to move legs", 1, 5, 1, key="r1")
+                symptoms['rls_worse_night'] = cols[1].slider("Worse at night", 1, 5, 1, key="r2")
+                symptoms['rls_move_help'] = cols[0].slider("Movement helps", 1, 5, 1, key="r3")
+
+            with st.expander("Narcolepsy Symptoms"):
+                cols = st.columns(2)
+                symptoms['narco_attack'] = cols[0].slider("Sleep Attacks", 1, 5, 1, key="n1")
+                symptoms['narco_cata'] = cols[1].slider("Muscle Weakness", 1, 5, 1, key="n2")
+                symptoms['narco_hallu'] = cols[0].slider("Hallucinations", 1, 5, 1, key="n3")
+                symptoms['narco_paralysis'] = cols[1].slider("Sleep Paralysis", 1, 5, 1, key="n4")
+
+            with st.expander("Circadian Rhythm (CRSD)"):
+                cols = st.columns(2)
+                symptoms['crsd_timing'] = cols[0].slider("Sleep times off-schedule", 1, 5, 1, key="c1")
+                symptoms['crsd_social'] = cols[1].slider("Struggle with social hours", 1, 5, 1, key="c2")
+                symptoms['crsd_alert_night'] = cols[0].slider("Alert at night", 1, 5, 1, key="c3")
+
+            with st.expander("Parasomnia"):
+                cols = st.columns(2)
+                symptoms['para_act'] = cols[0].slider("Sleepwalking", 1, 5, 1, key="p1")
+                symptoms['para_nightmare'] = cols[1].slider("Nightmares", 1, 5, 1, key="p2")
+                symptoms['para_dream'] = cols[0].slider("Act out dreams", 1, 5, 1, key="p3")
+
+        # --- SUBMIT ---
+        st.write("")
+        if live_mode:
+            submit_button = True
+        else:
+            submit_button = st.form_submit_button("Generate Analysis", type="primary")
 
 # ============================================
 # 5. LOGIC PROCESSING & OUTPUT
 # ============================================
 if submit_button:
-    with st.spinner("Analyzing sleep architecture..."):
-        time.sleep(0.8) # Simulated logic delay
+    timer = RequestTimer("assess")
+    patient = None
 
+    with st.spinner("Analyzing sleep architecture..."):
         # 1. Prepare User Data
-        user_data = {
-            "gender": gender, "age": age,
-            "sleep_hrs": sleep_hrs, "irregular": irregular,
-            "work_shift": shifts, "physical_activity": phys_act,
-            "room_quality": room_qual, "heavy_meal": heavy_meal,
-            "caffeine_pm": caff_pm, "alcohol_bed": alc_bed,
-            "tech_interferes": tech_int, "avoid_scr": avoid_scr,
-            "naps": naps, "bed_usage": bed_usage_bool,
-            "social_lonely": social_lonely, "mental_stress": stress,
-            "mood_change": mood,
-            "chronic_pain": pain_bool, 
-            "medication_sleep": meds_bool, 
-            "diagnosed_neuro_resp": neuro_bool
-        }
+        with timer.stage("user_data"):
+            if intake is not None:
+                # Skipped questions stay unanswered
+                symptoms, user_data = intake.completed()
+            else:
+                user_data = {
+                    "gender": gender, "age": age,
+                    "sleep_hrs": sleep_hrs, "irregular": irregular,
+                    "work_shift": shifts, "physical_activity": phys_act,
+                    "room_quality": room_qual, "heavy_meal": heavy_meal,
+                    "caffeine_pm": caff_pm, "alcohol_bed": alc_bed,
+                    "tech_interferes": tech_int, "avoid_scr": avoid_scr,
+                    "naps": naps, "bed_usage": bed_usage_bool,
+                    "social_lonely": social_lonely, "mental_stress": stress,
+                    "mood_change": mood,
+                    "chronic_pain": pain_bool, 
+                    "medication_sleep": meds_bool, 
+                    "diagnosed_neuro_resp": neuro_bool
+                }
+            assessment = Assessment.from_dicts(symptoms, user_data)
 
         # 2. Logic Engines
-        scores = ScoringEngine.calculate_confidence(symptoms)
-        active_diagnoses = [d for d, s in scores.items() if s >= 50.0]
-        coach = JSONCoachingEngine()
-        advice_list = coach.evaluate(user_data, active_diagnoses)
+        cached = None
+        score_bounds = {}
+        if intake is not None:
+            # Scores of disorders with skipped symptoms are only known as ranges
+            st.session_state.pop("live_assessment", None)
+            with timer.stage("adaptive_result"):
+                cached = intake.result()
+            scores = cached["scores"]
+            score_bounds = cached["score_bounds"]
+            active_diagnoses = cached["active_diagnoses"]
+            advice_list = cached["advice"]
+        elif live_mode and linear_scoring:
+            # Only rescore/re-run what the changed answers touch
+            with timer.stage("incremental"):
+                live = st.session_state.get("live_assessment")
+                if live is None:
+                    live = IncrementalAssessment(symptoms, user_data, threshold=thresholds)
+                    st.session_state["live_assessment"] = live
+                else:
+                    live.update_many({**symptoms, **user_data})
+                scores = live.scores
+                active_diagnoses = live.active_diagnoses
+                advice_list = live.advice
+        else:
+            st.session_state.pop("live_assessment", None)
+            # Exact repeats (default sliders, resubmits) come from the shared cache
+            cache = get_shared_cache()
+            with timer.stage("cache_lookup"):
+                cache_key = assessment.packed  # same 21 bytes canonical_key() produces
+                cached = cache.get(cache_key)
+            if cached is not None:
+                scores = cached["scores"]
+                active_diagnoses = cached["active_diagnoses"]
+                advice_list = cached["advice"]
+            else:
+                with timer.stage("scoring"):
+                    scores = scoring_engine.calculate_confidence(assessment)
+                with timer.stage("thresholding"):
+                    active_diagnoses = thresholds.active(scores)
+                with timer.stage("coaching"):
+                    coach = JSONCoachingEngine()
+                    # Snapshot first: the cache drops results of a superseded rule set
+                    rule_set = coach.refresh()
+                    fired_rules = coach.evaluate_rules(assessment, active_diagnoses)
+                    advice_list = [rule.advice for rule in fired_rules]
+                cached = {
+                    "scores": scores,
+                    "active_diagnoses": active_diagnoses,
+                    "advice_ids": [rule.id for rule in fired_rules],
+                    "advice": advice_list,
+                }
+                cache.put(cache_key, cached, rule_set)
+
+        # A finished intake returns its result on every later rerun: save it only once
+        already_saved = intake is not None and st.session_state.get("persisted_intake") is intake
+        if cached is not None and not already_saved:
+            if intake is not None:
+                st.session_state["persisted_intake"] = intake
+            # Persist the submission when EXLEEP_HISTORY_DIR is set
+            # (imported here: the store pulls in NumPy, which startup doesn't need)
+            if os.environ.get("EXLEEP_HISTORY_DIR"):
+                from src.history_store import get_history_store
+                with timer.stage("persist"):
+                    get_history_store().append(assessment, cached)
+
+            if tracker is not None and patient_id.strip():
+                with timer.stage("patient_trend"):
+                    patient = tracker.record(patient_id.strip(), cached)
+        elif already_saved and tracker is not None and patient_id.strip():
+            patient = tracker.trend(patient_id.strip())
 
     # --- DISPLAY RESULTS ---
-    st.divider()
-    st.title("Analysis Report")
-
-    # Use 2 columns for results (Works better with layout="wide")
-    res_col1, res_col2 = st.columns([1, 1.2])
-
-    with res_col1:
-        with st.container(border=True): # Use native Streamlit container instead of HTML
-            st.subheader("Diagnostic Risk Profile")
-            st.caption("Weighted probabilities based on symptom severity.")
-            st.write("")
-            for disorder, score in scores.items():
-                display_confidence_bar(disorder, score)
-
-    with res_col2:
-        with st.container(border=True):
-            st.subheader("📋 Coach Recommendations")
-            
-            if active_diagnoses:
-                st.error(f"⚠️ Potential Clinical Flags: {', '.join(active_diagnoses)}")
-            else:
-                st.success("✅ No major clinical disorders detected.")
-
-            st.write("---")
-            
-            if advice_list:
-                unique_advice = sorted(list(set(advice_list)))
-                for item in unique_advice:
-                    if "MEDICAL" in item or "CRITICAL" in item:
-                        st.error(item)
-                    elif "FIX" in item:
-                        st.warning(item)
-                    else:
-                        st.info(item)
-            else:
-                st.success("Your sleep habits are optimized! No specific corrections needed.")
\ No newline at end of file
+    with timer.stage("render"):
+        st.divider()
+        st.title("Analysis Report")
+
+        # Use 2 columns for results (Works better with layout="wide")
+        res_col1, res_col2 = st.columns([1, 1.2])
+
+        with res_col1:
+            with st.container(border=True): # Use native Streamlit container instead of HTML
+                st.subheader("Diagnostic Risk Profile")
+                st.caption("Weighted probabilities based on symptom severity.")
+                st.write("")
+                for disorder, score in scores.items():
+                    display_confidence_bar(disorder, score, score_bounds.get(disorder))
+
+        with res_col2:
+            with st.container(border=True):
+                st.subheader("📋 Coach Recommendations")
+                
+                if active_diagnoses:
+                    st.error(f"⚠️ Potential Clinical Flags: {', '.join(active_diagnoses)}")
+                else:
+                    st.success("✅ No major clinical disorders detected.")
+
+                st.write("---")
+                
+                if advice_list:
+                    # Severity was classified once per rule when the rules were compiled
+                    severities = severity_table()
+                    show = {"critical": st.error, "warning": st.warning, "info": st.info}
+                    for item in unique_advice(advice_list):
+                        show[severities.get(item) or advice_severity(item)](item)
+                else:
+                    st.success("Your sleep habits are optimized! No specific corrections needed.")
+
+        # Progress since the patient's earlier assessments (running summary, no rescan)
+        if patient is not None and patient.entries > 1:
+            with st.container(border=True):
+                st.subheader(f"📈 Progress ({patient.entries} assessments)")
+                columns = st.columns(3)
+                for i, (disorder, trend) in enumerate(patient.disorders.items()):
+                    if trend.last is None:
+                        continue  # only ranges so far (adaptive intakes)
+                    columns[i % 3].metric(disorder, f"{trend.last:.1f}%", f"{trend.ewma_delta:+.1f} pts",
+                                          delta_color="inverse",
+                                          help=f"Average {trend.mean:.1f}% · {trend.direction} · "
+                                               f"{trend.streak} in a row above the flag threshold")
+                if patient.gained or patient.lost:
+                    st.caption(f"New advice: {', '.join(patient.gained) or '-'} · "
+                               f"No longer needed: {', '.join(patient.lost) or '-'}")
+
+        # What-if and explanations start from a full set of answers
+        if (whatif_mode or explain_mode) and intake is not None:
+            st.caption("What-if analysis and explanations need every answer; "
+                       "they are off for adaptive intakes.")
+
+        # Smallest answer changes that cross a flag / high cutoff or change the advice
+        if whatif_mode and intake is None:
+            with timer.stage("whatif"):
+                analysis = analyze(symptoms, user_data, threshold=thresholds)
+
+            def describe(option):
+                return " and ".join(f"`{c['key']}` {c['from']} → {c['to']}" for c in option["changes"])
+
+            with st.expander("🔍 What would change this result?", expanded=True):
+                for disorder, bounds in analysis["boundaries"].items():
+                    lines = []
+                    for boundary, option in bounds.items():
+                        best = option["single"] or option["double"]
+                        if best:
+                            lines.append(f"- to {option['direction']} {float(boundary):g}%: "
+                                         f"{describe(best[0])} ({best[0]['score']:.1f}%)")
+                    if lines:
+                        st.markdown(f"**{disorder}** — {scores[disorder]:.1f}%\n" + "\n".join(lines))
+                advice_options = analysis["advice"]["single"] or analysis["advice"]["double"]
+                if advice_options:
+                    st.markdown("**Advice**\n" + "\n".join(
+                        f"- {describe(o)}: +{', '.join(o['advice_added']) or '-'} / "
+                        f"−{', '.join(o['advice_removed']) or '-'}" for o in advice_options))
+
+        # Per-answer contributions and rule outcomes (a separate pass; off by default)
+        if explain_mode and intake is None:
+            with timer.stage("trace"):
+                coach = JSONCoachingEngine()
+                trace = explain(assessment, coach, thresholds, scoring_engine)
+            with st.expander("🔎 Why these results?", expanded=True):
+                for disorder, (score, flag, high, _) in trace.disorders.items():
+                    st.markdown(f"**{disorder}** — {score:.1f}% (flag {flag:g}%, high {high:g}%)")
+                    st.dataframe([{"answer": key, "value": "" if answer is None else str(answer),
+                                   trace.units: round(value, 2)}
+                                  for key, answer, value in trace.contributions(disorder)],
+                                 use_container_width=True, hide_index=True)
+                rules = {rule.id: rule for rule in coach.compiled_rules}
+                st.markdown(f"**Rules** — {len(trace.fired)} fired of {trace.evaluated}")
+                st.markdown("\n".join(f"- ✅ `{rule_id}`: {rules[rule_id].advice}" for rule_id in trace.fired)
+                            or "No rule fired.")
+                if trace.suppressed:
+                    st.markdown("\n".join(
+                        f"- ⛔ `{rule_id}`: condition met, but "
+                        + (f"requires {diagnosis} (not flagged)" if reason == REQUIRED_MISSING
+                           else f"blocked by {diagnosis} (flagged)")
+                        for rule_id, reason, diagnosis in trace.suppressed))
+                st.download_button("Download trace (JSON)", trace.to_json(indent=2),
+                                   file_name="exleep_trace.json", mime="application/json")
+
+    timer.finish()
+
+    # --- DEBUG PANEL (opt-in) ---
+    if debug_mode:
+        with st.sidebar:
+            st.subheader("⏱️ Stage timings")
+            st.caption("This request (ms)")
+            st.table({"stage": list(timer.as_ms()), "ms": list(timer.as_ms().values())})
+            st.caption("All requests in this process")
+            st.json(REGISTRY.snapshot(), expanded=False)
+            st.caption("Result cache")
+            st.json(get_shared_cache().stats(), expanded=False)
+            profiler = get_profiler()
+            if profiler is not None:
+                st.caption("Coaching rule profile (EXLEEP_PROFILE_RULES)")
+                st.dataframe([{"rule": rule_id, **row} for rule_id, row in profiler.snapshot().items()],
+                             use_container_width=True)
+                if st.button("Reset rule profile"):
+                    profiler.reset()
@@ -0,0 +1,411 @@
+# benchmarks/load.py
+"""
+Load test for one Streamlit replica: how many concurrent sessions app.py
+handles before rerun latency degrades.
+
+    python -m benchmarks.load                          # ramp 1, 2, 4, ... 32 sessions
+    python -m benchmarks.load --sessions 1,8,64 --reruns 30 -o load.json
+    python -m benchmarks.load --toggle "What-if" --compare load.json
+    python -m benchmarks.load --url localhost:8501     # an already running replica
+
+The harness starts `streamlit run app.py` (headless, on a free port) and
+drives it like browsers do: every session opens its own websocket, runs
+the script once, then submits the assessment form --reruns times with
+seeded random answers, back to back (closed loop, or --think-ms apart).
+Each level of concurrency reports:
+
+    rerun latency      p50 / p90 / p95 / p99 / max, from submit to script end
+    throughput         completed reruns per second across all sessions
+    memory             replica RSS, and its growth per connected session
+    cpu                replica CPU time per rerun
+
+The knee is the highest level whose p95 stays within --knee-factor times
+the p95 of the lowest level. Results are written as JSON (-o, default
+benchmarks/results/load-<commit>.json) so replica sizing can be compared
+across code changes with --compare. Memory and CPU are read from /proc and
+only reported for a replica the harness started itself, on Linux.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+DEFAULT_LEVELS = (1, 2, 4, 8, 16, 32)
+SUBMIT_LABEL = "Generate Analysis"
+RESULT_HEADING = "Analysis Report"
+PERCENTILES = (50, 90, 95, 99)
+
+
+# ============================================
+# 1. REPLICA
+# ============================================
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Replica:
+    """`streamlit run app.py` in a child process, stopped on exit."""
+
+    def __init__(self, script="app.py", port=None, startup_timeout=60):
+        self.port = port or _free_port()
+        self.address = f"localhost:{self.port}"
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", script, "--server.headless", "true",
+             "--server.port", str(self.port), "--browser.gatherUsageStats", "false",
+             "--server.fileWatcherType", "none"],
+            cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"streamlit exited with code {self.process.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://{self.address}/_stcore/health", timeout=1):
+                    return
+            except OSError:
+                time.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f"streamlit did not become healthy within {startup_timeout}s")
+
+    def rss_bytes(self):
+        """Resident memory of the replica (Linux), else None."""
+        try:
+            with open(f"/proc/{self.process.pid}/status", encoding="ascii") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return None
+
+    def cpu_seconds(self):
+        """User + system CPU time of the replica (Linux), else None."""
+        try:
+            with open(f"/proc/{self.process.pid}/stat", encoding="ascii") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# ============================================
+# 2. SESSIONS
+# ============================================
+# A session speaks Streamlit's browser protocol: BackMsg.rerun_script with
+# the current widget states up, ForwardMsg deltas until script_finished down.
+
+_WIDGET_TYPES = ("slider", "selectbox", "radio", "button", "checkbox")
+
+
+class Session:
+    def __init__(self, address, seed, toggles=(), timeout=60):
+        self.url = f"ws://{address}/_stcore/stream"
+        self.rng = random.Random(seed)
+        self.toggles = toggles
+        self.timeout = timeout
+        self.widgets = {}  # widget id -> (element type, proto)
+        self.ws = None
+
+    async def connect(self):
+        import websockets  # installed with streamlit
+        self.ws = await websockets.connect(self.url, subprotocols=["streamlit"], max_size=None)
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+    async def rerun(self, states=()):
+        """One script run. Returns (seconds, headings rendered, error or None)."""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.page_script_hash = ""
+        msg.rerun_script.widget_states.widgets.extend(states)
+        headings = []
+        error = None
+        t0 = time.perf_counter()
+        await self.ws.send(msg.SerializeToString())
+        while True:
+            reply = ForwardMsg()
+            reply.ParseFromString(await asyncio.wait_for(self.ws.recv(), self.timeout))
+            kind = reply.WhichOneof("type")
+            if kind == "delta" and reply.delta.WhichOneof("type") == "new_element":
+                element = reply.delta.new_element
+                element_type = element.WhichOneof("type")
+                if element_type in _WIDGET_TYPES:
+                    widget = getattr(element, element_type)
+                    self.widgets[widget.id] = (element_type, widget)
+                elif element_type == "heading":
+                    headings.append(element.heading.body)
+                elif element_type == "exception":
+                    error = error or element.exception.message
+            elif kind == "script_finished":
+                if reply.script_finished != reply.FINISHED_SUCCESSFULLY:
+                    error = error or f"script finished with status {reply.script_finished}"
+                return time.perf_counter() - t0, headings, error
+
+    def random_form(self):
+        """Widget states for a form submission with random answers."""
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        states = []
+        for widget_id, (element_type, widget) in self.widgets.items():
+            state = WidgetState(id=widget_id)
+            if element_type == "checkbox":
+                if not any(label in widget.label for label in self.toggles):
+                    continue
+                state.bool_value = True
+            elif not widget.form_id:
+                continue
+            elif element_type == "slider":
+                state.double_array_value.data.append(self.rng.randint(int(widget.min), int(widget.max)))
+            elif element_type in ("selectbox", "radio"):
+                state.string_value = self.rng.choice(list(widget.options))
+            elif element_type == "button" and widget.label == SUBMIT_LABEL:
+                state.trigger_value = True
+            else:
+                continue
+            states.append(state)
+        return states
+
+
+async def run_session(address, seed, reruns, think, toggles, timeout, samples):
+    """Drives one session; appends rerun latencies / errors to samples."""
+    session = Session(address, seed, toggles, timeout)
+    try:
+        t0 = time.perf_counter()
+        await session.connect()
+        _, _, error = await session.rerun()
+        samples["start"].append(time.perf_counter() - t0)
+        if error:
+            samples["errors"].append(error)
+            return session
+        for _ in range(reruns):
+            elapsed, headings, error = await session.rerun(session.random_form())
+            if error is None and RESULT_HEADING not in headings:
+                error = "no results rendered"
+            if error:
+                samples["errors"].append(error)
+            else:
+                samples["latency"].append(elapsed)
+            if think:
+                await asyncio.sleep(think)
+    except Exception as e:  # timeouts, refused connections, websockets.ConnectionClosed
+        samples["errors"].append(f"{type(e).__name__}: {e}")
+    return session
+
+
+# ============================================
+# 3. LEVELS AND REPORT
+# ============================================
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+async def _run_level(address, sessions, reruns, think, toggles, timeout, seed, replica):
+    samples = {"latency": [], "start": [], "errors": []}
+    rss_before = replica.rss_bytes() if replica else None
+    cpu_before = replica.cpu_seconds() if replica else None
+    t0 = time.perf_counter()
+    open_sessions = await asyncio.gather(*(
+        run_session(address, seed * 100003 + i, reruns, think, toggles, timeout, samples)
+        for i in range(sessions)))
+    wall = time.perf_counter() - t0
+    # Measured while every session is still connected
+    rss_after = replica.rss_bytes() if replica else None
+    cpu_after = replica.cpu_seconds() if replica else None
+    await asyncio.gather(*(s.close() for s in open_sessions), return_exceptions=True)
+
+    latency = sorted(samples["latency"])
+    level = {
+        "sessions": sessions,
+        "reruns": len(latency),
+        "errors": len(samples["errors"]),
+        "throughput_per_s": len(latency) / wall if wall else 0.0,
+        "start_p50_ms": statistics.median(samples["start"]) * 1e3 if samples["start"] else None,
+    }
+    for p in PERCENTILES:
+        value = percentile(latency, p)
+        level[f"p{p}_ms"] = value * 1e3 if value is not None else None
+    level["max_ms"] = latency[-1] * 1e3 if latency else None
+    if rss_after is not None:
+        level["rss_mb"] = rss_after / 2 ** 20
+        level["per_session_kb"] = (rss_after - rss_before) / sessions / 1024
+    if cpu_after is not None and latency:
+        level["cpu_ms_per_rerun"] = (cpu_after - cpu_before) / len(latency) * 1e3
+    if samples["errors"]:
+        level["first_error"] = samples["errors"][0]
+    return level
+
+
+def find_knee(levels, factor):
+    """Highest level whose p95 stays within factor x the lowest level's p95."""
+    measured = [lvl for lvl in levels if lvl["p95_ms"] is not None]
+    if not measured:
+        return None
+    limit = measured[0]["p95_ms"] * factor
+    knee = measured[0]["sessions"]
+    for lvl in measured[1:]:
+        if lvl["p95_ms"] > limit or lvl["errors"]:
+            break
+        knee = lvl["sessions"]
+    return knee
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_test(levels=DEFAULT_LEVELS, reruns=20, think_ms=0, toggles=(), knee_factor=2.0,
+              address=None, seed=0, timeout=60, progress=None):
+    """Runs every level against one replica and returns the report dict."""
+    replica = None if address else Replica()
+    try:
+        address = address or replica.address
+        # One throwaway session first, so lazy imports and caches don't count against level 1
+        asyncio.run(_run_level(address, 1, 1, 0, tuple(toggles), timeout, seed + 1, None))
+        results = []
+        for sessions in levels:
+            level = asyncio.run(_run_level(address, sessions, reruns, think_ms / 1e3, tuple(toggles),
+                                           timeout, seed, replica))
+            results.append(level)
+            if progress:
+                progress(level)
+    finally:
+        if replica is not None:
+            replica.stop()
+
+    peak = max(results, key=lambda lvl: lvl["throughput_per_s"])
+    return {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "settings": {k: v for k, v in os.environ.items() if k.startswith("EXLEEP_")},
+        "options": {"reruns": reruns, "think_ms": think_ms, "toggles": list(toggles),
+                    "knee_factor": knee_factor, "seed": seed},
+        "levels": results,
+        "knee_sessions": find_knee(results, knee_factor),
+        "peak_throughput_per_s": peak["throughput_per_s"],
+        "peak_throughput_sessions": peak["sessions"],
+    }
+
+
+def _fmt(value, spec=",.1f"):
+    return "-" if value is None else format(value, spec)
+
+
+def format_level(lvl):
+    return (f"{lvl['sessions']:>5} sessions  {lvl['reruns']:>6} reruns  {lvl['errors']:>3} errors  "
+            f"p50 {_fmt(lvl['p50_ms'])}  p95 {_fmt(lvl['p95_ms'])}  p99 {_fmt(lvl['p99_ms'])} ms  "
+            f"{_fmt(lvl['throughput_per_s'])}/s  rss {_fmt(lvl.get('rss_mb'))} MB  "
+            f"{_fmt(lvl.get('per_session_kb'), '+,.0f')} KB/session  "
+            f"cpu {_fmt(lvl.get('cpu_ms_per_rerun'))} ms/rerun")
+
+
+def format_comparison(report, previous):
+    """Per-level p95 and throughput against an earlier report."""
+    before = {lvl["sessions"]: lvl for lvl in previous["levels"]}
+    lines = [f"vs {previous.get('commit') or 'previous run'}: knee {previous.get('knee_sessions')} -> "
+             f"{report['knee_sessions']} sessions, peak {_fmt(previous.get('peak_throughput_per_s'))} -> "
+             f"{_fmt(report['peak_throughput_per_s'])} reruns/s"]
+    for lvl in report["levels"]:
+        old = before.get(lvl["sessions"])
+        if old is None or old["p95_ms"] is None or lvl["p95_ms"] is None:
+            continue
+        lines.append(f"{lvl['sessions']:>5} sessions  p95 {old['p95_ms']:,.1f} -> {lvl['p95_ms']:,.1f} ms "
+                     f"({(lvl['p95_ms'] - old['p95_ms']) / old['p95_ms']:+.0%})  throughput "
+                     f"{old['throughput_per_s']:,.1f} -> {lvl['throughput_per_s']:,.1f}/s")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for the Streamlit app.")
+    parser.add_argument("--sessions", default=",".join(map(str, DEFAULT_LEVELS)),
+                        help="comma-separated concurrency levels (default: 1,2,4,8,16,32)")
+    parser.add_argument("--reruns", type=int, default=20, help="form submissions per session")
+    parser.add_argument("--think-ms", type=float, default=0, help="pause between a session's submissions")
+    parser.add_argument("--toggle", action="append", default=[],
+                        help="turn on sidebar toggles whose label contains this text (repeatable)")
+    parser.add_argument("--knee-factor", type=float, default=2.0,
+                        help="p95 growth over the lowest level that counts as degraded (default: 2.0)")
+    parser.add_argument("--url", help="host:port of a running replica instead of starting one")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for one rerun")
+    parser.add_argument("-o", "--output", help="results file (default: benchmarks/results/load-<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        levels = sorted({int(n) for n in args.sessions.split(",") if n.strip()})
+    except ValueError:
+        parser.error("--sessions expects comma-separated numbers")
+    if not levels or levels[0] < 1:
+        parser.error("--sessions needs at least one level of 1 or more")
+
+    report = load_test(levels, args.reruns, args.think_ms, args.toggle, args.knee_factor, args.url,
+                       args.seed, args.timeout, progress=None if args.json else lambda l: print(format_level(l)))
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{report['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"\nKnee: {report['knee_sessions']} concurrent sessions (p95 within {args.knee_factor:g}x of "
+              f"{levels[0]} session{'s' if levels[0] > 1 else ''}); peak "
+              f"{report['peak_throughput_per_s']:,.1f} reruns/s at {report['peak_throughput_sessions']} sessions")
+        print(f"Results written to {output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print(format_comparison(report, json.load(f)))
+    return 1 if any(lvl["errors"] for lvl in report["levels"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
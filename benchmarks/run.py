@@ -0,0 +1,222 @@
+# benchmarks/run.py
+"""
+Benchmarks for the scoring and coaching hot paths, with regression gates.
+
+    python -m benchmarks.run                    # run and compare to baseline.json
+    python -m benchmarks.run --update-baseline  # store the current numbers
+    python -m benchmarks.run --quick            # smaller inputs, for a smoke run
+
+All inputs come from seeded generators (src/synthetic.py), so every run
+measures exactly the same assessments and rule sets. The exit code is 1 when
+any metric is worse than the baseline by more than --tolerance.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from src.logic.scoring import ScoringEngine
+from src.logic.coaching import JSONCoachingEngine, RuleIndex
+from src.logic.pipeline import active_diagnoses, assess_batch
+from src.calibration import calibrate
+from src.synthetic import generate_assessments, labeled_matrix, symptom_matrix, synthetic_rules
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+# ============================================
+# 1. MEASUREMENT HELPERS
+# ============================================
+
+def time_per_call(fn, args_list, repeats=5):
+    """Best-of-repeats mean seconds per call of fn(*args) over args_list."""
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        for args in args_list:
+            fn(*args)
+        best = min(best, (time.perf_counter() - t0) / len(args_list))
+    return best
+
+
+def peak_bytes_per_call(fn, args_list):
+    """Mean peak of traced allocations made during a single call."""
+    tracemalloc.start()
+    total = 0
+    try:
+        for args in args_list:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            fn(*args)
+            total += tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return total / len(args_list)
+
+
+def _scan(rules, person_data, diagnoses):
+    """The unindexed evaluation path: every rule's predicate, then its context."""
+    return [rule for rule in rules if rule.predicate(person_data) and rule.context_met(diagnoses)]
+
+
+def _engine_with_rules(rules, directory):
+    path = os.path.join(directory, f"rules_{len(rules)}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(rules, f)
+    return JSONCoachingEngine(path)
+
+
+# ============================================
+# 2. BENCHMARKS
+# ============================================
+# Each returns {metric name: (value, unit, higher_is_better)}
+
+def bench_scoring(n_single, n_batch):
+    samples = [(symptoms,) for symptoms, _ in generate_assessments(n_single, seed=1)]
+    matrix = symptom_matrix(n_batch, seed=2)
+
+    t0 = time.perf_counter()
+    ScoringEngine.calculate_confidence_batch(matrix)
+    batch_elapsed = time.perf_counter() - t0
+
+    return {
+        "scoring.single_us": (time_per_call(ScoringEngine.calculate_confidence, samples) * 1e6, "us/call", False),
+        "scoring.single_bytes": (peak_bytes_per_call(ScoringEngine.calculate_confidence, samples[:200]), "bytes/call", False),
+        "scoring.table_us": (time_per_call(ScoringEngine.calculate_confidence_table, samples) * 1e6, "us/call", False),
+        "scoring.batch_rows_per_s": (n_batch / batch_elapsed, "rows/s", True),
+    }
+
+
+def bench_coaching(n_single, rule_counts, tmpdir):
+    cases = []
+    for symptoms, user_data in generate_assessments(n_single, seed=3):
+        diagnoses = active_diagnoses(ScoringEngine.calculate_confidence(symptoms))
+        cases.append((user_data, diagnoses))
+
+    results = {}
+    engines = {"kb": JSONCoachingEngine()}
+    for count in rule_counts:
+        engines[f"{count // 1000}k"] = _engine_with_rules(synthetic_rules(count, seed=4), tmpdir)
+
+    for label, engine in engines.items():
+        # Fewer calls for the big rule sets so the run stays short
+        size = len(engine.compiled_rules)
+        calls = cases if size < 1000 else cases[:max(100, len(cases) * 100 // size)]
+        results[f"coaching.{label}.single_us"] = (time_per_call(engine.evaluate, calls) * 1e6, "us/call", False)
+        results[f"coaching.{label}.single_bytes"] = (peak_bytes_per_call(engine.evaluate, calls[:50]), "bytes/call", False)
+
+        # Large rule sets are evaluated through a RuleIndex: time it against a plain scan
+        rule_set = engine.refresh()
+        if rule_set.index is None:
+            continue
+        gc.collect()  # the build allocates heavily: keep collector pauses out of the number
+        gc.disable()
+        try:
+            build = time_per_call(RuleIndex, [(rule_set.compiled,)], repeats=15)
+        finally:
+            gc.enable()
+        results[f"coaching.{label}.index_build_ms"] = (build * 1e3, "ms", False)
+        results[f"coaching.{label}.indexed_us"] = (time_per_call(rule_set.index.evaluate, calls) * 1e6, "us/call", False)
+        scan_calls = [(rule_set.compiled, *args) for args in calls]
+        results[f"coaching.{label}.scan_us"] = (time_per_call(_scan, scan_calls) * 1e6, "us/call", False)
+    return results
+
+
+def bench_pipeline(n_bulk):
+    records = list(generate_assessments(n_bulk, seed=5))
+    coach = JSONCoachingEngine()
+    t0 = time.perf_counter()
+    assess_batch(records, coach)
+    return {"pipeline.bulk_per_s": (n_bulk / (time.perf_counter() - t0), "assessments/s", True)}
+
+
+def bench_calibration(n_rows):
+    answers, labels = labeled_matrix(n_rows, seed=6)
+    t0 = time.perf_counter()
+    calibrate(answers, labels)
+    return {"calibration.rows_per_s": (n_rows / (time.perf_counter() - t0), "rows/s", True)}
+
+
+def run_all(quick=False):
+    scale = 10 if quick else 1
+    rule_counts = (1000,) if quick else (1000, 10000)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        results.update(bench_scoring(20000 // scale, 200000 // scale))
+        results.update(bench_coaching(5000 // scale, rule_counts, tmpdir))
+        results.update(bench_pipeline(20000 // scale))
+        results.update(bench_calibration(1000000 // scale))
+    return results
+
+
+# ============================================
+# 3. BASELINE GATE
+# ============================================
+
+def compare(results, baseline, tolerance):
+    """Returns a list of (name, current, baseline, change) regressions."""
+    regressions = []
+    for name, (value, _, higher_is_better) in results.items():
+        if name not in baseline.get("metrics", {}):
+            continue
+        base = baseline["metrics"][name]["value"]
+        if base <= 0:
+            continue
+        change = (base - value) / base if higher_is_better else (value - base) / base
+        if change > tolerance:
+            regressions.append((name, value, base, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark scoring and coaching hot paths.")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="allowed fractional regression before failing (default: 0.5 = 50%%)")
+    parser.add_argument("--quick", action="store_true", help="smaller inputs (no gating against a full baseline)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run_all(quick=args.quick)
+
+    if args.json:
+        print(json.dumps({name: value for name, (value, _, _) in results.items()}, indent=2))
+    else:
+        for name, (value, unit, _) in results.items():
+            print(f"{name.ljust(34)} {value:>16,.2f} {unit}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "metrics": {name: {"value": round(value, 3), "unit": unit, "higher_is_better": hib}
+                            for name, (value, unit, hib) in results.items()},
+            }, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if args.quick or not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\nREGRESSIONS (tolerance {args.tolerance:.0%}):")
+        for name, value, base, change in regressions:
+            print(f"  {name}: {value:,.2f} vs baseline {base:,.2f} ({change:+.0%} worse)")
+        return 1
+    print(f"\nNo regressions beyond {args.tolerance:.0%} of {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+# benchmarks/startup.py
+"""
+Cold-start report for both entry points: how long a fresh process takes to
+import its modules, load the knowledge base and (for the app) finish the
+first script run.
+
+    python -m benchmarks.startup                 # median of 5 fresh processes each
+    python -m benchmarks.startup --runs 10 --json
+    python -m benchmarks.startup --rules-file path/to/big_rules.json
+
+Every entry point is measured twice: with the precompiled rule bundle
+(build it first with `python -m src.logic.bundle`) and with the bundle
+disabled (EXLEEP_RULES_BUNDLE=0), i.e. parsing rules.json from scratch.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each probe runs in a fresh interpreter and prints one JSON object of
+# stage -> milliseconds, measured from the first line of the probe.
+_CLI_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import src.interface
+from src.logic.coaching import JSONCoachingEngine
+t1 = time.perf_counter()
+JSONCoachingEngine(sys.argv[1]).rule_set
+t2 = time.perf_counter()
+print(json.dumps({"imports_ms": (t1 - t0) * 1e3, "rules_ms": (t2 - t1) * 1e3, "total_ms": (t2 - t0) * 1e3}))
+"""
+
+_APP_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import streamlit
+t1 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+t2 = time.perf_counter()
+AppTest.from_file("app.py", default_timeout=60).run()
+t3 = time.perf_counter()
+print(json.dumps({"imports_ms": (t1 - t0) * 1e3, "first_run_ms": (t3 - t2) * 1e3,
+                  "total_ms": (t1 - t0 + t3 - t2) * 1e3}))
+"""
+
+_EMPTY_PROBE = """
+print("{}")
+"""
+
+
+def run_probe(source, args=(), bundle=True):
+    """Wall time of the whole interpreter plus the probe's own stage timings."""
+    env = dict(os.environ, EXLEEP_RULES_BUNDLE="1" if bundle else "0")
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", source, *args], cwd=REPO_ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    wall_ms = (time.perf_counter() - t0) * 1e3
+    stages = json.loads(out.stdout.strip().splitlines()[-1])
+    stages["process_ms"] = wall_ms
+    return stages
+
+
+def median_stages(source, runs, args=(), bundle=True):
+    samples = [run_probe(source, args, bundle) for _ in range(runs)]
+    return {stage: statistics.median(s[stage] for s in samples) for stage in samples[0]}
+
+
+def startup_report(runs=5, rules_file=None, include_app=True):
+    from src.logic.bundle import check_bundle
+    from src.logic.coaching import DEFAULT_RULES_FILE
+
+    rules_file = rules_file or DEFAULT_RULES_FILE
+    report = {
+        "runs": runs,
+        "bundle": check_bundle(rules_file),
+        "interpreter": median_stages(_EMPTY_PROBE, runs),
+    }
+    for bundle in (True, False):
+        label = "bundle" if bundle else "json"
+        report[f"cli.{label}"] = median_stages(_CLI_PROBE, runs, (rules_file,), bundle)
+        if include_app:
+            report[f"app.{label}"] = median_stages(_APP_PROBE, runs, bundle=bundle)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start time of the CLI and the Streamlit app.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per measurement (median is reported)")
+    parser.add_argument("--rules-file", help="knowledge base for the CLI probe (default: src/data/rules.json)")
+    parser.add_argument("--no-app", action="store_true", help="skip the Streamlit probe")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = startup_report(args.runs, args.rules_file, include_app=not args.no_app)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    print(f"Rule bundle: {report['bundle']}   (median of {report['runs']} fresh processes)")
+    for name, stages in report.items():
+        if not isinstance(stages, dict):
+            continue
+        timings = "  ".join(f"{stage}={value:,.1f}" for stage, value in stages.items())
+        print(f"  {name.ljust(12)} {timings}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
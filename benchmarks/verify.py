@@ -0,0 +1,352 @@
+# benchmarks/verify.py
+"""
+Regression checks for the fast paths: each one is compared against a plain,
+obviously correct reference implementation on seeded random inputs.
+
+    python -m benchmarks.verify                 # every check
+    python -m benchmarks.verify whatif          # only some checks
+    python -m benchmarks.verify --cases 100 --seed 3
+
+    whatif   analyze() vs scoring and coaching every one- and two-answer change
+    index    RuleIndex.evaluate() vs a plain scan of every compiled rule
+    diff     rules_diff.replay() vs both JSONCoachingEngine versions, row by row
+
+The exit code is 1 when any check finds a mismatch; each mismatch is printed.
+"""
+
+import argparse
+import copy
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from src.logic.scoring import ScoringEngine, DISORDERS, FLAG_THRESHOLD, SYMPTOM_KEYS, SCALE_MIN, SCALE_MAX
+from src.logic.coaching import DEFAULT_RULES_FILE, JSONCoachingEngine, RuleIndex, compile_rules
+from src.logic.pipeline import assess
+from src.logic.assessment import FIELD_INDEX, PackedAssessments, field_values
+from src.logic.schema import USER_DATA_KEYS
+from src.logic.thresholds import Thresholds
+from src.synthetic import generate_assessments, packed_corpus, synthetic_rules
+
+# Mismatches printed per check
+MAX_REPORTED = 20
+
+
+def _random_thresholds(rng):
+    """Per-disorder cutoffs, so the checks cover calibrated thresholds too."""
+    cutoffs = {}
+    for disorder in DISORDERS:
+        flag = rng.choice([25.0, 40.0, 50.0, 60.0])
+        cutoffs[disorder] = {"flag": flag, "high": flag + rng.choice([10.0, 25.0])}
+    return Thresholds(disorders=cutoffs)
+
+
+# ============================================
+# 1. WHAT-IF ANALYSIS
+# ============================================
+
+def _answer_changes(symptoms, user_data):
+    """Every single-answer change: (key, new value)."""
+    changes = [(key, value) for key in SYMPTOM_KEYS for value in range(SCALE_MIN, SCALE_MAX + 1)
+               if value != symptoms[key]]
+    changes += [(key, value) for key in USER_DATA_KEYS if key in user_data
+                for value in field_values(key) if value != user_data[key]]
+    return changes
+
+
+def _apply(symptoms, user_data, changes):
+    symptoms, user_data = dict(symptoms), dict(user_data)
+    for key, value in changes:
+        (symptoms if key in SYMPTOM_KEYS else user_data)[key] = value
+    return symptoms, user_data
+
+
+def _options(entries):
+    """{frozenset of (key, new value): entry} for a list of what-if options."""
+    return {frozenset((c["key"], c["to"]) for c in entry["changes"]): entry for entry in entries}
+
+
+def _brute_force_whatif(symptoms, user_data, coach, threshold, boundaries):
+    """
+    The what-if report the slow way: score and coach every single change and
+    every pair of changes to different answers, one assessment at a time.
+    Returns ({(disorder, boundary): (singles, doubles)}, (singles, doubles))
+    where boundary options map a change set to its score and advice options
+    map it to (rule ids added, rule ids removed).
+    """
+    changes = _answer_changes(symptoms, user_data)
+    symptom_changes = [c for c in changes if c[0] in SYMPTOM_KEYS]
+    base_scores = ScoringEngine.calculate_confidence(symptoms)
+    base_fired = frozenset(assess(symptoms, user_data, coach, threshold)["advice_ids"])
+
+    def scores(picks):
+        return ScoringEngine.calculate_confidence(_apply(symptoms, user_data, picks)[0])
+
+    def fired(picks):
+        return frozenset(assess(*_apply(symptoms, user_data, picks), coach, threshold)["advice_ids"])
+
+    single_scores = {c: scores([c]) for c in symptom_changes}
+    pair_scores = {(a, b): scores([a, b]) for a, b in itertools.combinations(symptom_changes, 2)
+                   if a[0] != b[0]}
+    crossing = {}
+    for disorder in DISORDERS:
+        for boundary in boundaries[disorder]:
+            above = base_scores[disorder] >= boundary
+            singles = {frozenset([c]): s[disorder] for c, s in single_scores.items()
+                       if (s[disorder] >= boundary) != above}
+            doubles = {frozenset(pair): s[disorder] for pair, s in pair_scores.items()
+                       if (s[disorder] >= boundary) != above
+                       and frozenset([pair[0]]) not in singles and frozenset([pair[1]]) not in singles}
+            crossing[(disorder, boundary)] = (singles, doubles)
+
+    single_fired = {c: fired([c]) for c in changes}
+    advice_singles = {frozenset([c]): f for c, f in single_fired.items() if f != base_fired}
+    advice_doubles = {}
+    for a, b in itertools.combinations(changes, 2):
+        if a[0] == b[0] or frozenset([a]) in advice_singles or frozenset([b]) in advice_singles:
+            continue
+        f = fired([a, b])
+        if f != base_fired:
+            advice_doubles[frozenset([a, b])] = f
+
+    def delta(options):
+        return {key: (f - base_fired, base_fired - f) for key, f in options.items()}
+
+    return crossing, (delta(advice_singles), delta(advice_doubles))
+
+
+def check_whatif(cases, seed):
+    """analyze() lists exactly the crossing / advice-changing changes brute force finds."""
+    from src.logic.whatif import WhatIfAnalysis
+
+    rng = random.Random(seed)
+    coach = JSONCoachingEngine()
+    mismatches = []
+    for case, (symptoms, user_data) in enumerate(generate_assessments(cases, seed)):
+        threshold = _random_thresholds(rng) if case % 2 else Thresholds()
+        analysis = WhatIfAnalysis(symptoms, user_data, coach, threshold, max_results=sys.maxsize)
+        report = analysis.run()
+        crossing, (advice_singles, advice_doubles) = _brute_force_whatif(
+            symptoms, user_data, coach, threshold, analysis.boundaries)
+
+        for (disorder, boundary), expected in crossing.items():
+            entry = report["boundaries"][disorder][str(boundary)]
+            for kind, wanted in zip(("single", "double"), expected):
+                got = _options(entry[kind])
+                if set(got) != set(wanted):
+                    mismatches.append(f"case {case}: {disorder} {boundary:g}% {kind}: "
+                                      f"{len(got)} options, brute force {len(wanted)}")
+                    continue
+                for key, option in got.items():
+                    steps = sum(abs(c["to"] - c["from"]) for c in option["changes"])
+                    if option["score"] != round(wanted[key], 2) or option["steps"] != steps:
+                        mismatches.append(f"case {case}: {disorder} {boundary:g}% {sorted(key)}: "
+                                          f"score {option['score']} / steps {option['steps']}, "
+                                          f"brute force {wanted[key]:.2f} / {steps}")
+        for kind, wanted in (("single", advice_singles), ("double", advice_doubles)):
+            got = _options(report["advice"][kind])
+            if set(got) != set(wanted):
+                mismatches.append(f"case {case}: advice {kind}: {len(got)} options, "
+                                  f"brute force {len(wanted)}")
+                continue
+            for key, option in got.items():
+                if (set(option["advice_added"]), set(option["advice_removed"])) != wanted[key]:
+                    mismatches.append(f"case {case}: advice {sorted(key, key=repr)}: "
+                                      f"+{option['advice_added']} -{option['advice_removed']}, "
+                                      f"brute force +{sorted(wanted[key][0])} -{sorted(wanted[key][1])}")
+    return mismatches
+
+
+# ============================================
+# 2. RULE INDEX
+# ============================================
+
+def _scan(rules, person_data, diagnoses):
+    """The unindexed evaluation path: every rule's predicate, then its context."""
+    return [rule for rule in rules if rule.predicate(person_data) and rule.context_met(diagnoses)]
+
+
+# Answers the intake never produces but batch/server input can carry
+ODD_ANSWERS = (float("nan"), float("inf"), float("-inf"), 2.5, "3", [3])
+
+
+def check_rule_index(cases, seed):
+    """RuleIndex.evaluate() fires the same rules, in the same order, as a plain scan."""
+    rng = random.Random(seed)
+    rule_sets = {
+        "rules.json": JSONCoachingEngine().refresh().compiled,
+        "1k synthetic": tuple(compile_rules(synthetic_rules(1000, seed))),
+        "mostly gated": tuple(compile_rules(synthetic_rules(300, seed + 1, compound_ratio=0.5,
+                                                            gated_ratio=0.9))),
+    }
+    indexes = {name: RuleIndex(compiled) for name, compiled in rule_sets.items()}
+    mismatches = []
+    for case, (_, user_data) in enumerate(generate_assessments(cases, seed)):
+        # Some answers missing or out of the schema (JSON input accepts NaN and
+        # ±Infinity), and any combination of active diagnoses
+        person_data = {key: value for key, value in user_data.items() if rng.random() > 0.1}
+        for key in person_data:
+            if rng.random() < 0.05:
+                person_data[key] = rng.choice(ODD_ANSWERS)
+        diagnoses = [d for d in DISORDERS if rng.random() < 0.3]
+        for name, compiled in rule_sets.items():
+            got = indexes[name].evaluate(person_data, diagnoses)
+            expected = _scan(compiled, person_data, diagnoses)
+            if got != expected:
+                missing = [r.id for r in expected if r not in got]
+                extra = [r.id for r in got if r not in expected]
+                mismatches.append(f"case {case}: {name}: index missed {missing}, added {extra}"
+                                  + ("" if missing or extra else ", fired out of order"))
+    return mismatches
+
+
+# ============================================
+# 3. RULE-CHANGE REPLAY
+# ============================================
+
+def _edited_rules(rules, seed):
+    """A copy of rules with conditions, advice and gates edited, rules removed and added."""
+    rng = random.Random(seed)
+    fresh = iter(synthetic_rules(len(rules), seed + 1, gated_ratio=0.5))
+    edited = []
+    for rule in copy.deepcopy(rules):
+        roll = rng.random()
+        if roll < 0.02:
+            continue  # removed
+        if roll < 0.04:
+            rule["condition"] = next(fresh)["condition"]
+        elif roll < 0.06:
+            rule["advice"] += " (reworded)"
+        elif roll < 0.08:
+            rule.pop("required_diagnosis", None)
+            rule["block_if_diagnosis"] = rng.choice(DISORDERS)
+        edited.append(rule)
+    for i in range(len(rules) // 50):
+        rule = dict(next(fresh), id=f"added_{i}")
+        edited.insert(rng.randrange(len(edited) + 1), rule)
+    # A second rule under an existing id is keyed as "<id>#2"
+    edited.append(dict(next(fresh), id=edited[0]["id"]))
+    return edited
+
+
+def _fired_by_engine(coach, corpus):
+    """{rule label: (rows it fired for, its advice)}, one assessment at a time."""
+    from src.rules_diff import _keyed, _label
+
+    keyed = _keyed(coach.compiled_rules)
+    labels = {id(rule): _label(key) for key, rule in keyed.items()}
+    fired = {_label(key): (set(), rule.advice) for key, rule in keyed.items()}
+    for row in range(len(corpus)):
+        assessment = corpus[row]
+        scores = ScoringEngine.calculate_confidence(assessment)
+        active = [d for d in DISORDERS if scores[d] >= FLAG_THRESHOLD]
+        for rule in coach.evaluate_rules(assessment, active):
+            fired[labels[id(rule)]][0].add(row)
+    return fired
+
+
+def check_rules_diff(cases, seed):
+    """replay() counts and samples match both engine versions run row by row."""
+    from src.rules_diff import flag_matrix, replay
+
+    with open(DEFAULT_RULES_FILE, encoding="utf-8") as f:
+        old_raw = json.load(f) + synthetic_rules(100, seed)
+    new_raw = _edited_rules(old_raw, seed)
+
+    # Fully answered symptoms, with some habit questions left unanswered
+    codes = packed_corpus(cases, seed).codes()
+    habits = [FIELD_INDEX[key] for key in USER_DATA_KEYS]
+    blank = np.random.default_rng(seed).random((cases, len(habits))) < 0.05
+    codes[:, habits] = np.where(blank, 0, codes[:, habits])
+    corpus = PackedAssessments.from_codes(codes)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        coaches = []
+        for name, raw in (("old.json", old_raw), ("new.json", new_raw)):
+            path = os.path.join(tmpdir, name)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(raw, f)
+            coaches.append(JSONCoachingEngine(path))
+        old_coach, new_coach = coaches
+        flags = flag_matrix(corpus, Thresholds(), ScoringEngine)
+        report = replay(old_coach.compiled_rules, new_coach.compiled_rules, corpus, flags,
+                        samples=5, seed=seed)
+        before, after = _fired_by_engine(old_coach, corpus), _fired_by_engine(new_coach, corpus)
+
+    mismatches = []
+    reported = set()
+    for entry in report["changes"]:
+        label = entry["rule"]
+        reported.add(label)
+        old_rows, old_advice = before.get(label, (set(), None))
+        new_rows, new_advice = after.get(label, (set(), None))
+        gained, lost = new_rows - old_rows, old_rows - new_rows
+        expected = {"fired_before": len(old_rows), "fired_after": len(new_rows),
+                    "gained": len(gained), "lost": len(lost)}
+        if label in before and label in after and old_advice != new_advice:
+            expected["advice_changed"] = len(old_rows & new_rows)
+        got = {key: entry.get(key) for key in expected}
+        if got != expected or ("advice_changed" in entry) != ("advice_changed" in expected):
+            mismatches.append(f"{label} ({entry['change']}): replay {got}, engines {expected}")
+        if not set(entry["samples"]["gained"]) <= gained or not set(entry["samples"]["lost"]) <= lost:
+            mismatches.append(f"{label}: samples {entry['samples']} outside the rows that changed")
+
+    affected = set()
+    for label in set(before) | set(after):
+        old_rows, old_advice = before.get(label, (set(), None))
+        new_rows, new_advice = after.get(label, (set(), None))
+        changed = old_rows ^ new_rows
+        if old_advice != new_advice:
+            changed |= old_rows & new_rows
+        if changed and label not in reported:
+            mismatches.append(f"{label}: fires differently for {len(changed)} rows but was not reported")
+        affected |= changed
+    if report["patients_affected"] != len(affected):
+        mismatches.append(f"patients affected: replay {report['patients_affected']}, engines {len(affected)}")
+    return mismatches
+
+
+# ============================================
+# 4. RUNNER
+# ============================================
+
+CHECKS = {
+    "whatif": (check_whatif, 20),
+    "index": (check_rule_index, 2000),
+    "diff": (check_rules_diff, 5000),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the fast paths against reference implementations.")
+    parser.add_argument("checks", nargs="*", metavar="CHECK",
+                        help=f"checks to run: {', '.join(CHECKS)} (default: all)")
+    parser.add_argument("--cases", type=int, help="random cases per check (default: per check)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.checks if name not in CHECKS]
+    if unknown:
+        parser.error(f"unknown check(s): {', '.join(unknown)} (choose from {', '.join(CHECKS)})")
+
+    failed = False
+    for name in args.checks or CHECKS:
+        check, default_cases = CHECKS[name]
+        cases = args.cases or default_cases
+        t0 = time.perf_counter()
+        mismatches = check(cases, args.seed)
+        elapsed = time.perf_counter() - t0
+        print(f"{name.ljust(10)} {cases:>6,} cases  {len(mismatches):>4} mismatches  ({elapsed:.1f}s)")
+        for mismatch in mismatches[:MAX_REPORTED]:
+            print(f"  {mismatch}")
+        failed = failed or bool(mismatches)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
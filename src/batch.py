@@ -0,0 +1,315 @@
+# src/batch.py
+"""
+Headless bulk assessment runner.
+
+    python -m src.batch intake.jsonl -o results.jsonl --workers 4
+    cat intake.csv | python -m src.batch - --input-format csv --output-format csv
+    python -m src.batch intake.jsonl -o reports.html   # rendered reports (.html/.md/.txt)
+
+Each input record is either nested ({"id", "symptoms": {...}, "user_data": {...}})
+or flat (all 21 symptom keys and the user_data keys side by side, as in a CSV
+export). Results stream out in input order; a bad record produces an
+{"id", "error"} row instead of aborting the run.
+"""
+
+import argparse
+import csv
+import io
+import itertools
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from src.logic.scoring import DISORDERS, SYMPTOM_KEYS
+from src.logic.coaching import JSONCoachingEngine, DEFAULT_RULES_FILE
+from src.logic.pipeline import assess_batch, validate_symptoms
+from src.logic.thresholds import get_thresholds
+from src.logic.assessment import Assessment
+from src.history_store import HistoryStore
+from src.reports import ReportWriter, FORMATS, format_for_path
+
+# ============================================
+# 1. READING
+# ============================================
+
+def _coerce(value):
+    """CSV cells arrive as strings: turn '3' into 3 and 'yes'/'True' into True."""
+    text = value.strip()
+    lowered = text.lower()
+    if lowered in ("true", "yes", "y"):
+        return True
+    if lowered in ("false", "no", "n"):
+        return False
+    try:
+        return int(text)
+    except ValueError:
+        return text
+
+
+def read_jsonl(stream):
+    # Lines are decoded inside the workers, so JSON parsing is parallel too
+    for line_no, line in enumerate(stream, 1):
+        if line.strip():
+            yield line_no, line
+
+
+def read_csv(stream):
+    for line_no, row in enumerate(csv.DictReader(stream), 2):
+        yield line_no, {k: _coerce(v) for k, v in row.items() if k and v is not None and v != ""}
+
+
+def split_record(record):
+    """Returns (id, symptoms, user_data) for a nested or flat record."""
+    if not isinstance(record, dict):
+        raise ValueError(f"expected an object, got {type(record).__name__}")
+    record_id = record.get("id")
+    if "symptoms" in record:
+        symptoms, user_data = record["symptoms"], record.get("user_data", {})
+        if not isinstance(symptoms, dict):
+            raise ValueError(f"symptoms must be an object, got {type(symptoms).__name__}")
+        if not isinstance(user_data, dict):
+            raise ValueError(f"user_data must be an object, got {type(user_data).__name__}")
+        return record_id, symptoms, user_data
+    symptoms = {k: record[k] for k in SYMPTOM_KEYS if k in record}
+    user_data = {k: v for k, v in record.items() if k != "id" and k not in symptoms}
+    return record_id, symptoms, user_data
+
+
+# ============================================
+# 2. PROCESSING (runs inside the worker processes)
+# ============================================
+
+def process_chunk(chunk, rules_file=DEFAULT_RULES_FILE, with_packed=False):
+    """
+    chunk: list of (line_no, record dict or raw JSON line). Returns output rows
+    in order. with_packed adds each record's packed Assessment bytes (or None
+    for off-schema records) under "packed", for the history store.
+    """
+    coach = JSONCoachingEngine(rules_file)  # shared per worker process
+    threshold = get_thresholds()  # calibrated cutoffs, read once per worker process
+    rows = [None] * len(chunk)
+    valid_pos, valid = [], []
+
+    for pos, (line_no, record) in enumerate(chunk):
+        record_id = line_no
+        try:
+            if isinstance(record, str):
+                try:
+                    record = json.loads(record)
+                except ValueError as e:
+                    raise ValueError(f"invalid JSON: {e}")
+            record_id, symptoms, user_data = split_record(record)
+            if record_id is None:
+                record_id = line_no
+            validate_symptoms(symptoms)
+        except (ValueError, TypeError) as e:
+            rows[pos] = {"id": record_id, "error": str(e)}
+            continue
+        valid_pos.append((pos, record_id))
+        valid.append((symptoms, user_data))
+
+    for (pos, record_id), result, (symptoms, user_data) in zip(valid_pos, _assess_all(valid, coach, threshold), valid):
+        if isinstance(result, Exception):
+            rows[pos] = {"id": record_id, "error": f"coaching failed: {result}"}
+            continue
+        rows[pos] = {"id": record_id, **result}
+        if with_packed:
+            try:
+                rows[pos]["packed"] = Assessment.from_dicts(symptoms, user_data).packed
+            except (ValueError, TypeError):
+                rows[pos]["packed"] = None
+    return rows
+
+
+def _assess_all(records, coach, threshold):
+    """
+    assess_batch over the whole chunk; if that fails, record by record, so
+    one record the coaching rules choke on becomes its own error row.
+    """
+    try:
+        return assess_batch(records, coach, threshold)
+    except Exception:
+        pass
+    results = []
+    for record in records:
+        try:
+            results.extend(assess_batch([record], coach, threshold))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+# ============================================
+# 3. WRITING
+# ============================================
+
+class JsonlWriter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, row):
+        self.stream.write(json.dumps(row, ensure_ascii=False))
+        self.stream.write("\n")
+
+    def close(self):
+        pass
+
+
+class CsvWriter:
+    FIELDS = ["id", *DISORDERS, "active_diagnoses", "advice_ids", "error"]
+
+    def __init__(self, stream):
+        self.writer = csv.DictWriter(stream, fieldnames=self.FIELDS)
+        self.writer.writeheader()
+
+    def write(self, row):
+        if "error" in row:
+            self.writer.writerow({"id": row["id"], "error": row["error"]})
+            return
+        out = {"id": row["id"], **row["scores"]}
+        out["active_diagnoses"] = ";".join(row["active_diagnoses"])
+        out["advice_ids"] = ";".join(row["advice_ids"])
+        self.writer.writerow(out)
+
+    def close(self):
+        pass
+
+
+# ============================================
+# 4. DRIVER
+# ============================================
+
+class BatchStats:
+    def __init__(self):
+        self.records = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        return self.records / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        return (f"{self.records} records ({self.errors} errors) in {self.elapsed:.2f}s "
+                f"- {self.rate:,.0f} records/sec")
+
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run_batch(records, writer, workers=1, chunk_size=1000, rules_file=DEFAULT_RULES_FILE,
+              progress=None, history=None):
+    """
+    Streams (line_no, record) pairs through the pipeline and writes result rows
+    in input order. At most 2 chunks per worker are in flight, so memory stays
+    bounded no matter how large the input is. If history (a HistoryStore) is
+    given, every scored in-schema record is appended to it as well.
+    """
+    stats = BatchStats()
+    with_packed = history is not None
+
+    def emit(rows):
+        if with_packed:
+            history.append_many(
+                (Assessment(row["packed"]), row) for row in rows if row.get("packed"))
+        for row in rows:
+            row.pop("packed", None)
+            writer.write(row)
+            stats.records += 1
+            if "error" in row:
+                stats.errors += 1
+        if progress:
+            progress(stats)
+
+    chunks = _chunked(records, chunk_size)
+    if workers <= 1:
+        for chunk in chunks:
+            emit(process_chunk(chunk, rules_file, with_packed))
+        return stats
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(process_chunk, chunk, rules_file, with_packed))
+            if len(pending) >= workers * 2:
+                emit(pending.popleft().result())
+        while pending:
+            emit(pending.popleft().result())
+    return stats
+
+
+def _detect_format(path, explicit):
+    if explicit:
+        return explicit
+    if path and path.lower().endswith(".csv"):
+        return "csv"
+    return format_for_path(path, "jsonl")
+
+
+def make_writer(stream, out_format, rules_file=DEFAULT_RULES_FILE):
+    if out_format == "csv":
+        return CsvWriter(stream)
+    if out_format in FORMATS:
+        return ReportWriter(stream, out_format, JSONCoachingEngine(rules_file), thresholds=get_thresholds())
+    return JsonlWriter(stream)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run sleep assessments in bulk (non-interactive).")
+    parser.add_argument("input", help="JSONL or CSV file, or '-' for stdin")
+    parser.add_argument("-o", "--output", default="-", help="output file (default: stdout)")
+    parser.add_argument("--input-format", choices=["jsonl", "csv"])
+    parser.add_argument("--output-format", choices=["jsonl", "csv", *FORMATS],
+                        help="default: from the output extension (.csv, .html, .md, .txt), else jsonl")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="worker processes (default: 1)")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--rules", default=DEFAULT_RULES_FILE, help="rules.json to use")
+    parser.add_argument("--progress", action="store_true", help="print throughput after every chunk")
+    parser.add_argument("--history", help="also append results to this columnar history store")
+    args = parser.parse_args(argv)
+
+    in_format = _detect_format(None if args.input == "-" else args.input, args.input_format)
+    out_format = _detect_format(None if args.output == "-" else args.output, args.output_format)
+
+    if args.input == "-":
+        in_stream = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline="")
+    else:
+        in_stream = open(args.input, "r", encoding="utf-8", newline="")
+    out_stream = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+
+    def report(stats):
+        print(f"\r    {stats.summary()}", end="", file=sys.stderr, flush=True)
+
+    try:
+        records = read_csv(in_stream) if in_format == "csv" else read_jsonl(in_stream)
+        writer = make_writer(out_stream, out_format, args.rules)
+        stats = run_batch(records, writer, workers=args.workers, chunk_size=args.chunk_size,
+                          rules_file=args.rules, progress=report if args.progress else None,
+                          history=HistoryStore(args.history) if args.history else None)
+        writer.close()
+    finally:
+        if in_stream is not sys.stdin:
+            in_stream.close()
+        if out_stream is not sys.stdout:
+            out_stream.close()
+
+    if args.progress:
+        print(file=sys.stderr)
+    print(f"Done: {stats.summary()}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,414 @@
+# src/calibration.py
+"""
+Threshold calibration against confirmed diagnoses.
+
+    python -m src.calibration labeled.jsonl --report calibration.json -o src/data/thresholds.json
+    python -m src.calibration --synthetic 1000000          # seeded demo data
+
+Input rows are assessments with the clinician-confirmed diagnoses, in the
+bulk runner's formats plus a "diagnoses" field (a list, or ";"-separated in
+CSV):
+
+    {"symptoms": {...}, "diagnoses": ["Insomnia"]}
+
+or an .npz with a "symptoms" (N x 21) answer matrix and a "labels" (N x 6)
+bool matrix whose columns follow DISORDERS.
+
+All N x 6 confidences come from one calculate_confidence_batch() call of
+the configured scoring engine (get_scoring_engine(), so the cutoffs fit the
+scores the front ends will compare them with). Each
+disorder's column is then sorted once (descending) and cumulative sums of
+the sorted labels give the true/false positives of every candidate cutoff
+at the same time: the ROC and PR curves, AUC, average precision, the best
+flag cutoff (Youden's J or F1) and the lowest "high probability" cutoff
+reaching a target precision. Linear confidences take at most 625 distinct
+values per disorder, so their curves stay small whatever N is; Bayes
+posteriors are continuous and give up to one candidate per row.
+
+The chosen cutoffs are written as a thresholds file (src/logic/thresholds.py),
+tagged with the engine they were fitted on, that the front ends load at
+startup.
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from src.logic.scoring import ScoringEngine, DISORDERS, SYMPTOM_KEYS, HIGH_RISK_THRESHOLD, get_scoring_engine
+from src.logic.pipeline import validate_symptoms
+from src.logic.thresholds import Thresholds, get_thresholds
+
+OBJECTIVES = ("youden", "f1")
+DEFAULT_HIGH_PRECISION = 0.9   # share of "high probability" flags that should be confirmed
+MIN_CLASS_SIZE = 30            # positives and negatives needed to move a disorder's cutoffs
+RELIABILITY_BINS = 10
+
+
+# ============================================
+# 1. READING LABELED ASSESSMENTS
+# ============================================
+
+def _confirmed(record):
+    diagnoses = record.get("diagnoses", ())
+    if isinstance(diagnoses, str):
+        diagnoses = [d.strip() for d in diagnoses.split(";") if d.strip()]
+    elif not isinstance(diagnoses, (list, tuple)):
+        raise ValueError(f"diagnoses must be a list, got {type(diagnoses).__name__}")
+    if not all(isinstance(d, str) for d in diagnoses):
+        raise ValueError("diagnoses must be disorder names")
+    unknown = [d for d in diagnoses if d not in DISORDERS]
+    if unknown:
+        raise ValueError(f"unknown diagnoses: {', '.join(unknown)}")
+    return [d in diagnoses for d in DISORDERS]
+
+
+def read_labeled(path, fmt=None, user_data_keys=None):
+    """
+    (answers, labels) arrays from a JSONL, CSV or .npz file. Rows with
+    missing/invalid answers or unknown diagnoses are reported and skipped.
+    With user_data_keys, also returns a list of {key: answer} dicts per row
+    (empty for .npz input).
+    """
+    import numpy as np
+    from src.batch import read_csv, read_jsonl, split_record
+
+    fmt = fmt or next((ext for ext in ("npz", "csv") if path.lower().endswith("." + ext)), "jsonl")
+    if fmt == "npz":
+        with np.load(path) as data:
+            answers, labels = np.asarray(data["symptoms"]), np.asarray(data["labels"], dtype=bool)
+        return (answers, labels) if user_data_keys is None else (answers, labels, [{} for _ in labels])
+
+    rows, labels, extra = [], [], []
+    with open(path, "r", encoding="utf-8", newline="") as stream:
+        records = read_csv(stream) if fmt == "csv" else read_jsonl(stream)
+        for line_no, record in records:
+            try:
+                if isinstance(record, str):
+                    record = json.loads(record)
+                _, symptoms, user_data = split_record(record)
+                validate_symptoms(symptoms)
+                labels.append(_confirmed(record))
+            except ValueError as e:  # includes JSONDecodeError
+                print(f"Error: line {line_no}: {e}", file=sys.stderr)
+                continue
+            rows.append([symptoms[k] for k in SYMPTOM_KEYS])
+            if user_data_keys is not None:
+                extra.append({k: user_data[k] for k in user_data_keys if k in user_data})
+    answers = np.array(rows, dtype=np.int8).reshape(-1, len(SYMPTOM_KEYS))
+    labels = np.array(labels, dtype=bool).reshape(-1, len(DISORDERS))
+    return (answers, labels) if user_data_keys is None else (answers, labels, extra)
+
+
+# ============================================
+# 2. SORT-BASED SWEEP
+# ============================================
+
+class Curve:
+    """
+    Every candidate cutoff of one disorder, highest first. A cutoff t flags
+    the assessments whose confidence is >= t; tp/fp count them.
+    """
+    __slots__ = ("disorder", "thresholds", "tp", "fp", "positives", "negatives")
+
+    def __init__(self, disorder, thresholds, tp, fp, positives, negatives):
+        self.disorder = disorder
+        self.thresholds = thresholds
+        self.tp = tp
+        self.fp = fp
+        self.positives = positives
+        self.negatives = negatives
+
+    @property
+    def tpr(self):
+        return self.tp / max(self.positives, 1)
+
+    @property
+    def fpr(self):
+        return self.fp / max(self.negatives, 1)
+
+    @property
+    def precision(self):
+        return self.tp / (self.tp + self.fp)  # every cutoff flags at least one row
+
+    @property
+    def f1(self):
+        precision, recall = self.precision, self.tpr
+        total = precision + recall
+        return 2 * precision * recall / (total + (total == 0))
+
+    def auc(self):
+        """Area under the ROC curve (trapezoids from (0, 0) to (1, 1))."""
+        import numpy as np
+        fpr = np.concatenate([[0.0], self.fpr])
+        tpr = np.concatenate([[0.0], self.tpr])
+        return float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2))
+
+    def average_precision(self):
+        import numpy as np
+        recall = np.concatenate([[0.0], self.tpr])
+        return float(np.sum(np.diff(recall) * self.precision))
+
+    def at(self, threshold):
+        """Metrics of flagging at confidence >= threshold (any value, not only candidates)."""
+        import numpy as np
+        # thresholds are descending: count the candidates that are >= threshold
+        i = int(np.searchsorted(-self.thresholds, -threshold, side="right")) - 1
+        tp = int(self.tp[i]) if i >= 0 else 0
+        fp = int(self.fp[i]) if i >= 0 else 0
+        return _point(threshold, tp, fp, self.positives, self.negatives)
+
+    def as_dict(self, digits=4):
+        return {
+            "threshold": [round(float(t), 2) for t in self.thresholds],
+            "tpr": [round(float(v), digits) for v in self.tpr],
+            "fpr": [round(float(v), digits) for v in self.fpr],
+            "precision": [round(float(v), digits) for v in self.precision],
+        }
+
+
+def _point(threshold, tp, fp, positives, negatives):
+    recall = tp / positives if positives else 0.0
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    return {
+        "threshold": round(float(threshold), 2),
+        "tpr": round(recall, 4),
+        "fpr": round(fp / negatives if negatives else 0.0, 4),
+        "precision": round(precision, 4),
+        "f1": round(2 * precision * recall / (precision + recall) if precision + recall else 0.0, 4),
+        "flagged": tp + fp,
+    }
+
+
+def sweep(scores, labels):
+    """
+    One Curve per disorder from (N x 6) confidences and (N x 6) labels: a
+    single descending sort of every column, cumulative label counts, and
+    the last position of each run of equal confidences as the candidates.
+    """
+    import numpy as np
+
+    order = np.argsort(-scores, axis=0, kind="stable")
+    ranked = np.take_along_axis(scores, order, axis=0)
+    hits = np.take_along_axis(labels, order, axis=0)
+    tp = np.cumsum(hits, axis=0, dtype=np.int64)
+    n = scores.shape[0]
+
+    curves = {}
+    for col, disorder in enumerate(DISORDERS):
+        column = ranked[:, col]
+        ends = np.append(np.flatnonzero(column[1:] != column[:-1]), n - 1)
+        tp_col = tp[ends, col]
+        positives = int(tp[-1, col])
+        curves[disorder] = Curve(disorder, column[ends], tp_col, ends + 1 - tp_col,
+                                 positives, n - positives)
+    return curves
+
+
+def reliability(scores, labels, bins=RELIABILITY_BINS):
+    """
+    Per disorder: Brier score, expected calibration error and a reliability
+    table (mean confidence vs observed rate per confidence band), reading
+    confidence / 100 as a probability.
+    """
+    import numpy as np
+
+    n, k = scores.shape
+    probability = scores / 100.0
+    band = np.minimum((probability * bins).astype(np.int64), bins - 1)
+    flat = (band + np.arange(k) * bins).ravel()
+    counts = np.bincount(flat, minlength=k * bins).reshape(k, bins)
+    predicted = np.bincount(flat, weights=probability.ravel(), minlength=k * bins).reshape(k, bins)
+    observed = np.bincount(flat, weights=labels.ravel(), minlength=k * bins).reshape(k, bins)
+    brier = ((probability - labels) ** 2).mean(axis=0)
+
+    width = 100 // bins
+    out = {}
+    for col, disorder in enumerate(DISORDERS):
+        filled = counts[col] > 0
+        mean_pred = np.where(filled, predicted[col] / np.maximum(counts[col], 1), 0.0)
+        rate = np.where(filled, observed[col] / np.maximum(counts[col], 1), 0.0)
+        out[disorder] = {
+            "brier": round(float(brier[col]), 4),
+            "ece": round(float(np.sum(counts[col] / n * np.abs(mean_pred - rate))), 4),
+            "bins": [{"band": f"{b * width}-{(b + 1) * width}", "count": int(counts[col, b]),
+                      "mean_confidence": round(float(mean_pred[b]) * 100, 2),
+                      "observed_rate": round(float(rate[b]) * 100, 2)}
+                     for b in range(bins) if filled[b]],
+        }
+    return out
+
+
+# ============================================
+# 3. CHOOSING CUTOFFS
+# ============================================
+
+def _cutoff(curve, i):
+    """
+    A cutoff flagging exactly the rows of candidate i: rounded down to 2
+    decimals when that stays above the next lower confidence (always for
+    the linear engine), else the candidate confidence itself.
+    """
+    import math
+    value = float(curve.thresholds[i])
+    below = float(curve.thresholds[i + 1]) if i + 1 < len(curve.thresholds) else -math.inf
+    floored = math.floor(value * 100) / 100
+    return floored if below < floored <= value else value
+
+
+def choose_cutoffs(curve, objective="youden", high_precision=DEFAULT_HIGH_PRECISION):
+    """(flag cutoff, high cutoff, high cutoff reached the target precision)."""
+    import numpy as np
+
+    score = curve.tpr - curve.fpr if objective == "youden" else curve.f1
+    best = int(np.argmax(score))  # ties: the highest cutoff
+    flag = _cutoff(curve, best)
+
+    eligible = np.flatnonzero((np.arange(len(curve.thresholds)) <= best) & (curve.precision >= high_precision))
+    if eligible.size:
+        return flag, _cutoff(curve, int(eligible[-1])), True
+    return flag, max(flag, HIGH_RISK_THRESHOLD), False
+
+
+def calibrate(answers, labels, objective="youden", high_precision=DEFAULT_HIGH_PRECISION,
+              min_class_size=MIN_CLASS_SIZE, current=None, curves=True, engine=ScoringEngine,
+              user_data=None):
+    """
+    Returns (Thresholds, report) for an (N x 21) answer matrix and (N x 6)
+    confirmed-diagnosis matrix. Disorders with fewer than min_class_size
+    positives or negatives keep the current cutoffs. engine: ScoringEngine
+    or a NaiveBayesEngine, which also reads user_data (demographics per row).
+    """
+    import numpy as np
+
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective must be one of {', '.join(OBJECTIVES)}")
+    labels = np.asarray(labels, dtype=bool)
+    if labels.ndim != 2 or labels.shape[1] != len(DISORDERS):
+        raise ValueError(f"labels must be an N x {len(DISORDERS)} matrix")
+    if len(answers) != len(labels):
+        raise ValueError(f"{len(answers)} assessments but {len(labels)} label rows")
+    if len(labels) == 0:
+        raise ValueError("no labeled assessments")
+
+    current = current or Thresholds()
+    if user_data is None:
+        scores = engine.calculate_confidence_batch(answers)
+    else:
+        scores = engine.calculate_confidence_batch(answers, user_data)
+    swept = sweep(scores, labels)
+    calibration = reliability(scores, labels)
+
+    cutoffs = {}
+    report = {"rows": int(len(labels)), "engine": getattr(engine, "name", "linear"), "objective": objective, "high_precision": high_precision,
+              "disorders": {}}
+    for disorder, curve in swept.items():
+        entry = {
+            "positives": curve.positives,
+            "prevalence": round(curve.positives / len(labels), 4),
+            "auc": round(curve.auc(), 4),
+            "average_precision": round(curve.average_precision(), 4),
+            **calibration[disorder],
+            "current": {"flag": curve.at(current.flag_for(disorder)),
+                        "high": curve.at(current.high_for(disorder))},
+        }
+        if min(curve.positives, curve.negatives) < min_class_size:
+            entry["skipped"] = (f"needs {min_class_size} positive and negative cases, has "
+                                f"{curve.positives} / {curve.negatives}")
+        else:
+            flag, high, reached = choose_cutoffs(curve, objective, high_precision)
+            cutoffs[disorder] = {"flag": flag, "high": high}
+            entry["calibrated"] = {"flag": curve.at(flag), "high": curve.at(high),
+                                   "high_precision_reached": reached}
+        if curves:
+            entry["curve"] = curve.as_dict()
+        report["disorders"][disorder] = entry
+
+    for disorder in DISORDERS:
+        cutoffs.setdefault(disorder, {"flag": current.flag_for(disorder), "high": current.high_for(disorder)})
+    return Thresholds(current.flag, current.high, cutoffs, engine=report["engine"]), report
+
+
+# ============================================
+# 4. CLI
+# ============================================
+
+def print_summary(report, thresholds, elapsed, out=sys.stdout):
+    print(f"Calibrated {report['rows']:,} assessments in {elapsed:.2f}s "
+          f"({report['engine']} scores, {report['objective']}, high precision >= {report['high_precision']:.2f})", file=out)
+    for disorder, entry in report["disorders"].items():
+        line = f"  {disorder.ljust(26)} AUC {entry['auc']:.3f}  AP {entry['average_precision']:.3f}  "
+        if "skipped" in entry:
+            print(line + f"kept {thresholds.flag_for(disorder)} / {thresholds.high_for(disorder)} "
+                         f"({entry['skipped']})", file=out)
+            continue
+        old, new = entry["current"], entry["calibrated"]
+        print(line + f"flag {old['flag']['threshold']:5.1f} -> {new['flag']['threshold']:6.2f} "
+                     f"(TPR {old['flag']['tpr']:.2f} -> {new['flag']['tpr']:.2f}, "
+                     f"FPR {old['flag']['fpr']:.2f} -> {new['flag']['fpr']:.2f})  "
+                     f"high {old['high']['threshold']:5.1f} -> {new['high']['threshold']:6.2f} "
+                     f"(precision {new['high']['precision']:.2f})", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate the flag thresholds against confirmed diagnoses.")
+    parser.add_argument("input", nargs="?", help="labeled JSONL, CSV or .npz file")
+    parser.add_argument("--input-format", choices=["jsonl", "csv", "npz"])
+    parser.add_argument("--synthetic", type=int, metavar="N", help="calibrate on N seeded synthetic rows instead")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write the calibrated thresholds file here")
+    parser.add_argument("--report", help="write the full calibration report (JSON, with curves) here")
+    parser.add_argument("--objective", choices=OBJECTIVES, default="youden",
+                        help="flag cutoff maximizes Youden's J (TPR - FPR) or F1 (default: youden)")
+    parser.add_argument("--high-precision", type=float, default=DEFAULT_HIGH_PRECISION,
+                        help="precision the 'high probability' cutoff must reach (default: 0.9)")
+    parser.add_argument("--min-class-size", type=int, default=MIN_CLASS_SIZE)
+    args = parser.parse_args(argv)
+
+    if (args.input is None) == (args.synthetic is None):
+        parser.error("give an input file or --synthetic N")
+
+    # Calibrate the scores the front ends will produce (EXLEEP_SCORING_ENGINE)
+    engine = get_scoring_engine()
+    user_data = None
+    if args.synthetic is not None:
+        from src.synthetic import labeled_matrix
+        answers, labels = labeled_matrix(args.synthetic, args.seed)
+    else:
+        try:
+            if engine is ScoringEngine:
+                answers, labels = read_labeled(args.input, args.input_format)
+            else:
+                from src.logic.bayes import DEMOGRAPHIC_KEYS
+                answers, labels, user_data = read_labeled(args.input, args.input_format, DEMOGRAPHIC_KEYS)
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Error: could not read {args.input}: {e}")
+            return 1
+
+    start = time.perf_counter()
+    try:
+        thresholds, report = calibrate(answers, labels, args.objective, args.high_precision,
+                                       args.min_class_size, get_thresholds(engine=engine.name),
+                                       curves=bool(args.report),
+                                       engine=engine, user_data=user_data)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    elapsed = time.perf_counter() - start
+    report["elapsed_s"] = round(elapsed, 3)
+    report["thresholds"] = thresholds.to_dict()
+
+    print_summary(report, thresholds, elapsed)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report: {args.report}")
+    if args.output:
+        thresholds.save(args.output)
+        print(f"Thresholds: {args.output} (load with EXLEEP_THRESHOLDS={args.output}, "
+              f"or save as src/data/thresholds.json)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,360 @@
+# src/history_store.py
+"""
+Append-only columnar store of scored assessments, memory-mapped for reads.
+
+Layout of a store directory (one flat binary file per column):
+
+    meta.json            row count (the commit point), schema, rule id dictionary
+    field_<key>.u1       uint8 answer code per row for each of the 41 intake
+                         fields (the Assessment encoding: 0 = unanswered)
+    score_<i>.f4         float32 confidence per row for DISORDERS[i] (NaN when
+                         the adaptive intake left it as a range)
+    flags.u1             bit i set when DISORDERS[i] reached the flag threshold
+    timestamp.f8         float64 unix time per row
+    fired.u2             uint16 rule code of every fired rule, row after row
+    fired_end.u8         uint64 end offset into fired.u2 for each row
+
+Aggregate queries work chunk by chunk on np.memmap views, so tens of
+millions of rows never become Python objects.
+
+    python -m src.history_store DIR --by age --disorder 'Obstructive Sleep Apnea'
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from src.logic.scoring import DISORDERS, FLAG_THRESHOLD
+from src.logic.assessment import Assessment, FIELDS, PackedAssessments, field_values, pack_codes
+
+STORE_VERSION = 1
+CHUNK_ROWS = 1 << 20  # rows per chunk in aggregate queries
+
+_FIXED_COLUMNS = {"flags.u1": np.uint8, "timestamp.f8": np.float64, "fired_end.u8": np.uint64}
+
+
+def _field_file(key):
+    return f"field_{key}.u1"
+
+
+def _score_file(i):
+    return f"score_{i}.f4"
+
+
+class HistoryStore:
+    """
+    read_only=True opens the store for queries next to a running writer: it
+    never creates, truncates or appends to files and only reads the rows
+    committed in meta.json.
+    """
+
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._rule_index_cache = None
+        if not read_only:
+            os.makedirs(path, exist_ok=True)
+        self.meta = self._load_meta()
+        if not read_only:
+            self._recover()  # only the writer may cut off a torn append
+
+    # ============================================
+    # 1. METADATA & FILES
+    # ============================================
+
+    def _meta_path(self):
+        return os.path.join(self.path, "meta.json")
+
+    def _load_meta(self):
+        try:
+            with open(self._meta_path(), encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return {"version": STORE_VERSION, "rows": 0, "fired": 0, "fields": list(FIELDS),
+                    "disorders": list(DISORDERS), "rule_ids": []}
+        if meta.get("version") != STORE_VERSION:
+            raise ValueError(f"unsupported store version {meta.get('version')!r}")
+        if meta["fields"] != list(FIELDS) or meta["disorders"] != list(DISORDERS):
+            raise ValueError("store was written with a different intake schema")
+        return meta
+
+    def _save_meta(self):
+        # Write-then-rename: the new row count becomes visible atomically
+        tmp = self._meta_path() + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self._meta_path())
+
+    def _columns(self):
+        """file name -> (dtype, committed length in elements)."""
+        rows = self.meta["rows"]
+        columns = {_field_file(key): (np.uint8, rows) for key in FIELDS}
+        columns.update({_score_file(i): (np.float32, rows) for i in range(len(DISORDERS))})
+        columns.update({name: (dtype, rows) for name, dtype in _FIXED_COLUMNS.items()})
+        columns["fired.u2"] = (np.uint16, self.meta["fired"])
+        return columns
+
+    def _recover(self):
+        """Truncates column files back to the committed length after a torn append."""
+        for name, (dtype, length) in self._columns().items():
+            file_path = os.path.join(self.path, name)
+            expected = length * np.dtype(dtype).itemsize
+            if not os.path.exists(file_path):
+                open(file_path, "wb").close()
+            elif os.path.getsize(file_path) != expected:
+                with open(file_path, "r+b") as f:
+                    f.truncate(expected)
+
+    # ============================================
+    # 2. APPENDING
+    # ============================================
+
+    def _rule_codes(self, rule_ids):
+        index = self._rule_index()
+        codes = []
+        for rule_id in rule_ids:
+            code = index.get(rule_id)
+            if code is None:
+                code = len(self.meta["rule_ids"])
+                if code > np.iinfo(np.uint16).max:
+                    raise ValueError("too many distinct rule ids for a uint16 column")
+                self.meta["rule_ids"].append(rule_id)
+                index[rule_id] = code
+            codes.append(code)
+        return codes
+
+    def _rule_index(self):
+        cached = self._rule_index_cache
+        if cached is None or len(cached) != len(self.meta["rule_ids"]):
+            cached = {rule_id: i for i, rule_id in enumerate(self.meta["rule_ids"])}
+            self._rule_index_cache = cached
+        return cached
+
+    def append(self, assessment, result, timestamp=None):
+        self.append_many([(assessment, result)], timestamp)
+
+    def append_many(self, rows, timestamp=None):
+        """
+        rows: iterable of (assessment, result) where assessment is an
+        Assessment (or a (symptoms, user_data) pair) and result is a pipeline
+        result dict (scores, active_diagnoses, advice_ids).
+        """
+        if self.read_only:
+            raise ValueError(f"history store {self.path} is open read-only")
+        assessments, scores, flags, fired, fired_end = [], [], [], [], []
+        with self._lock:
+            end = self.meta["fired"]
+            for assessment, result in rows:
+                if not isinstance(assessment, Assessment):
+                    assessment = Assessment.from_dicts(*assessment)
+                assessments.append(assessment)
+                scores.append([np.nan if result["scores"][d] is None else result["scores"][d]
+                               for d in DISORDERS])
+                active = set(result["active_diagnoses"])
+                flags.append(sum(1 << i for i, d in enumerate(DISORDERS) if d in active))
+                codes = self._rule_codes(result.get("advice_ids", ()))
+                fired.extend(codes)
+                end += len(codes)
+                fired_end.append(end)
+            if not assessments:
+                return 0
+
+            n = len(assessments)
+            codes = PackedAssessments.from_assessments(assessments).codes()
+            scores = np.asarray(scores, dtype=np.float32)
+            when = time.time() if timestamp is None else timestamp
+            chunks = {_field_file(key): codes[:, i] for i, key in enumerate(FIELDS)}
+            chunks.update({_score_file(i): scores[:, i] for i in range(len(DISORDERS))})
+            chunks["flags.u1"] = np.asarray(flags, dtype=np.uint8)
+            chunks["timestamp.f8"] = np.full(n, when, dtype=np.float64)
+            chunks["fired.u2"] = np.asarray(fired, dtype=np.uint16)
+            chunks["fired_end.u8"] = np.asarray(fired_end, dtype=np.uint64)
+
+            for name, values in chunks.items():
+                with open(os.path.join(self.path, name), "ab") as f:
+                    f.write(np.ascontiguousarray(values).tobytes())
+            self.meta["rows"] += n
+            self.meta["fired"] = end
+            self._save_meta()
+            return n
+
+    # ============================================
+    # 3. MEMORY-MAPPED READS
+    # ============================================
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    def refresh(self):
+        """Picks up rows committed by another writer since this store was opened."""
+        with self._lock:
+            self.meta = self._load_meta()
+
+    def _memmap(self, name, dtype, length):
+        if length == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(os.path.join(self.path, name), dtype=dtype, mode="r", shape=(length,))
+
+    def field(self, key):
+        """uint8 answer codes of one intake field (memory-mapped)."""
+        return self._memmap(_field_file(key), np.uint8, len(self))
+
+    def scores(self, disorder):
+        return self._memmap(_score_file(DISORDERS.index(disorder)), np.float32, len(self))
+
+    def flags(self):
+        return self._memmap("flags.u1", np.uint8, len(self))
+
+    def fired_codes(self):
+        return self._memmap("fired.u2", np.uint16, self.meta["fired"])
+
+    def fired_rules(self, row):
+        ends = self._memmap("fired_end.u8", np.uint64, len(self))
+        start = int(ends[row - 1]) if row else 0
+        codes = self.fired_codes()[start:int(ends[row])]
+        return [self.meta["rule_ids"][c] for c in codes.tolist()]
+
+    def assessment(self, row):
+        codes = [int(self.field(key)[row]) for key in FIELDS]
+        return Assessment(pack_codes(codes))
+
+    # ============================================
+    # 4. AGGREGATE QUERIES
+    # ============================================
+
+    @staticmethod
+    def _chunks(length):
+        for start in range(0, length, CHUNK_ROWS):
+            yield start, min(length, start + CHUNK_ROWS)
+
+    def prevalence_by(self, group_key="age"):
+        """
+        Share of rows flagged for each disorder, per answer of group_key:
+        {group label: {"rows": n, disorder: rate, ...}}, labels decoded like
+        Assessment answers. Raises ValueError for a key outside FIELDS.
+        """
+        if group_key not in FIELDS:
+            raise ValueError(f"unknown field {group_key!r} (expected one of the {len(FIELDS)} intake fields)")
+        values = field_values(group_key)
+        levels = 16  # 4-bit codes
+        totals = np.zeros(levels, dtype=np.int64)
+        flagged = np.zeros((len(DISORDERS), levels), dtype=np.int64)
+        groups, flags = self.field(group_key), self.flags()
+        for start, stop in self._chunks(len(self)):
+            g = groups[start:stop]
+            f = flags[start:stop]
+            totals += np.bincount(g, minlength=levels)
+            for i in range(len(DISORDERS)):
+                flagged[i] += np.bincount(g, weights=(f >> i) & 1, minlength=levels).astype(np.int64)
+
+        report = {}
+        for code in np.nonzero(totals)[0].tolist():
+            label = "(unanswered)" if code == 0 else values[code - 1]
+            report[label] = {"rows": int(totals[code])}
+            for i, disorder in enumerate(DISORDERS):
+                report[label][disorder] = round(float(flagged[i, code] / totals[code]), 4)
+        return report
+
+    def score_distribution(self, disorder, bins=20):
+        """Histogram of one disorder's confidence over [0, 100]: (counts, edges)."""
+        edges = np.linspace(0.0, 100.0, bins + 1)
+        counts = np.zeros(bins, dtype=np.int64)
+        column = self.scores(disorder)
+        for start, stop in self._chunks(len(self)):
+            chunk = column[start:stop]
+            counts += np.histogram(chunk[~np.isnan(chunk)], bins=edges)[0]
+        return counts, edges
+
+    def score_stats(self, disorder, threshold=FLAG_THRESHOLD):
+        column = self.scores(disorder)
+        total, total_sq, above, n = 0.0, 0.0, 0, 0
+        for start, stop in self._chunks(len(self)):
+            chunk = column[start:stop].astype(np.float64)
+            chunk = chunk[~np.isnan(chunk)]  # ranges from adaptive intakes
+            total += chunk.sum()
+            total_sq += (chunk * chunk).sum()
+            above += int((chunk >= threshold).sum())
+            n += len(chunk)
+        mean = total / n if n else 0.0
+        return {"rows": n, "mean": mean,
+                "std": max(total_sq / n - mean * mean, 0.0) ** 0.5 if n else 0.0,
+                "flagged": above}
+
+    def top_rules(self, n=10):
+        """Most-fired rule ids: [(rule_id, count), ...]."""
+        counts = np.zeros(max(len(self.meta["rule_ids"]), 1), dtype=np.int64)
+        codes = self.fired_codes()
+        for start, stop in self._chunks(len(codes)):
+            counts += np.bincount(codes[start:stop], minlength=len(counts))
+        order = np.argsort(counts)[::-1][:n]
+        return [(self.meta["rule_ids"][i], int(counts[i])) for i in order.tolist() if counts[i]]
+
+
+_shared_store = None
+_shared_lock = threading.Lock()
+
+
+def get_history_store():
+    """
+    Process-wide store at $EXLEEP_HISTORY_DIR, or None when persistence is off.
+    One writer process per store directory.
+    """
+    global _shared_store
+    path = os.environ.get("EXLEEP_HISTORY_DIR")
+    if not path:
+        return None
+    if _shared_store is None or _shared_store.path != path:
+        with _shared_lock:
+            if _shared_store is None or _shared_store.path != path:
+                _shared_store = HistoryStore(path)
+    return _shared_store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query a columnar assessment history store.")
+    parser.add_argument("path", help="store directory")
+    parser.add_argument("--by", default="age", help="field to group flag prevalence by (default: age)")
+    parser.add_argument("--disorder", default="Obstructive Sleep Apnea",
+                        help="disorder for the confidence distribution")
+    parser.add_argument("--top", type=int, default=10, help="how many most-fired rules to list")
+    args = parser.parse_args(argv)
+
+    if args.disorder not in DISORDERS:
+        print(f"Error: unknown disorder {args.disorder!r} (expected one of: {', '.join(DISORDERS)})")
+        return 1
+    if not os.path.isdir(args.path):
+        print(f"Error: no history store at {args.path}")
+        return 1
+    store = HistoryStore(args.path, read_only=True)
+    try:
+        prevalence = store.prevalence_by(args.by)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    print(f"{len(store)} assessments in {args.path}\n")
+
+    print(f"Flag prevalence by {args.by}:")
+    for label, row in prevalence.items():
+        rates = ", ".join(f"{d}: {row[d]:.1%}" for d in DISORDERS)
+        print(f"  {str(label).ljust(12)} (n={row['rows']}) {rates}")
+
+    print(f"\n{args.disorder} confidence distribution:")
+    counts, edges = store.score_distribution(args.disorder, bins=10)
+    peak = max(int(counts.max()), 1)
+    for count, low, high in zip(counts.tolist(), edges[:-1], edges[1:]):
+        print(f"  {low:5.1f}-{high:5.1f}% | {'█' * int(40 * count / peak)} {count}")
+
+    print("\nMost-fired rules:")
+    for rule_id, count in store.top_rules(args.top):
+        print(f"  {rule_id.ljust(30)} {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+# src/logic/adaptive.py
+"""
+Adaptive intake: asks only the questions that can still change the result.
+
+    intake = AdaptiveQuestionnaire()
+    while (key := intake.next_question()) is not None:
+        intake.answer(key, ask(key))
+    result = intake.result()
+
+After every answer each disorder's confidence is bounded by filling its
+unanswered symptoms with 1 (lowest) and 5 (highest). Once both bounds fall
+in the same band (low / moderate / high, using the flag and high cutoffs)
+the disorder is settled and its remaining symptom questions are dropped:
+e.g. snore = 1 and choke = 1 cap Obstructive Sleep Apnea at 37.5%.
+
+Habit questions are dropped when every rule reading them is blocked by a
+settled diagnosis (required_diagnosis settled below the flag, or
+block_if_diagnosis settled above it) or when no rule reads them at all.
+
+Remaining symptom questions come first (their answers can block habit
+rules), the biggest possible confidence swing on an unsettled disorder
+first; then habit questions, the ones read by the most live rules first.
+Skipped questions stay unanswered (code 0 in an Assessment). A disorder
+with skipped symptoms is reported by its score bounds rather than a point
+score; its risk level and flag, and the advice, are exact: they are the
+same for any answers the user could have given.
+"""
+
+from src.logic.scoring import (
+    ScoringEngine, DISORDER_WEIGHTS, DISORDERS, SYMPTOM_KEYS, MAX_SCORES, SCALE_MIN, SCALE_MAX,
+    FLAG_THRESHOLD, HIGH_RISK_THRESHOLD,
+)
+from src.logic.coaching import JSONCoachingEngine
+from src.logic.incremental import RuleDependencies, SYMPTOM_DEPENDENCIES
+from src.logic.schema import USER_DATA_KEYS
+from src.logic.thresholds import Thresholds
+
+# Demographics are always asked: the history store aggregates by them
+ALWAYS_ASK = ("gender", "age")
+
+QUESTION_KEYS = USER_DATA_KEYS + SYMPTOM_KEYS
+
+
+class AdaptiveQuestionnaire:
+    """
+    One intake session. threshold: the flag cutoff (a number, with the 75%
+    high cutoff) or a Thresholds.
+    """
+
+    def __init__(self, coach=None, threshold=FLAG_THRESHOLD, always_ask=ALWAYS_ASK):
+        self.coach = coach or JSONCoachingEngine()
+        if isinstance(threshold, Thresholds):
+            self.cutoffs = {d: (threshold.flag_for(d), threshold.high_for(d)) for d in DISORDERS}
+        else:
+            self.cutoffs = {d: (threshold, HIGH_RISK_THRESHOLD) for d in DISORDERS}
+        self.always_ask = frozenset(always_ask)
+        self.rule_set = self.coach.refresh()
+        self.deps = RuleDependencies(self.rule_set)
+        self.answers = {}
+        self.asked = []  # keys in the order they were answered
+
+    # ============================================
+    # 1. BOUNDS
+    # ============================================
+
+    def bounds(self, disorder):
+        """(lowest, highest) confidence the disorder can still reach."""
+        answers = self.answers
+        low = {k: answers.get(k, SCALE_MIN) for k, _ in DISORDER_WEIGHTS[disorder]}
+        high = {k: answers.get(k, SCALE_MAX) for k, _ in DISORDER_WEIGHTS[disorder]}
+        return ScoringEngine.score_disorder(disorder, low), ScoringEngine.score_disorder(disorder, high)
+
+    def _band(self, disorder, score):
+        flag, high = self.cutoffs[disorder]
+        return 2 if score >= high else 1 if score >= flag else 0
+
+    def settled(self, disorder):
+        """True once further answers can't move the disorder to another band."""
+        low, high = self.bounds(disorder)
+        return self._band(disorder, low) == self._band(disorder, high)
+
+    def flag_state(self, disorder):
+        """True / False once the disorder's flag is decided, else None."""
+        if disorder not in self.cutoffs:
+            return False  # never scored, so never an active diagnosis
+        low, high = self.bounds(disorder)
+        flag = self.cutoffs[disorder][0]
+        if low >= flag:
+            return True
+        if high < flag:
+            return False
+        return None
+
+    # ============================================
+    # 2. SCHEDULING
+    # ============================================
+
+    def _rule_live(self, rule):
+        if rule.required_diagnosis is not None and self.flag_state(rule.required_diagnosis) is False:
+            return False
+        if rule.block_if_diagnosis is not None and self.flag_state(rule.block_if_diagnosis) is True:
+            return False
+        return True
+
+    def live_rules(self, key):
+        """Rules reading key that can still fire."""
+        rules = self.rule_set.compiled
+        return [rules[i] for i in self.deps.by_variable.get(key, ()) if self._rule_live(rules[i])]
+
+    def impact(self, key):
+        """
+        How much answering key can still change: the largest confidence swing
+        on an unsettled disorder (symptoms), or the number of live rules reading
+        it (habits). 0 means the question can be skipped.
+        """
+        if key in SYMPTOM_DEPENDENCIES:
+            swings = [weight * (SCALE_MAX - SCALE_MIN) / MAX_SCORES[d] * 100
+                      for d in SYMPTOM_DEPENDENCIES[key] if not self.settled(d)
+                      for k, weight in DISORDER_WEIGHTS[d] if k == key]
+            return max(swings, default=0.0)
+        return len(self.live_rules(key))
+
+    def pending(self):
+        """Unanswered questions that still matter, in the order to ask them."""
+        unanswered = [k for k in QUESTION_KEYS if k not in self.answers]
+        demographics = [k for k in unanswered if k in self.always_ask]
+        scored = [(self.impact(k), i, k) for i, k in enumerate(unanswered) if k not in self.always_ask]
+        symptoms = sorted((-impact, i, k) for impact, i, k in scored if impact and k in SYMPTOM_DEPENDENCIES)
+        habits = sorted((-impact, i, k) for impact, i, k in scored if impact and k not in SYMPTOM_DEPENDENCIES)
+        return demographics + [k for _, _, k in symptoms] + [k for _, _, k in habits]
+
+    def next_question(self):
+        """The next key to ask, or None when nothing left can change the result."""
+        pending = self.pending()
+        return pending[0] if pending else None
+
+    def answer(self, key, value):
+        if key not in QUESTION_KEYS:
+            raise KeyError(f"unknown question: {key}")
+        if key not in self.answers:
+            self.asked.append(key)
+        self.answers[key] = value
+
+    @property
+    def done(self):
+        return self.next_question() is None
+
+    @property
+    def skipped(self):
+        return [k for k in QUESTION_KEYS if k not in self.answers]
+
+    # ============================================
+    # 3. RESULT
+    # ============================================
+
+    def completed(self):
+        """(symptoms, user_data) with the answered questions only."""
+        symptoms = {k: self.answers[k] for k in SYMPTOM_KEYS if k in self.answers}
+        user_data = {k: self.answers[k] for k in USER_DATA_KEYS if k in self.answers}
+        return symptoms, user_data
+
+    def score_bounds(self):
+        """{disorder: (lowest, highest)}; the two are equal once all its symptoms are answered."""
+        return {d: self.bounds(d) for d in DISORDERS}
+
+    def result(self):
+        """
+        Pipeline-style result once done: "scores" holds a disorder's score
+        when its bounds meet and None otherwise, "score_bounds" the ranges;
+        active_diagnoses, advice_ids and advice are exact.
+        """
+        bounds = self.score_bounds()
+        active = [d for d in DISORDERS if self.flag_state(d)]
+        _, user_data = self.completed()
+        fired = self.coach.evaluate_rules(user_data, active)
+        return {
+            "scores": {d: low if low == high else None for d, (low, high) in bounds.items()},
+            "score_bounds": bounds,
+            "active_diagnoses": active,
+            "advice_ids": [rule.id for rule in fired],
+            "advice": [rule.advice for rule in fired],
+        }
+
+    def summary(self):
+        return {
+            "asked": len(self.asked),
+            "skipped": len(self.skipped),
+            "total": len(QUESTION_KEYS),
+            "settled": [d for d in DISORDERS if self.settled(d)],
+        }
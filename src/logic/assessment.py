@@ -0,0 +1,211 @@
+# src/logic/assessment.py
+#
+# Compact, immutable representation of one intake (21 symptoms + 20 user_data
+# answers). Every answer is stored as a 4-bit code, two per byte, so a full
+# intake is RECORD_SIZE = 21 bytes:
+#   - 1-5 scales:      the value itself (1-5)
+#   - multiple choice: index + 1 into the allowed choices
+#   - yes/no:          1 = False, 2 = True
+#   - 0 always means "not answered"
+#
+# An Assessment behaves like a read-only mapping (assessment['caffeine_pm'],
+# assessment.get('gender')), so ScoringEngine and JSONCoachingEngine accept it
+# wherever they accept the symptoms / user_data dicts.
+
+from src.logic.scoring import SYMPTOM_KEYS, SCALE_MIN, SCALE_MAX
+from src.logic.schema import CHOICE_FIELDS, BOOLEAN_FIELDS, USER_DATA_KEYS
+
+FIELDS = SYMPTOM_KEYS + USER_DATA_KEYS
+FIELD_INDEX = {key: i for i, key in enumerate(FIELDS)}
+RECORD_SIZE = (len(FIELDS) + 1) // 2  # 41 nibbles -> 21 bytes
+
+_SCALE_VALUES = tuple(range(SCALE_MIN, SCALE_MAX + 1))
+
+
+def field_values(key):
+    """Values a field can take, in code order (code = position + 1)."""
+    if key in CHOICE_FIELDS:
+        return tuple(CHOICE_FIELDS[key])
+    if key in BOOLEAN_FIELDS:
+        return (False, True)
+    return _SCALE_VALUES
+
+
+# Per field: code -> value (None for 0 / unanswered), and value -> code
+_DECODE = tuple((None,) + field_values(key) for key in FIELDS)
+_ENCODE = tuple({value: code for code, value in enumerate(field_values(key), 1)} for key in FIELDS)
+
+_MISSING = object()
+
+
+def _encode_value(i, value):
+    if value is None:
+        return 0
+    if FIELDS[i] in BOOLEAN_FIELDS:
+        if value is not True and value is not False:
+            raise ValueError(f"{FIELDS[i]} must be True/False, got {value!r}")
+    elif isinstance(value, bool):
+        raise ValueError(f"{FIELDS[i]} cannot be a boolean")
+    code = _ENCODE[i].get(value)
+    if code is None:
+        raise ValueError(f"{FIELDS[i]}: unsupported value {value!r}")
+    return code
+
+
+def pack_codes(codes):
+    """41 codes -> 21 packed bytes (high nibble first)."""
+    codes = list(codes) + [0] * (RECORD_SIZE * 2 - len(codes))
+    return bytes((codes[j] << 4) | codes[j + 1] for j in range(0, len(codes), 2))
+
+
+class Assessment:
+    """One intake, backed by its RECORD_SIZE-byte packed encoding."""
+    __slots__ = ("packed",)
+
+    def __init__(self, packed):
+        if len(packed) != RECORD_SIZE:
+            raise ValueError(f"expected {RECORD_SIZE} bytes, got {len(packed)}")
+        self.packed = bytes(packed)
+
+    # --- construction ---
+    @classmethod
+    def from_dicts(cls, symptoms, user_data):
+        """
+        Strict: raises ValueError for keys or values outside the intake schema,
+        so nothing is silently dropped.
+        """
+        unknown = (set(symptoms) - set(SYMPTOM_KEYS)) | (set(user_data) - set(USER_DATA_KEYS))
+        if unknown:
+            raise ValueError(f"fields outside the intake schema: {', '.join(sorted(unknown))}")
+        codes = [_encode_value(i, symptoms.get(key)) for i, key in enumerate(SYMPTOM_KEYS)]
+        offset = len(SYMPTOM_KEYS)
+        codes += [_encode_value(offset + i, user_data.get(key)) for i, key in enumerate(USER_DATA_KEYS)]
+        return cls(pack_codes(codes))
+
+    @classmethod
+    def from_bytes(cls, buffer, offset=0):
+        return cls(buffer[offset:offset + RECORD_SIZE])
+
+    def to_bytes(self):
+        return self.packed
+
+    # --- mapping protocol (what the engines use) ---
+    def code(self, key):
+        i = FIELD_INDEX[key]
+        byte = self.packed[i >> 1]
+        return byte & 0x0F if i & 1 else byte >> 4
+
+    def __getitem__(self, key):
+        i = FIELD_INDEX.get(key)
+        if i is None:
+            raise KeyError(key)
+        byte = self.packed[i >> 1]
+        value = _DECODE[i][byte & 0x0F if i & 1 else byte >> 4]
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        i = FIELD_INDEX.get(key)
+        if i is None:
+            return default
+        byte = self.packed[i >> 1]
+        value = _DECODE[i][byte & 0x0F if i & 1 else byte >> 4]
+        return default if value is None else value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def keys(self):
+        return [key for key in FIELDS if key in self]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    # --- conversions ---
+    @property
+    def symptoms(self):
+        return {key: self[key] for key in SYMPTOM_KEYS if key in self}
+
+    @property
+    def user_data(self):
+        return {key: self[key] for key in USER_DATA_KEYS if key in self}
+
+    def __eq__(self, other):
+        return isinstance(other, Assessment) and self.packed == other.packed
+
+    def __hash__(self):
+        return hash(self.packed)
+
+    def __repr__(self):
+        return f"Assessment({self.packed.hex()})"
+
+
+# ============================================
+# BULK: many records in one contiguous buffer
+# ============================================
+
+class PackedAssessments:
+    """
+    N assessments stored back to back (N * RECORD_SIZE bytes), e.g. read
+    from a file or an mmap. Decoding works on NumPy views of the buffer;
+    nothing is copied until codes are unpacked.
+    """
+
+    def __init__(self, buffer):
+        if len(buffer) % RECORD_SIZE:
+            raise ValueError(f"buffer length {len(buffer)} is not a multiple of {RECORD_SIZE}")
+        import numpy as np  # deferred: only bulk decoding needs it
+        self.buffer = buffer
+        self.raw = np.frombuffer(buffer, dtype=np.uint8).reshape(-1, RECORD_SIZE)  # zero-copy
+
+    @classmethod
+    def from_assessments(cls, assessments):
+        return cls(b"".join(a.packed for a in assessments))
+
+    @classmethod
+    def from_codes(cls, codes):
+        """Packs an (N x 41) code matrix (the inverse of codes())."""
+        import numpy as np
+        codes = np.asarray(codes, dtype=np.uint8)
+        if codes.ndim != 2 or codes.shape[1] != len(FIELDS):
+            raise ValueError(f"expected an (N x {len(FIELDS)}) code matrix, got shape {codes.shape}")
+        padded = np.zeros((codes.shape[0], RECORD_SIZE * 2), dtype=np.uint8)
+        padded[:, :len(FIELDS)] = codes
+        return cls(((padded[:, 0::2] << 4) | padded[:, 1::2]).tobytes())
+
+    def __len__(self):
+        return self.raw.shape[0]
+
+    def __getitem__(self, index):
+        start = index * RECORD_SIZE
+        return Assessment(self.buffer[start:start + RECORD_SIZE])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def codes(self, columns=None):
+        """(N x 41) uint8 codes (or just the requested field columns)."""
+        import numpy as np
+        codes = np.empty((len(self), RECORD_SIZE * 2), dtype=np.uint8)
+        codes[:, 0::2] = self.raw >> 4
+        codes[:, 1::2] = self.raw & 0x0F
+        codes = codes[:, :len(FIELDS)]
+        return codes if columns is None else codes[:, columns]
+
+    def column(self, key):
+        """Codes of one field for all N records, decoded straight from the view."""
+        i = FIELD_INDEX[key]
+        column = self.raw[:, i >> 1]
+        return column & 0x0F if i & 1 else column >> 4
+
+    def symptom_matrix(self):
+        """(N x 21) answers in SYMPTOM_KEYS order (1-5 codes are the values)."""
+        return self.codes()[:, :len(SYMPTOM_KEYS)]
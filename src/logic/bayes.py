@@ -0,0 +1,375 @@
+# src/logic/bayes.py
+"""
+Probabilistic scoring engine: a naive Bayes model per disorder whose
+conditional probability tables live in a data file (src/data/bayes_model.json).
+
+    {"format": 1, "disorders": {"Insomnia": {
+        "prior": 0.12,
+        "evidence": {
+            "insomnia_fall": {"present": [p(1), ..., p(5)], "absent": [...]},
+            "age": {"present": {"Child": 0.08, ...}, "absent": {...}}}}}}
+
+"present" is P(answer | disorder), "absent" is P(answer | no disorder). Any
+symptom key can be evidence for any disorder (co-occurrence, e.g. daytime
+sleepiness for narcolepsy), and "age" / "gender" shift the prior.
+
+Loading compiles each table into log-likelihood ratios, so a confidence is
+the prior log-odds plus one indexed read per piece of evidence, squashed to
+0-100%: P(disorder | answers) * 100. calculate_confidence() and
+calculate_confidence_batch() return the same shapes as ScoringEngine's.
+
+    EXLEEP_SCORING_ENGINE=bayes streamlit run app.py     # see get_scoring_engine()
+    python -m src.logic.bayes check                       # validate the model file
+    python -m src.logic.bayes fit labeled.jsonl -o model.json
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+
+from src.logic.scoring import DISORDERS, SYMPTOM_KEYS, SCALE_MIN, SCALE_MAX
+from src.logic.schema import CHOICE_FIELDS
+
+DEFAULT_MODEL_FILE = "src/data/bayes_model.json"
+FORMAT_VERSION = 1
+# Demographic evidence (a missing answer is no evidence)
+DEMOGRAPHIC_KEYS = ("age", "gender")
+EVIDENCE_KEYS = SYMPTOM_KEYS + DEMOGRAPHIC_KEYS
+
+_SCALE = tuple(range(SCALE_MIN, SCALE_MAX + 1))
+
+
+class ModelError(ValueError):
+    """Raised for a model file that is malformed or not a probability model."""
+
+
+def _values(key):
+    return _SCALE if key in SYMPTOM_KEYS else CHOICE_FIELDS[key]
+
+
+def _check_distribution(where, key, dist):
+    values = _values(key)
+    if key in SYMPTOM_KEYS:
+        if not isinstance(dist, list) or len(dist) != len(values):
+            raise ModelError(f"{where}: expected {len(values)} probabilities for answers {SCALE_MIN}-{SCALE_MAX}")
+        dist = dict(zip(values, dist))
+    elif not isinstance(dist, dict) or set(dist) != set(values):
+        raise ModelError(f"{where}: expected probabilities for {', '.join(values)}")
+    if any(isinstance(p, bool) or not isinstance(p, (int, float)) or not p > 0 for p in dist.values()):
+        raise ModelError(f"{where}: probabilities must be positive numbers")
+    if abs(sum(dist.values()) - 1.0) > 1e-3:
+        raise ModelError(f"{where}: probabilities sum to {sum(dist.values()):.4f}, not 1")
+    return dist
+
+
+def compile_model(model):
+    """
+    Validates a model dict. Returns (bias, ratios): per disorder the prior
+    log-odds, and per evidence key (EVIDENCE_KEYS order) a {value: (log
+    ratio per disorder, ...)} table.
+    """
+    if not isinstance(model, dict) or model.get("format") != FORMAT_VERSION:
+        raise ModelError(f"expected a format {FORMAT_VERSION} model")
+    disorders = model.get("disorders") or {}
+    if not isinstance(disorders, dict):
+        raise ModelError("'disorders' must be an object")
+    missing = [d for d in DISORDERS if d not in disorders]
+    if missing:
+        raise ModelError(f"no tables for {', '.join(missing)}")
+
+    bias = []
+    ratios = {}
+    for col, disorder in enumerate(DISORDERS):
+        entry = disorders[disorder]
+        if not isinstance(entry, dict):
+            raise ModelError(f"{disorder}: expected an object with 'prior' and 'evidence'")
+        prior = entry.get("prior")
+        if isinstance(prior, bool) or not isinstance(prior, (int, float)) or not 0 < prior < 1:
+            raise ModelError(f"{disorder}: prior must be between 0 and 1")
+        bias.append(math.log(prior / (1 - prior)))
+        evidence = entry.get("evidence") or {}
+        if not isinstance(evidence, dict):
+            raise ModelError(f"{disorder}: 'evidence' must be an object")
+        for key, tables in evidence.items():
+            if key not in EVIDENCE_KEYS:
+                raise ModelError(f"{disorder}: unknown evidence {key!r}")
+            where = f"{disorder}/{key}"
+            if not isinstance(tables, dict):
+                raise ModelError(f"{where}: expected an object with 'present' and 'absent'")
+            present = _check_distribution(where + "/present", key, tables.get("present"))
+            absent = _check_distribution(where + "/absent", key, tables.get("absent"))
+            table = ratios.setdefault(key, {v: [0.0] * len(DISORDERS) for v in _values(key)})
+            for value in table:
+                table[value][col] = math.log(present[value] / absent[value])
+
+    ordered = {key: {v: tuple(row) for v, row in ratios[key].items()} for key in EVIDENCE_KEYS if key in ratios}
+    return tuple(bias), ordered
+
+
+def _probability(z):
+    # P = 1 / (1 + e^-z), written with tanh so extreme log-odds can't overflow
+    return 50.0 * (1.0 + math.tanh(z / 2.0))
+
+
+class NaiveBayesEngine:
+    """
+    Drop-in alternative to ScoringEngine (calculate_confidence /
+    calculate_confidence_batch) backed by a compiled model.
+    """
+    name = "bayes"
+    DISORDERS = DISORDERS
+    SYMPTOM_KEYS = SYMPTOM_KEYS
+
+    def __init__(self, model, source=None):
+        self.model = model
+        self.source = source
+        self.bias, self.ratios = compile_model(model)
+        self.calculate_confidence = self._compile()
+        self._arrays = None
+
+    @classmethod
+    def load(cls, path):
+        """Raises ModelError (or OSError) for an unreadable model file."""
+        with open(path, encoding="utf-8") as f:
+            try:
+                model = json.load(f)
+            except ValueError as e:
+                raise ModelError(f"invalid JSON: {e}") from None
+        return cls(model, source=path)
+
+    # ============================================
+    # 1. SCALAR PATH (generated straight-line code)
+    # ============================================
+
+    def _compile(self):
+        """
+        Generates e.g.
+            z0 = B0 + R0[x['insomnia_fall']][0] + ... + G1.get(x.get('age'), Z)[0]
+        per disorder, reading only the evidence that disorder's tables use.
+        Symptom tables are tuples indexed by the answer itself.
+        """
+        namespace = {"_probability": _probability, "Z": (0.0,) * len(DISORDERS)}
+        lines = ["def infer(x):"]
+        used = {col: [] for col in range(len(DISORDERS))}
+        for i, (key, table) in enumerate(self.ratios.items()):
+            for col in used:
+                if any(row[col] for row in table.values()):
+                    used[col].append((i, key))
+            if key in SYMPTOM_KEYS:
+                namespace[f"R{i}"] = (None,) * SCALE_MIN + tuple(table[v] for v in _SCALE)
+            else:
+                namespace[f"R{i}"] = table
+        for col, disorder in enumerate(DISORDERS):
+            namespace[f"B{col}"] = self.bias[col]
+            terms = [f"B{col}"]
+            for i, key in used[col]:
+                if key in SYMPTOM_KEYS:
+                    terms.append(f"R{i}[x[{key!r}]][{col}]")
+                else:
+                    terms.append(f"R{i}.get(x.get({key!r}), Z)[{col}]")
+            lines.append(f"    z{col} = " + " + ".join(terms))
+        lines.append("    return {" + ", ".join(f"{d!r}: _probability(z{col})"
+                                               for col, d in enumerate(DISORDERS)) + "}")
+        exec(compile("\n".join(lines) + "\n", "<naive bayes inference>", "exec"), namespace)
+        return namespace["infer"]
+
+    def explain(self, data):
+        """
+        Per disorder, the log-odds terms calculate_confidence() adds up:
+        {disorder: (("prior", None, log odds), (key, answer, log ratio), ...)}.
+        Missing demographics contribute nothing and are left out.
+        """
+        terms = {}
+        for col, disorder in enumerate(DISORDERS):
+            rows = [("prior", None, self.bias[col])]
+            for key, table in self.ratios.items():
+                if not any(row[col] for row in table.values()):
+                    continue  # not evidence for this disorder
+                value = data[key] if key in SYMPTOM_KEYS else data.get(key)
+                if value in table:
+                    rows.append((key, value, table[value][col]))
+            terms[disorder] = tuple(rows)
+        return terms
+
+    # ============================================
+    # 2. BATCH PATH
+    # ============================================
+
+    def _get_arrays(self):
+        if self._arrays is None:
+            import numpy as np
+            arrays = []
+            for key, table in self.ratios.items():
+                values = _values(key)
+                arrays.append((key, values, np.array([table[v] for v in values])))  # (values x 6)
+            self._arrays = arrays
+        return self._arrays
+
+    def calculate_confidence_batch(self, data, user_data=None):
+        """
+        Scores N assessments at once: an (N x 6) array, columns in DISORDERS
+        order. data: anything ScoringEngine.to_matrix() accepts. user_data:
+        demographics for every row (one mapping) or per row (a sequence of
+        mappings); PackedAssessments carry their own.
+        """
+        import numpy as np
+        from src.logic.scoring import ScoringEngine
+
+        codes = ScoringEngine.to_matrix(data).astype(np.intp) - SCALE_MIN
+        n = codes.shape[0]
+        if user_data is None and hasattr(data, "symptom_matrix"):
+            user_data = list(data)
+        z = np.empty((n, len(DISORDERS)))
+        z[:] = self.bias
+        for key, values, table in self._get_arrays():
+            if key in SYMPTOM_KEYS:
+                z += table[codes[:, SYMPTOM_KEYS.index(key)]]
+                continue
+            if user_data is None:
+                continue
+            # Unknown / missing demographics index an all-zero row
+            padded = np.vstack([table, np.zeros(len(DISORDERS))])
+            index = {v: i for i, v in enumerate(values)}
+            if hasattr(user_data, "get"):
+                z += padded[index.get(user_data.get(key), len(values))]
+            else:
+                z += padded[np.fromiter((index.get(row.get(key), len(values)) for row in user_data),
+                                        dtype=np.intp, count=n)]
+        return 50.0 * (1.0 + np.tanh(z / 2.0))
+
+    def verify(self, n=10000, seed=0):
+        """
+        Checks the generated scalar code against the batch path on n seeded
+        random assessments. Returns the largest difference (percentage points).
+        """
+        import numpy as np
+        from src.synthetic import generate_assessments
+
+        records = list(generate_assessments(n, seed))
+        matrix = [[s[k] for k in SYMPTOM_KEYS] for s, _ in records]
+        batch = self.calculate_confidence_batch(matrix, [u for _, u in records])
+        scalar = np.array([[self.calculate_confidence({**s, **u})[d] for d in DISORDERS] for s, u in records])
+        return float(np.abs(batch - scalar).max())
+
+
+# ============================================
+# 3. FITTING FROM LABELED ASSESSMENTS
+# ============================================
+
+def fit(answers, labels, user_data=None, smoothing=1.0, evidence=None):
+    """
+    Estimates a model (dict, ready for json.dump) from an (N x 21) answer
+    matrix and (N x 6) confirmed-diagnosis matrix, by counting with add-
+    `smoothing` (Laplace) smoothing. user_data: per-row mappings with the
+    demographics. evidence: keys to use (default: every symptom, plus the
+    demographics when user_data is given).
+    """
+    import numpy as np
+
+    answers = np.asarray(answers)
+    labels = np.asarray(labels, dtype=bool)
+    if evidence is None:
+        evidence = SYMPTOM_KEYS + (DEMOGRAPHIC_KEYS if user_data is not None else ())
+    model = {"format": FORMAT_VERSION, "disorders": {}}
+    n = len(labels)
+
+    columns = {}
+    for key in evidence:
+        values = _values(key)
+        if key in SYMPTOM_KEYS:
+            columns[key] = answers[:, SYMPTOM_KEYS.index(key)].astype(np.intp) - SCALE_MIN
+        else:
+            index = {v: i for i, v in enumerate(values)}
+            columns[key] = np.array([index.get(row.get(key), -1) for row in user_data], dtype=np.intp)
+
+    for col, disorder in enumerate(DISORDERS):
+        positive = labels[:, col]
+        positives = int(positive.sum())
+        prior = (positives + smoothing) / (n + 2 * smoothing)
+        tables = {}
+        for key in evidence:
+            values = _values(key)
+            column = columns[key]
+            known = column >= 0
+            counts_present = np.bincount(column[known & positive], minlength=len(values)) + smoothing
+            counts_absent = np.bincount(column[known & ~positive], minlength=len(values)) + smoothing
+            present = (counts_present / counts_present.sum()).round(6).tolist()
+            absent = (counts_absent / counts_absent.sum()).round(6).tolist()
+            if key not in SYMPTOM_KEYS:
+                present, absent = dict(zip(values, present)), dict(zip(values, absent))
+            tables[key] = {"present": present, "absent": absent}
+        model["disorders"][disorder] = {"prior": round(prior, 6), "evidence": tables}
+    return model
+
+
+# ============================================
+# 4. SHARED ENGINE
+# ============================================
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_bayes_engine(path=None):
+    """
+    Process-wide engine for path, else $EXLEEP_BAYES_MODEL, else
+    src/data/bayes_model.json. Raises ModelError / OSError for a bad file.
+    """
+    from src.logic.coaching import resolve_rules_path
+
+    path = path or os.environ.get("EXLEEP_BAYES_MODEL") or resolve_rules_path(DEFAULT_MODEL_FILE)
+    engine = _engines.get(path)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(path)
+            if engine is None:
+                engine = _engines[path] = NaiveBayesEngine.load(path)
+    return engine
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check or fit the naive Bayes scoring model.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    check = commands.add_parser("check", help="validate a model file and verify scalar == batch scoring")
+    check.add_argument("model", nargs="?", help=f"model file (default: {DEFAULT_MODEL_FILE})")
+    fit_cmd = commands.add_parser("fit", help="estimate a model from labeled assessments")
+    fit_cmd.add_argument("input", help="labeled JSONL or CSV (see src.calibration)")
+    fit_cmd.add_argument("-o", "--output", required=True)
+    fit_cmd.add_argument("--smoothing", type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    if args.command == "check":
+        try:
+            engine = get_bayes_engine(args.model)
+        except (ModelError, OSError) as e:
+            print(f"Error: {e}")
+            return 1
+        evidence = sum(len(t) for t in engine.ratios.values())
+        print(f"{engine.source}: {len(engine.ratios)} evidence keys, {evidence} table rows")
+        print(f"scalar vs batch: max difference {engine.verify():.2e} points")
+        return 0
+
+    from src.calibration import read_labeled
+    try:
+        answers, labels, user_data = read_labeled(args.input, user_data_keys=DEMOGRAPHIC_KEYS)
+    except (OSError, ValueError) as e:
+        print(f"Error: could not read {args.input}: {e}")
+        return 1
+    if len(labels) == 0:
+        print("Error: no labeled assessments")
+        return 1
+    # Demographic tables only when the input has demographics
+    model = fit(answers, labels, user_data if any(user_data) else None, args.smoothing)
+    NaiveBayesEngine(model)  # refuses a model it couldn't score with
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(model, f, indent=2)
+        f.write("\n")
+    print(f"Fitted {len(labels):,} assessments -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
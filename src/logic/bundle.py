@@ -0,0 +1,172 @@
+# src/logic/bundle.py
+"""
+Precompiled rule bundles: rules.json -> rules.bundle, built ahead of time so
+a fresh process skips JSON parsing, condition compilation and indexing.
+
+    python -m src.logic.bundle                      # build src/data/rules.bundle
+    python -m src.logic.bundle path/to/rules.json   # any other knowledge base
+    python -m src.logic.bundle --check              # exit 1 if a bundle is missing/stale
+
+Layout (big-endian header, then the payload):
+
+    magic           8 bytes   b"EXLEEPRB"
+    format version  uint16    FORMAT_VERSION
+    rule count      uint32
+    source sha256   32 bytes  of the rules.json bytes the bundle was built from
+    payload sha256  32 bytes
+    payload         pickle of (rules, compiled rules, rule index)
+
+The engine only uses a bundle whose source hash equals the current JSON file,
+so an edited rules.json is never shadowed by an old bundle: it silently falls
+back to compiling the JSON. A bundle is a build artifact with the same trust
+as the source tree; the payload hash catches truncation and corruption.
+"""
+
+import argparse
+import hashlib
+import os
+import pickle
+import struct
+import sys
+
+MAGIC = b"EXLEEPRB"
+# Bump whenever the compiled classes in coaching.py change shape
+FORMAT_VERSION = 2
+PICKLE_PROTOCOL = 4
+
+_HEADER = struct.Struct(">8sHI32s32s")
+
+
+class BundleError(ValueError):
+    """Raised when a bundle file is truncated, corrupt or from another format version."""
+
+
+def bundle_path_for(rules_path):
+    """src/data/rules.json -> src/data/rules.bundle"""
+    root, _ = os.path.splitext(rules_path)
+    return root + ".bundle"
+
+
+def bundles_enabled():
+    """EXLEEP_RULES_BUNDLE=0 forces the JSON path (e.g. to compare startup times)."""
+    return os.environ.get("EXLEEP_RULES_BUNDLE", "1") != "0"
+
+
+def write_bundle(path, source_digest, rules, compiled, index):
+    payload = pickle.dumps((tuple(rules), tuple(compiled), index), protocol=PICKLE_PROTOCOL)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, len(compiled),
+                          bytes.fromhex(source_digest), hashlib.sha256(payload).digest())
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(payload)
+    os.replace(tmp_path, path)  # readers never see a half-written bundle
+
+
+def read_header(data):
+    """Returns (format version, rule count, source digest hex, payload digest)."""
+    if len(data) < _HEADER.size:
+        raise BundleError("truncated header")
+    magic, version, count, source, payload_digest = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise BundleError("not a rule bundle")
+    return version, count, source.hex(), payload_digest
+
+
+def load_bundle(path, source_digest):
+    """
+    Returns (rules, compiled, index) from the bundle at path, or None when
+    there is no bundle or it was built from a different rules.json.
+    Raises BundleError for an unreadable bundle.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+
+    version, count, source, payload_digest = read_header(data)
+    if version != FORMAT_VERSION:
+        raise BundleError(f"format version {version}, expected {FORMAT_VERSION}")
+    if source != source_digest:
+        return None  # stale: rules.json changed since the build
+
+    payload = memoryview(data)[_HEADER.size:]
+    if hashlib.sha256(payload).digest() != payload_digest:
+        raise BundleError("checksum mismatch")
+    rules, compiled, index = pickle.loads(payload)
+    if len(compiled) != count:
+        raise BundleError(f"expected {count} rules, found {len(compiled)}")
+    return rules, compiled, index
+
+
+# ============================================
+# BUILD STEP
+# ============================================
+
+def build_bundle(rules_file, output=None):
+    """
+    Validates rules_file (every rule must compile) and writes its bundle.
+    Returns the bundle path; raises RuleSyntaxError / ValueError on bad input.
+    """
+    import json
+    from src.logic.coaching import RuleSet, compile_rules, resolve_rules_path
+
+    full_path = resolve_rules_path(rules_file)
+    with open(full_path, "rb") as f:
+        raw = f.read()
+    rules = json.loads(raw.decode("utf-8"))
+    if not isinstance(rules, list):
+        raise ValueError(f"{full_path}: expected a list of rules")
+    compiled = compile_rules(rules, strict=True)
+    digest = hashlib.sha256(raw).hexdigest()
+    rule_set = RuleSet(full_path, rules, compiled, digest, 1)
+
+    output = output or bundle_path_for(full_path)
+    write_bundle(output, digest, rule_set.rules, rule_set.compiled, rule_set.index)
+    return output
+
+
+def check_bundle(rules_file):
+    """'ok', 'missing', 'stale' or 'invalid: <reason>' for rules_file's bundle."""
+    from src.logic.coaching import resolve_rules_path
+
+    full_path = resolve_rules_path(rules_file)
+    with open(full_path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    path = bundle_path_for(full_path)
+    if not os.path.exists(path):
+        return "missing"
+    try:
+        return "ok" if load_bundle(path, digest) is not None else "stale"
+    except BundleError as e:
+        return f"invalid: {e}"
+
+
+def main(argv=None):
+    from src.logic.coaching import DEFAULT_RULES_FILE, RuleSyntaxError
+
+    parser = argparse.ArgumentParser(description="Compile rules.json files into binary rule bundles.")
+    parser.add_argument("rules_files", nargs="*", default=[DEFAULT_RULES_FILE])
+    parser.add_argument("--check", action="store_true", help="only report whether each bundle is up to date")
+    args = parser.parse_args(argv)
+
+    status = 0
+    for rules_file in args.rules_files:
+        if args.check:
+            state = check_bundle(rules_file)
+            print(f"{rules_file}: {state}")
+            status |= state != "ok"
+            continue
+        try:
+            path = build_bundle(rules_file)
+        except (RuleSyntaxError, ValueError, OSError) as e:
+            print(f"Error: {rules_file}: {e}")
+            status = 1
+            continue
+        print(f"{rules_file} -> {path} ({os.path.getsize(path):,} bytes)")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+# src/logic/cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+from src.logic.scoring import FLAG_THRESHOLD
+from src.logic.assessment import Assessment
+from src.logic.coaching import JSONCoachingEngine
+from src.logic.pipeline import assess
+from src.logic.thresholds import get_thresholds
+
+
+def canonical_key(symptoms, user_data):
+    """
+    Encodes an assessment as a short canonical key: the 21-byte packed
+    Assessment encoding for anything inside the intake schema. Off-schema
+    input (extra keys, unusual values) falls back to a sorted tuple of items,
+    which is still canonical but larger.
+    """
+    try:
+        return Assessment.from_dicts(symptoms, user_data).packed
+    except (ValueError, TypeError):
+        by_key = lambda item: item[0]
+        return (tuple(sorted(symptoms.items(), key=by_key)),
+                tuple(sorted(user_data.items(), key=by_key)))
+
+
+class AssessmentCache:
+    """
+    Bounded LRU cache of full pipeline results (scores, active diagnoses,
+    advice), keyed on canonical_key(). Entries expire after `ttl` seconds and
+    the whole cache is dropped when the coaching rule set is hot-reloaded.
+    Safe to share between threads (e.g. concurrent Streamlit sessions).
+
+    Cached results are shared between callers: treat them as read-only.
+    """
+
+    def __init__(self, coach=None, maxsize=4096, ttl=600.0, threshold=FLAG_THRESHOLD,
+                 clock=time.monotonic):
+        self.coach = coach or JSONCoachingEngine()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, result)
+        self._rule_set = self.coach.rule_set
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _check_rule_set(self):
+        rule_set = self.coach.refresh()
+        if rule_set is not self._rule_set:
+            with self._lock:
+                if rule_set is not self._rule_set:
+                    self._entries.clear()
+                    self._rule_set = rule_set
+                    self.invalidations += 1
+
+    def get(self, key):
+        self._check_rule_set()
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, result, rule_set=None):
+        """rule_set: the snapshot the result was computed with (stale ones are dropped)."""
+        expires_at = self.clock() + self.ttl
+        with self._lock:
+            if rule_set is not None and rule_set is not self._rule_set:
+                return
+            self._entries[key] = (expires_at, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def assess(self, symptoms, user_data):
+        """Cached pipeline.assess()."""
+        key = canonical_key(symptoms, user_data)
+        result = self.get(key)
+        if result is None:
+            rule_set = self._rule_set
+            result = assess(symptoms, user_data, self.coach, self.threshold)
+            self.put(key, result, rule_set)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_cache():
+    """One AssessmentCache per process for the default rules file and configured thresholds."""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_lock:
+            if _shared_cache is None:
+                _shared_cache = AssessmentCache(threshold=get_thresholds())
+    return _shared_cache
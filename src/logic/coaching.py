@@ -1,99 +1,756 @@
+import bisect
+import hashlib
 import json
 import operator
 import os
+import pickle
+import re
+import threading
+import time
 
-class JSONCoachingEngine:
-    def __init__(self, rules_file="src/data/rules.json"):
-        # Load rules from JSON file
-        self.rules = self._load_rules(rules_file)
-        
-        # Map string operators to Python functions
-        self.ops = {
-            "==": operator.eq,
-            "!=": operator.ne,
-            ">": operator.gt,
-            ">=": operator.ge,
-            "<": operator.lt,
-            "<=": operator.le,
-        }
-
-    def _load_rules(self, filepath):
-        """Safely loads the JSON file."""
-        try:
-            # Construct absolute path to ensure it finds the file
-            base_path = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-            full_path = os.path.join(base_path, filepath)
-            
-            with open(full_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            print(f"Error: Could not find rules file at {filepath}")
-            return []
+from src.logic.bundle import BundleError, bundle_path_for, bundles_enabled, load_bundle
+
+# Map string operators to Python functions
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+
+class RuleSyntaxError(ValueError):
+    """Raised when a rule's 'condition' string cannot be compiled."""
+
+    def __init__(self, rule_id, message):
+        super().__init__(f"rule {rule_id}: {message}")
+        self.rule_id = rule_id
 
-    def evaluate(self, person_data, diagnoses):
-        """
-        person_data: Dictionary of user answers (e.g., {'caffeine_pm': 3})
-        diagnoses: List of diagnosis strings (e.g., ['Insomnia'])
-        """
-        advice_list = []
 
-        for rule in self.rules:
-            # 1. Check Condition (e.g., "caffeine_pm >= 3")
-            condition_met = self._check_condition(rule, person_data)
-            
-            # 2. Check Context (Diagnosis requirements)
-            context_met = self._check_context(rule, diagnoses)
+# ============================================
+# 1. COMPILED PREDICATES
+# ============================================
+# Each condition string is compiled once into a tree of these small callables.
+# Calling one with the user's answers is just dict lookups and comparisons.
 
-            if condition_met and context_met:
-                advice_list.append(rule['advice'])
+class Comparison:
+    """Leaf predicate: `var <op> target` with a pre-typed target."""
+    __slots__ = ("var", "op_symbol", "op", "target", "rule_id")
 
-        return advice_list
+    def __init__(self, var, op_symbol, target, rule_id="unknown"):
+        self.var = var
+        self.op_symbol = op_symbol
+        self.op = OPERATORS[op_symbol]
+        self.target = target
+        self.rule_id = rule_id
 
-    def _check_condition(self, rule, person_data):
-        if 'condition' not in rule: return True
+    def __call__(self, person_data):
+        user_val = person_data.get(self.var)
+        # If user didn't answer, we can't evaluate
+        if user_val is None:
+            return False
         try:
-            # Parse string "var >= val"
-            # Split into max 3 parts to handle values with spaces if needed
-            parts = rule['condition'].split(' ', 2) 
-            if len(parts) != 3: return False
-            
-            var, op, val_str = parts[0], parts[1], parts[2]
-            
-            # --- FIX: Handle Booleans, Strings, and Numbers ---
-            if val_str == "True":
-                target = True
-            elif val_str == "False":
-                target = False
-            elif "'" in val_str or '"' in val_str:
-                target = val_str.strip("'").strip('"')
-            else:
-                try:
-                    target = float(val_str)
-                except ValueError:
-                    target = val_str # Fallback to string
-            # --------------------------------------------------
-
-            user_val = person_data.get(var)
-            
-            # If user didn't answer, we can't evaluate
-            if user_val is None: return False 
-            
-            return self.ops[op](user_val, target)
-        except Exception as e:
-            print(f"Error evaluating rule {rule.get('id', 'unknown')}: {e}")
+            return self.op(user_val, self.target)
+        except TypeError:
+            # e.g. comparing a string answer against a numeric threshold
+            if _profiler is not None:
+                _profiler.record_error(self.rule_id)
+            return False
+
+    def variables(self):
+        return {self.var}
+
+    def __repr__(self):
+        return f"{self.var} {self.op_symbol} {self.target!r}"
+
+
+class AllOf:
+    __slots__ = ("children",)
+
+    def __init__(self, children):
+        self.children = tuple(children)
+
+    def __call__(self, person_data):
+        for child in self.children:
+            if not child(person_data):
+                return False
+        return True
+
+    def variables(self):
+        return set().union(*(c.variables() for c in self.children))
+
+    def __repr__(self):
+        return "(" + " and ".join(map(repr, self.children)) + ")"
+
+
+class AnyOf:
+    __slots__ = ("children",)
+
+    def __init__(self, children):
+        self.children = tuple(children)
+
+    def __call__(self, person_data):
+        for child in self.children:
+            if child(person_data):
+                return True
         return False
-    
-    def _check_context(self, rule, diagnoses):
+
+    def variables(self):
+        return set().union(*(c.variables() for c in self.children))
+
+    def __repr__(self):
+        return "(" + " or ".join(map(repr, self.children)) + ")"
+
+
+class Not:
+    __slots__ = ("child",)
+
+    def __init__(self, child):
+        self.child = child
+
+    def __call__(self, person_data):
+        return not self.child(person_data)
+
+    def variables(self):
+        return self.child.variables()
+
+    def __repr__(self):
+        return f"not {self.child!r}"
+
+
+class Always:
+    """Predicate for rules without a 'condition' key."""
+    __slots__ = ()
+
+    def __call__(self, person_data):
+        return True
+
+    def variables(self):
+        return set()
+
+    def __repr__(self):
+        return "True"
+
+
+ALWAYS = Always()
+
+
+# ============================================
+# 2. CONDITION PARSER
+# ============================================
+# Grammar:
+#   expr       := and_expr ('or' and_expr)*
+#   and_expr   := not_expr ('and' not_expr)*
+#   not_expr   := 'not' not_expr | '(' expr ')' | comparison
+#   comparison := NAME OP VALUE
+
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<string>'[^']*'|"[^"]*")
+      | (?P<op>==|!=|>=|<=|>|<)
+      | (?P<paren>[()])
+      | (?P<word>[^\s()'"=!<>]+)
+    )""", re.VERBOSE)
+
+_KEYWORDS = {"and", "or", "not"}
+
+
+def _tokenize(text, rule_id):
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if match is None or match.end() == pos:
+            raise RuleSyntaxError(rule_id, f"unexpected character at {pos} in {text!r}")
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        pos = match.end()
+    return tokens
+
+
+def _parse_literal(kind, raw):
+    """Infers the target type once: bool, quoted string, float, or bare string."""
+    if kind == "string":
+        return raw[1:-1]
+    if raw == "True":
+        return True
+    if raw == "False":
+        return False
+    try:
+        return float(raw)
+    except ValueError:
+        return raw  # Fallback to string
+
+
+class _Parser:
+    def __init__(self, text, rule_id):
+        self.rule_id = rule_id
+        self.text = text
+        self.tokens = _tokenize(text, rule_id)
+        self.pos = 0
+
+    def error(self, message):
+        raise RuleSyntaxError(self.rule_id, f"{message} in {self.text!r}")
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def advance(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            self.error("empty condition")
+        node = self.parse_or()
+        if self.pos != len(self.tokens):
+            self.error(f"unexpected token {self.peek()[1]!r}")
+        return node
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek() == ("word", "or"):
+            self.advance()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else AnyOf(children)
+
+    def parse_and(self):
+        children = [self.parse_not()]
+        while self.peek() == ("word", "and"):
+            self.advance()
+            children.append(self.parse_not())
+        return children[0] if len(children) == 1 else AllOf(children)
+
+    def parse_not(self):
+        kind, value = self.peek()
+        if (kind, value) == ("word", "not"):
+            self.advance()
+            return Not(self.parse_not())
+        if (kind, value) == ("paren", "("):
+            self.advance()
+            node = self.parse_or()
+            if self.advance() != ("paren", ")"):
+                self.error("missing ')'")
+            return node
+        return self.parse_comparison()
+
+    def parse_comparison(self):
+        kind, var = self.advance()
+        if kind != "word" or var in _KEYWORDS:
+            self.error(f"expected variable name, got {var!r}")
+        kind, op = self.advance()
+        if kind != "op":
+            self.error(f"expected operator after {var!r}, got {op!r}")
+        kind, raw = self.advance()
+        if kind not in ("word", "string") or raw in _KEYWORDS:
+            self.error(f"expected value after {var} {op}, got {raw!r}")
+        return Comparison(var, op, _parse_literal(kind, raw), self.rule_id)
+
+
+def compile_condition(text, rule_id="unknown"):
+    """Compiles a condition string (e.g. "caffeine_pm >= 3 and not naps >= 3")."""
+    if not isinstance(text, str):
+        raise RuleSyntaxError(rule_id, f"condition must be a string, got {type(text).__name__}")
+    return _Parser(text, rule_id).parse()
+
+
+# ============================================
+# 3. COMPILED RULES
+# ============================================
+
+# Advice severity, from keywords in the advice text: (severity, keywords), first match wins
+SEVERITY_KEYWORDS = (
+    ("critical", ("MEDICAL", "CRITICAL")),
+    ("warning", ("FIX",)),
+)
+DEFAULT_SEVERITY = "info"
+
+
+def advice_severity(advice):
+    """'critical', 'warning' or 'info' for one advice string."""
+    for severity, keywords in SEVERITY_KEYWORDS:
+        if any(keyword in advice for keyword in keywords):
+            return severity
+    return DEFAULT_SEVERITY
+
+
+class CompiledRule:
+    __slots__ = ("id", "advice", "predicate", "required_diagnosis", "block_if_diagnosis", "source",
+                 "severity")
+
+    def __init__(self, rule):
+        self.id = rule.get('id', 'unknown')
+        if 'advice' not in rule:
+            raise RuleSyntaxError(self.id, "missing 'advice'")
+        self.advice = rule['advice']
+        if 'condition' in rule:
+            self.predicate = compile_condition(rule['condition'], self.id)
+        else:
+            self.predicate = ALWAYS
+        self.required_diagnosis = rule.get('required_diagnosis')
+        self.block_if_diagnosis = rule.get('block_if_diagnosis')
+        self.source = rule
+        self.severity = advice_severity(self.advice)  # classified once, at load time
+
+    def context_met(self, diagnoses):
         """Checks 'required_diagnosis' and 'block_if_diagnosis'"""
-        
         # Requirement Check
-        if 'required_diagnosis' in rule:
-            if rule['required_diagnosis'] not in diagnoses:
-                return False # Diagnosis missing, don't show advice
-
+        if self.required_diagnosis is not None and self.required_diagnosis not in diagnoses:
+            return False  # Diagnosis missing, don't show advice
         # Blocking Check (Prevent duplicate/conflicting advice)
-        if 'block_if_diagnosis' in rule:
-            if rule['block_if_diagnosis'] in diagnoses:
-                return False # Diagnosis present, block this generic advice
+        if self.block_if_diagnosis is not None and self.block_if_diagnosis in diagnoses:
+            return False  # Diagnosis present, block this generic advice
+        return True
+
+    def __repr__(self):
+        return f"CompiledRule({self.id!r}, {self.predicate!r})"
+
+
+def compile_rules(raw_rules, strict=False):
+    """
+    Compiles a list of rule dicts. Broken rules are reported (and skipped)
+    here, at load time, instead of on every evaluate() call.
+    With strict=True the first error is raised instead.
+    """
+    compiled = []
+    for rule in raw_rules:
+        try:
+            compiled.append(CompiledRule(rule))
+        except RuleSyntaxError as e:
+            if strict:
+                raise
+            print(f"Error compiling {e}")
+    return compiled
+
+
+# ============================================
+# 4. THRESHOLD INDEX
+# ============================================
+# Built once per RuleSet so evaluate() touches only the rules that can match:
+#   - rules are partitioned by (required_diagnosis, block_if_diagnosis), and a
+#     whole partition is skipped when its context fails;
+#   - single `var >=/>/<=/< number` rules sit in per-variable sorted threshold
+#     lists, so bisect finds every satisfied rule;
+#   - single `var == value` rules sit in per-variable hash buckets;
+#   - anything else (compound, !=, string ordering) is checked directly.
+
+# Below this many rules a plain scan is faster than the index
+INDEX_MIN_RULES = 32
+
+_ORDERING_OPS = (">=", ">", "<=", "<")
+
+
+class _VariableIndex:
+    """Every indexable rule on one variable inside one context partition."""
+    __slots__ = ("var", "sorted", "equal")
+
+    def __init__(self, var):
+        self.var = var
+        self.sorted = {}  # op -> (ascending thresholds, rule positions)
+        self.equal = {}   # target -> rule positions
+
+    def freeze(self, pending):
+        for op, pairs in pending.items():
+            pairs.sort()
+            self.sorted[op] = ([t for t, _ in pairs], [pos for _, pos in pairs])
 
-        return True
\ No newline at end of file
+    def match(self, value, hits):
+        if value != value:  # NaN (json accepts it): every comparison is False, as in the scan
+            return
+        if self.equal:
+            try:
+                hits.extend(self.equal.get(value, ()))
+            except TypeError:  # unhashable answer: equal to no literal target
+                pass
+        for op, (thresholds, positions) in self.sorted.items():
+            try:
+                if op == ">=":    # threshold <= value
+                    hits.extend(positions[:bisect.bisect_right(thresholds, value)])
+                elif op == ">":   # threshold < value
+                    hits.extend(positions[:bisect.bisect_left(thresholds, value)])
+                elif op == "<=":  # threshold >= value
+                    hits.extend(positions[bisect.bisect_left(thresholds, value):])
+                else:             # threshold > value
+                    hits.extend(positions[bisect.bisect_right(thresholds, value):])
+            except TypeError:  # e.g. a string answer against numeric thresholds
+                pass
+
+
+class _Partition:
+    __slots__ = ("required", "block", "variables", "residual")
+
+    def __init__(self, required, block):
+        self.required = required
+        self.block = block
+        self.variables = []  # [_VariableIndex]
+        self.residual = []   # positions of rules checked with their predicate
+
+
+class RuleIndex:
+    def __init__(self, compiled):
+        partitions = {}
+        pending = {}  # (partition key, var) -> {op: [(threshold, pos)]}
+        variables = {}
+        for pos, rule in enumerate(compiled):
+            key = (rule.required_diagnosis, rule.block_if_diagnosis)
+            partition = partitions.get(key)
+            if partition is None:
+                partition = partitions[key] = _Partition(*key)
+
+            pred = rule.predicate
+            if not isinstance(pred, Comparison):
+                partition.residual.append(pos)
+                continue
+            index = variables.get((key, pred.var))
+            if index is None:
+                index = variables[(key, pred.var)] = _VariableIndex(pred.var)
+                partition.variables.append(index)
+            target = pred.target
+            numeric = isinstance(target, (int, float)) and target == target  # excludes NaN
+            if pred.op_symbol == "==":
+                try:
+                    index.equal.setdefault(target, []).append(pos)
+                except TypeError:
+                    partition.residual.append(pos)
+            elif pred.op_symbol in _ORDERING_OPS and numeric:
+                pending.setdefault((key, pred.var), {}).setdefault(pred.op_symbol, []).append((target, pos))
+            else:
+                partition.residual.append(pos)
+
+        for (key, var), ops in pending.items():
+            variables[(key, var)].freeze(ops)
+        self.partitions = tuple(partitions.values())
+        self.compiled = compiled
+
+    def evaluate(self, person_data, diagnoses):
+        """Fired CompiledRules, in knowledge-base order."""
+        compiled = self.compiled
+        hits = []
+        for partition in self.partitions:
+            if partition.required is not None and partition.required not in diagnoses:
+                continue
+            if partition.block is not None and partition.block in diagnoses:
+                continue
+            for index in partition.variables:
+                value = person_data.get(index.var)
+                if value is not None:
+                    index.match(value, hits)
+            for pos in partition.residual:
+                if compiled[pos].predicate(person_data):
+                    hits.append(pos)
+        hits.sort()
+        return [compiled[pos] for pos in hits]
+
+
+# ============================================
+# 5. SHARED RULE SNAPSHOTS (hot reload)
+# ============================================
+# One immutable RuleSet per rules file is shared by every engine in the
+# process. Readers grab the current snapshot reference without locking; a
+# reload builds a complete new RuleSet and swaps the reference in one step.
+
+DEFAULT_RULES_FILE = "src/data/rules.json"
+
+# Minimum seconds between os.stat() checks of a rules file
+RELOAD_CHECK_INTERVAL = 1.0
+
+_BUILD_INDEX = object()
+
+
+class RuleSet:
+    """Immutable, compiled snapshot of one version of a knowledge base."""
+    __slots__ = ("path", "rules", "compiled", "digest", "version", "index")
+
+    def __init__(self, path, rules, compiled, digest, version, index=_BUILD_INDEX):
+        self.path = path
+        self.rules = tuple(rules)
+        self.compiled = tuple(compiled)
+        self.digest = digest
+        self.version = version
+        if index is _BUILD_INDEX:
+            index = RuleIndex(self.compiled) if len(self.compiled) >= INDEX_MIN_RULES else None
+        self.index = index
+
+    def __len__(self):
+        return len(self.compiled)
+
+    def __repr__(self):
+        return f"RuleSet({self.path!r}, rules={len(self)}, version={self.version})"
+
+
+class _Entry:
+    __slots__ = ("snapshot", "stat_key", "checked_at")
+
+    def __init__(self, snapshot, stat_key, checked_at):
+        self.snapshot = snapshot
+        self.stat_key = stat_key
+        self.checked_at = checked_at
+
+
+_entries = {}
+_reload_lock = threading.Lock()
+
+
+def resolve_rules_path(filepath):
+    # Construct absolute path to ensure it finds the file
+    base_path = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    return os.path.normpath(os.path.join(base_path, filepath))
+
+
+def _stat_key(full_path):
+    try:
+        st = os.stat(full_path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _build_snapshot(full_path, previous):
+    """Reads, hashes and compiles the file. Returns previous if content is unchanged."""
+    try:
+        with open(full_path, 'rb') as f:
+            raw = f.read()
+    except FileNotFoundError:
+        print(f"Error: Could not find rules file at {full_path}")
+        if previous is not None:
+            return previous  # e.g. mid atomic save or deploy: keep the last good version
+        return RuleSet(full_path, [], [], None, 1)
+
+    digest = hashlib.sha256(raw).hexdigest()
+    if previous is not None and previous.digest == digest:
+        return previous  # touched but not edited
+
+    version = previous.version + 1 if previous else 1
+    if bundles_enabled():
+        try:
+            bundle = load_bundle(bundle_path_for(full_path), digest)
+        except (BundleError, pickle.UnpicklingError, AttributeError, EOFError) as e:
+            print(f"Warning: ignoring rule bundle for {full_path}: {e}")
+            bundle = None
+        if bundle is not None:
+            rules, compiled, index = bundle
+            return RuleSet(full_path, rules, compiled, digest, version, index)
+
+    try:
+        rules = json.loads(raw.decode('utf-8'))
+    except ValueError as e:
+        print(f"Error: Could not parse rules file at {full_path}: {e}")
+        if previous is not None:
+            return previous  # keep serving the last good version
+        rules = []
+
+    return RuleSet(full_path, rules, compile_rules(rules), digest, version)
+
+
+def get_rule_set(rules_file=DEFAULT_RULES_FILE, force_check=False):
+    """
+    Returns the current shared RuleSet for rules_file, reloading it if the
+    file's mtime/size changed. The stat itself is throttled to once per
+    RELOAD_CHECK_INTERVAL seconds.
+    """
+    full_path = resolve_rules_path(rules_file)
+    entry = _entries.get(full_path)
+    now = time.monotonic()
+    if entry is not None and not force_check and now - entry.checked_at < RELOAD_CHECK_INTERVAL:
+        return entry.snapshot
+
+    stat_key = _stat_key(full_path)
+    if entry is not None and entry.stat_key == stat_key:
+        entry.checked_at = now
+        return entry.snapshot
+
+    with _reload_lock:
+        # Another thread may have reloaded while we waited for the lock
+        current = _entries.get(full_path)
+        if current is not None and current is not entry and current.stat_key == stat_key:
+            return current.snapshot
+        snapshot = _build_snapshot(full_path, current.snapshot if current else None)
+        _entries[full_path] = _Entry(snapshot, stat_key, now)
+        return snapshot
+
+
+def clear_rule_cache():
+    """Drops all shared snapshots (the next access reloads from disk)."""
+    with _reload_lock:
+        _entries.clear()
+
+
+# ============================================
+# 6. RULE PROFILER (opt-in)
+# ============================================
+# While disabled, the only cost is one `_profiler is not None` check per
+# evaluate() call (and per failed comparison).
+
+_profiler = None
+
+PROFILE_COUNTERS = ("evaluated", "condition_true", "required_missing", "context_blocked",
+                    "fired", "errors", "time_ns")
+
+
+class RuleProfiler:
+    """
+    Per-rule-id counters:
+      evaluated         times the rule was checked
+      condition_true    times its condition held
+      required_missing  condition held but 'required_diagnosis' was absent
+      context_blocked   condition held but 'block_if_diagnosis' suppressed it
+      fired             times its advice was returned
+      errors            comparisons that raised (e.g. str vs number)
+      time_ns           cumulative condition + context evaluation time
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.started = time.time()
+
+    def _row(self, rule_id):
+        row = self.counters.get(rule_id)
+        if row is None:
+            row = self.counters.setdefault(rule_id, [0] * len(PROFILE_COUNTERS))
+        return row
+
+    def record_error(self, rule_id):
+        with self._lock:
+            self._row(rule_id)[5] += 1
+
+    def evaluate(self, rules, person_data, diagnoses):
+        fired = []
+        updates = []
+        clock = time.perf_counter_ns
+        for rule in rules:
+            t0 = clock()
+            condition = rule.predicate(person_data)
+            required_missing = blocked = False
+            if condition:
+                required_missing = (rule.required_diagnosis is not None
+                                    and rule.required_diagnosis not in diagnoses)
+                blocked = (not required_missing and rule.block_if_diagnosis is not None
+                           and rule.block_if_diagnosis in diagnoses)
+            elapsed = clock() - t0
+            hit = condition and not required_missing and not blocked
+            if hit:
+                fired.append(rule)
+            updates.append((rule.id, condition, required_missing, blocked, hit, elapsed))
+
+        # Merge once per call so concurrent sessions don't lose counts
+        with self._lock:
+            for rule_id, condition, required_missing, blocked, hit, elapsed in updates:
+                row = self._row(rule_id)
+                row[0] += 1
+                row[1] += condition
+                row[2] += required_missing
+                row[3] += blocked
+                row[4] += hit
+                row[6] += elapsed
+        return fired
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.started = time.time()
+
+    def snapshot(self):
+        """{rule_id: {counter: value, ..., "mean_us": ...}}"""
+        with self._lock:
+            rows = {rule_id: list(row) for rule_id, row in self.counters.items()}
+        report = {}
+        for rule_id, row in rows.items():
+            entry = dict(zip(PROFILE_COUNTERS, row))
+            entry["mean_us"] = round(entry["time_ns"] / entry["evaluated"] / 1000, 3) if entry["evaluated"] else 0.0
+            report[rule_id] = entry
+        return report
+
+    def to_json(self, indent=2):
+        return json.dumps({"since": self.started, "rules": self.snapshot()}, indent=indent)
+
+    def format_table(self, sort_by="fired"):
+        report = self.snapshot()
+        columns = ("evaluated", "condition_true", "required_missing", "context_blocked",
+                   "fired", "errors", "mean_us")
+        width = max([len("rule id")] + [len(str(r)) for r in report])
+        lines = [" ".join(["rule id".ljust(width)] + [c.rjust(16) for c in columns])]
+        for rule_id, entry in sorted(report.items(), key=lambda item: -item[1][sort_by]):
+            lines.append(" ".join([str(rule_id).ljust(width)] + [str(entry[c]).rjust(16) for c in columns]))
+        return "\n".join(lines)
+
+
+def enable_profiling():
+    """Turns rule profiling on for the whole process and returns the profiler."""
+    global _profiler
+    if _profiler is None:
+        _profiler = RuleProfiler()
+    return _profiler
+
+
+def disable_profiling():
+    global _profiler
+    _profiler = None
+
+
+def get_profiler():
+    """The active RuleProfiler, or None when profiling is off."""
+    return _profiler
+
+
+if os.environ.get("EXLEEP_PROFILE_RULES"):
+    enable_profiling()
+
+
+# ============================================
+# 7. ENGINE
+# ============================================
+
+class JSONCoachingEngine:
+    """
+    Lightweight view over the shared RuleSet for rules_file. Creating one is
+    cheap; the rules are loaded and compiled once per process and picked up
+    again automatically when the file changes on disk.
+    """
+
+    def __init__(self, rules_file=DEFAULT_RULES_FILE):
+        self.rules_file = rules_file
+        self.ops = OPERATORS
+        self.rule_set = get_rule_set(rules_file)
+
+    @property
+    def rules(self):
+        return self.rule_set.rules
+
+    @property
+    def compiled_rules(self):
+        return self.rule_set.compiled
+
+    def refresh(self, force=False):
+        """Swaps in the latest snapshot if the rules file has changed."""
+        self.rule_set = get_rule_set(self.rules_file, force_check=force)
+        return self.rule_set
+
+    def evaluate_rules(self, person_data, diagnoses):
+        """Like evaluate(), but returns the fired CompiledRule objects."""
+        # One snapshot per call, so a concurrent reload never mixes versions
+        rule_set = self.refresh()
+        rules = rule_set.compiled
+        if _profiler is not None:
+            return _profiler.evaluate(rules, person_data, diagnoses)
+        if rule_set.index is not None:
+            return rule_set.index.evaluate(person_data, diagnoses)
+
+        fired = []
+        for rule in rules:
+            # 1. Check Condition (e.g., "caffeine_pm >= 3") and 2. Context
+            if rule.predicate(person_data) and rule.context_met(diagnoses):
+                fired.append(rule)
+
+        return fired
+
+    def evaluate(self, person_data, diagnoses):
+        """
+        person_data: Dictionary of user answers (e.g., {'caffeine_pm': 3})
+        diagnoses: List of diagnosis strings (e.g., ['Insomnia'])
+        """
+        return [rule.advice for rule in self.evaluate_rules(person_data, diagnoses)]
@@ -0,0 +1,146 @@
+# src/logic/incremental.py
+
+from src.logic.scoring import ScoringEngine, DISORDER_WEIGHTS, DISORDERS, FLAG_THRESHOLD
+from src.logic.coaching import JSONCoachingEngine
+from src.logic.thresholds import flag_threshold
+
+# Symptom key -> disorders whose score reads it
+SYMPTOM_DEPENDENCIES = {}
+for _disorder, _weights in DISORDER_WEIGHTS.items():
+    for _key, _ in _weights:
+        SYMPTOM_DEPENDENCIES.setdefault(_key, []).append(_disorder)
+
+
+class RuleDependencies:
+    """
+    Maps each user_data key and each diagnosis to the indices of the rules
+    that read it, for one RuleSet snapshot.
+    """
+
+    def __init__(self, rule_set):
+        self.rule_set = rule_set
+        self.by_variable = {}
+        self.by_diagnosis = {}
+        for i, rule in enumerate(rule_set.compiled):
+            for var in rule.predicate.variables():
+                self.by_variable.setdefault(var, []).append(i)
+            for diagnosis in (rule.required_diagnosis, rule.block_if_diagnosis):
+                if diagnosis is not None:
+                    self.by_diagnosis.setdefault(diagnosis, []).append(i)
+
+
+class AssessmentDelta:
+    """What changed after an update: new scores, flipped flags, advice in/out."""
+    __slots__ = ("scores", "flagged", "unflagged", "advice_added", "advice_removed")
+
+    def __init__(self):
+        self.scores = {}         # disorder -> new confidence
+        self.flagged = []        # disorders that crossed the threshold upwards
+        self.unflagged = []      # disorders that dropped below it
+        self.advice_added = []   # rule ids that started firing
+        self.advice_removed = [] # rule ids that stopped firing
+
+    def __bool__(self):
+        return bool(self.scores or self.advice_added or self.advice_removed)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"AssessmentDelta({self.as_dict()!r})"
+
+
+class IncrementalAssessment:
+    """
+    Keeps the last scores and fired rules for one assessment and, when an
+    answer changes, recomputes only what depends on it:
+      - a symptom change rescores only the disorders that read that symptom;
+      - a habit change re-runs only the rules whose condition reads it;
+      - a diagnosis whose flag flipped re-runs only the rules gated on it.
+    """
+
+    def __init__(self, symptoms, user_data, coach=None, threshold=FLAG_THRESHOLD):
+        self.symptoms = dict(symptoms)
+        self.user_data = dict(user_data)
+        self.coach = coach or JSONCoachingEngine()
+        self.threshold = threshold
+
+        self.scores = ScoringEngine.calculate_confidence(self.symptoms)
+        self.active = {d for d, s in self.scores.items() if s >= flag_threshold(threshold, d)}
+        self._rebuild_rules(self.coach.rule_set)
+
+    def _rebuild_rules(self, rule_set):
+        self.deps = RuleDependencies(rule_set)
+        diagnoses = self.active_diagnoses
+        self.fired = [
+            rule.predicate(self.user_data) and rule.context_met(diagnoses)
+            for rule in rule_set.compiled
+        ]
+
+    @property
+    def active_diagnoses(self):
+        # Keep the ScoringEngine's disorder order, like the non-incremental path
+        return [d for d in DISORDERS if d in self.active]
+
+    @property
+    def advice(self):
+        rules = self.deps.rule_set.compiled
+        return [rules[i].advice for i, fired in enumerate(self.fired) if fired]
+
+    def update(self, key, value):
+        """Changes one answer and returns an AssessmentDelta."""
+        return self.update_many({key: value})
+
+    def update_many(self, changes):
+        delta = AssessmentDelta()
+        dirty_disorders = set()
+        dirty_rules = set()
+
+        for key, value in changes.items():
+            if key in SYMPTOM_DEPENDENCIES:
+                if self.symptoms.get(key) != value:
+                    self.symptoms[key] = value
+                    dirty_disorders.update(SYMPTOM_DEPENDENCIES[key])
+            elif key not in self.user_data or self.user_data[key] != value:
+                self.user_data[key] = value
+                dirty_rules.update(self.deps.by_variable.get(key, ()))
+
+        # 1. Rescore only the affected disorders
+        for disorder in dirty_disorders:
+            score = ScoringEngine.score_disorder(disorder, self.symptoms)
+            if score == self.scores[disorder]:
+                continue
+            self.scores[disorder] = score
+            delta.scores[disorder] = score
+            flagged = score >= flag_threshold(self.threshold, disorder)
+            if flagged != (disorder in self.active):
+                if flagged:
+                    self.active.add(disorder)
+                    delta.flagged.append(disorder)
+                else:
+                    self.active.discard(disorder)
+                    delta.unflagged.append(disorder)
+                dirty_rules.update(self.deps.by_diagnosis.get(disorder, ()))
+
+        # 2. The knowledge base was hot-reloaded: everything is dirty
+        rule_set = self.coach.refresh()
+        if rule_set is not self.deps.rule_set:
+            before = {r.id for r, f in zip(self.deps.rule_set.compiled, self.fired) if f}
+            self._rebuild_rules(rule_set)
+            after = {r.id for r, f in zip(rule_set.compiled, self.fired) if f}
+            delta.advice_added = [r.id for r in rule_set.compiled if r.id in after - before]
+            delta.advice_removed = sorted(before - after)
+            return delta
+
+        # 3. Re-run only the dirty rules
+        if dirty_rules:
+            rules = rule_set.compiled
+            diagnoses = self.active_diagnoses
+            for i in sorted(dirty_rules):
+                rule = rules[i]
+                fired = rule.predicate(self.user_data) and rule.context_met(diagnoses)
+                if fired != self.fired[i]:
+                    self.fired[i] = fired
+                    (delta.advice_added if fired else delta.advice_removed).append(rule.id)
+
+        return delta
@@ -0,0 +1,62 @@
+# src/logic/pipeline.py
+
+from src.logic.scoring import ScoringEngine, DISORDERS, SYMPTOM_KEYS, SCALE_MIN, SCALE_MAX, FLAG_THRESHOLD
+from src.logic.coaching import JSONCoachingEngine
+from src.logic.thresholds import Thresholds
+
+
+def validate_symptoms(symptoms):
+    """Raises ValueError unless every symptom is answered with a whole number 1-5."""
+    missing = [k for k in SYMPTOM_KEYS if k not in symptoms]
+    if missing:
+        raise ValueError(f"missing symptoms: {', '.join(missing)}")
+    for key in SYMPTOM_KEYS:
+        val = symptoms[key]
+        if isinstance(val, bool) or not isinstance(val, int) or not SCALE_MIN <= val <= SCALE_MAX:
+            raise ValueError(f"{key} must be an integer {SCALE_MIN}-{SCALE_MAX}, got {val!r}")
+
+
+def active_diagnoses(scores, threshold=FLAG_THRESHOLD):
+    """
+    Thresholding step: disorders whose confidence reaches the flag threshold
+    (one number, or per-disorder cutoffs from a Thresholds).
+    """
+    if isinstance(threshold, Thresholds):
+        return threshold.active(scores)
+    return [d for d, s in scores.items() if s >= threshold]
+
+
+def build_result(scores, user_data, coach, threshold=FLAG_THRESHOLD):
+    active = active_diagnoses(scores, threshold)
+    fired = coach.evaluate_rules(user_data, active)
+    return {
+        "scores": scores,
+        "active_diagnoses": active,
+        "advice_ids": [rule.id for rule in fired],
+        "advice": [rule.advice for rule in fired],
+    }
+
+
+def assess(symptoms, user_data, coach=None, threshold=FLAG_THRESHOLD):
+    """
+    Full pipeline for one assessment: scoring -> thresholding -> coaching.
+    Returns a dict with scores, active_diagnoses, advice_ids and advice.
+    """
+    scores = ScoringEngine.calculate_confidence(symptoms)
+    return build_result(scores, user_data, coach or JSONCoachingEngine(), threshold)
+
+
+def assess_batch(records, coach=None, threshold=FLAG_THRESHOLD):
+    """
+    Runs the pipeline over a list of (symptoms, user_data) pairs, scoring them
+    with one vectorized call. Returns results in input order.
+    """
+    coach = coach or JSONCoachingEngine()
+    if not records:
+        return []
+    matrix = [[symptoms[k] for k in SYMPTOM_KEYS] for symptoms, _ in records]
+    rows = ScoringEngine.calculate_confidence_batch(matrix).tolist()
+    return [
+        build_result(dict(zip(DISORDERS, row)), user_data, coach, threshold)
+        for row, (_, user_data) in zip(rows, records)
+    ]
@@ -0,0 +1,86 @@
+# src/logic/schema.py
+# The intake questionnaire's user_data fields. The keys must match the
+# variable names used in 'rules.json'.
+
+GENDERS = ("Male", "Female")
+AGE_GROUPS = ("Child", "Adolescent", "Adult", "Elderly")
+SLEEP_HOURS = ("< 4", "4-6", "6-8", "8-10", "10 <")
+
+# Multiple-choice answers -> allowed values
+CHOICE_FIELDS = {
+    "gender": GENDERS,
+    "age": AGE_GROUPS,
+    "sleep_hrs": SLEEP_HOURS,
+}
+
+# 1-5 scale answers
+SCALE_FIELDS = (
+    "irregular", "work_shift", "physical_activity",
+    "room_quality", "heavy_meal", "caffeine_pm", "alcohol_bed",
+    "tech_interferes", "avoid_scr", "naps",
+    "social_lonely", "mental_stress", "mood_change",
+)
+
+# Yes/No answers
+BOOLEAN_FIELDS = ("bed_usage", "chronic_pain", "medication_sleep", "diagnosed_neuro_resp")
+
+# Same order as the questionnaire in src/interface.py
+USER_DATA_KEYS = (
+    "gender", "age", "sleep_hrs", "irregular", "work_shift", "physical_activity",
+    "room_quality", "heavy_meal", "caffeine_pm", "alcohol_bed", "tech_interferes",
+    "avoid_scr", "naps", "bed_usage", "social_lonely", "mental_stress", "mood_change",
+    "chronic_pain", "medication_sleep", "diagnosed_neuro_resp",
+)
+
+# Question wording per answer key (symptoms and user_data), shared by the CLI
+# and the app's adaptive intake
+PROMPTS = {
+    "gender": "Gender?",
+    "age": "Age Group?",
+    "sleep_hrs": "Average sleep hours per night?",
+    "irregular": "Do you have an irregular sleep schedule?",
+    "work_shift": "Do you work in rotating or night shifts?",
+    "physical_activity": "Physical activity level?",
+    "room_quality": "Is your bedroom quiet, dark, and cool?",
+    "heavy_meal": "Do you eat heavy meals close to bedtime?",
+    "caffeine_pm": "Do you drink caffeine after 6 PM?",
+    "alcohol_bed": "Do you consume alcohol before sleep?",
+    "tech_interferes": "Do you feel technology interferes with your sleep?",
+    "avoid_scr": "Do you avoid screens (blue light) before bed?",
+    "naps": "Do you nap for more than 30 minutes during the day?",
+    "bed_usage": "Do you use your bed mainly for sleep (not working/eating)?",
+    "social_lonely": "Do you feel lonely or lack emotional support?",
+    "mental_stress": "Do you experience stress or racing thoughts at bedtime?",
+    "mood_change": "Do mood changes affect your sleep quality?",
+    "chronic_pain": "Do you suffer from chronic pain that disturbs sleep?",
+    "medication_sleep": "Do you take medication that might affect sleep?",
+    "diagnosed_neuro_resp": "Have you been diagnosed with a neurological or respiratory disorder?",
+    "insomnia_fall": "Difficulty falling asleep?",
+    "insomnia_stay": "Wake up frequently during the night?",
+    "insomnia_early": "Wake up too early and can't fall back?",
+    "insomnia_tired": "Feel tired even after sleeping?",
+    "apnea_snore": "Snore loudly?",
+    "apnea_choke": "Wake up choking or gasping?",
+    "apnea_headache": "Morning headaches or dry mouth?",
+    "apnea_sleepy": "Excessive daytime sleepiness?",
+    "rls_urge": "Uncontrollable urge to move legs while resting?",
+    "rls_worse_night": "Sensations worse in the evening/night?",
+    "rls_move_help": "Does movement relieve the discomfort?",
+    "narco_attack": "Sudden sleep attacks during daytime?",
+    "narco_cata": "Muscle weakness during strong emotions?",
+    "narco_hallu": "Vivid hallucinations when falling asleep?",
+    "narco_paralysis": "Sleep paralysis?",
+    "crsd_timing": "Sleep times much later/earlier than desired?",
+    "crsd_social": "Struggle to sleep at normal social hours?",
+    "crsd_alert_night": "Alert at night but sleepy in the morning?",
+    "para_act": "Sleepwalking, talking, or performing actions?",
+    "para_nightmare": "Frequent nightmares?",
+    "para_dream": "Act out dreams (move/shout)?",
+}
+
+# 1-5 questions whose ends aren't "Never" / "Always": key -> (1 label, 5 label)
+SCALE_LABELS = {
+    "physical_activity": ("Sedentary", "Very Active"),
+    "room_quality": ("Poor", "Perfect"),
+    "avoid_scr": ("Never (Use screens)", "Always (Avoid)"),
+}
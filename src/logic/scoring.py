@@ -1,62 +1,343 @@
 # src/logic/scoring.py
 
+import itertools
+import os
+import threading
+from array import array
+
+# NumPy is imported on first use of the batch path, so the single-assessment
+# entry points (CLI, app) start without paying for it.
+
+# ============================================
+# WEIGHT TABLE (shared by the scalar and batch paths)
+# ============================================
+# disorder -> ((symptom key, weight), ...). Order matters: the scalar path sums
+# in this order, and the batch path's columns follow DISORDERS.
+DISORDER_WEIGHTS = {
+    'Insomnia': (
+        ('insomnia_fall', 2.0),
+        ('insomnia_stay', 2.0),
+        ('insomnia_early', 2.0),
+        ('insomnia_tired', 1.5),
+    ),
+    'Obstructive Sleep Apnea': (
+        ('apnea_snore', 2.0),
+        ('apnea_choke', 3.0),
+        ('apnea_headache', 1.0),
+        ('apnea_sleepy', 2.0),
+    ),
+    'Restless Legs Syndrome': (
+        ('rls_urge', 3.0),
+        ('rls_worse_night', 2.0),
+        ('rls_move_help', 2.0),
+    ),
+    'Narcolepsy': (
+        ('narco_attack', 3.0),
+        ('narco_cata', 3.0),
+        ('narco_hallu', 1.5),
+        ('narco_paralysis', 1.5),
+    ),
+    'Circadian Rhythm Disorder': (
+        ('crsd_timing', 2.0),
+        ('crsd_social', 2.0),
+        ('crsd_alert_night', 2.0),
+    ),
+    'Parasomnia': (
+        ('para_act', 3.0),
+        ('para_nightmare', 1.5),
+        ('para_dream', 1.0),
+    ),
+}
+
+SCALE_MIN = 1
+SCALE_MAX = 5
+
+# Confidence % required to flag a disorder
+FLAG_THRESHOLD = 50.0
+# Confidence % reported as "high probability"
+HIGH_RISK_THRESHOLD = 75.0
+
+DISORDERS = tuple(DISORDER_WEIGHTS)
+SYMPTOM_KEYS = tuple(key for weights in DISORDER_WEIGHTS.values() for key, _ in weights)
+
+# Highest possible weighted score per disorder (every symptom answered 5 -> 4)
+MAX_SCORES = {
+    disorder: sum((SCALE_MAX - SCALE_MIN) * w for _, w in weights)
+    for disorder, weights in DISORDER_WEIGHTS.items()
+}
+
+
+def _build_weight_matrix():
+    import numpy as np
+    matrix = np.zeros((len(SYMPTOM_KEYS), len(DISORDERS)))
+    row = {key: i for i, key in enumerate(SYMPTOM_KEYS)}
+    for col, weights in enumerate(DISORDER_WEIGHTS.values()):
+        for key, w in weights:
+            matrix[row[key], col] = w
+    return matrix
+
+
+# (disorder, weights, max score) in DISORDERS order, for the scalar path
+_SCORING_PLAN = tuple((d, DISORDER_WEIGHTS[d], MAX_SCORES[d]) for d in DISORDERS)
+
+_weight_arrays = None
+
+
+def get_weight_arrays():
+    """
+    (WEIGHT_MATRIX, MAX_SCORE_VECTOR): the (21 x 6) symptom -> disorder
+    weights and the (6,) max scores in DISORDERS order, built on first use.
+    """
+    global _weight_arrays
+    if _weight_arrays is None:
+        import numpy as np
+        _weight_arrays = (_build_weight_matrix(), np.array([MAX_SCORES[d] for d in DISORDERS]))
+    return _weight_arrays
+
+
+def __getattr__(name):
+    # scoring.WEIGHT_MATRIX / scoring.MAX_SCORE_VECTOR still work, lazily
+    if name == "WEIGHT_MATRIX":
+        return get_weight_arrays()[0]
+    if name == "MAX_SCORE_VECTOR":
+        return get_weight_arrays()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 class ScoringEngine:
     """
     Calculates weighted confidence scores (0-100%) for sleep disorders.
     """
-    
+    name = "linear"
+
+    DISORDERS = DISORDERS
+    SYMPTOM_KEYS = SYMPTOM_KEYS
+
     @staticmethod
     def normalize(val):
         """Converts 1-5 input scale to 0-4 math scale."""
         return val - 1
 
+    @staticmethod
+    def score_disorder(disorder, data):
+        """Confidence (0-100%) for a single disorder."""
+        score = 0
+        for key, weight in DISORDER_WEIGHTS[disorder]:
+            score += ScoringEngine.normalize(data[key]) * weight
+        return (score / MAX_SCORES[disorder]) * 100
+
     @staticmethod
     def calculate_confidence(data):
         results = {}
-        
-        # --- 1. INSOMNIA ---
-        score = (ScoringEngine.normalize(data['insomnia_fall']) * 2.0 +
-                 ScoringEngine.normalize(data['insomnia_stay']) * 2.0 +
-                 ScoringEngine.normalize(data['insomnia_early']) * 2.0 +
-                 ScoringEngine.normalize(data['insomnia_tired']) * 1.5)
-        max_score = (4*2 + 4*2 + 4*2 + 4*1.5) # 30
-        results['Insomnia'] = (score / max_score) * 100
-
-        # --- 2. SLEEP APNEA ---
-        score = (ScoringEngine.normalize(data['apnea_snore']) * 2.0 +
-                 ScoringEngine.normalize(data['apnea_choke']) * 3.0 +
-                 ScoringEngine.normalize(data['apnea_headache']) * 1.0 +
-                 ScoringEngine.normalize(data['apnea_sleepy']) * 2.0)
-        max_score = (4*2 + 4*3 + 4*1 + 4*2) # 32
-        results['Obstructive Sleep Apnea'] = (score / max_score) * 100
-
-        # --- 3. RLS ---
-        score = (ScoringEngine.normalize(data['rls_urge']) * 3.0 +
-                 ScoringEngine.normalize(data['rls_worse_night']) * 2.0 +
-                 ScoringEngine.normalize(data['rls_move_help']) * 2.0)
-        max_score = (4*3 + 4*2 + 4*2) # 28
-        results['Restless Legs Syndrome'] = (score / max_score) * 100
-
-        # --- 4. NARCOLEPSY ---
-        score = (ScoringEngine.normalize(data['narco_attack']) * 3.0 +
-                 ScoringEngine.normalize(data['narco_cata']) * 3.0 +
-                 ScoringEngine.normalize(data['narco_hallu']) * 1.5 +
-                 ScoringEngine.normalize(data['narco_paralysis']) * 1.5)
-        max_score = (4*3 + 4*3 + 4*1.5 + 4*1.5) # 36
-        results['Narcolepsy'] = (score / max_score) * 100
-
-        # --- 5. CRSD ---
-        score = (ScoringEngine.normalize(data['crsd_timing']) * 2.0 +
-                 ScoringEngine.normalize(data['crsd_social']) * 2.0 +
-                 ScoringEngine.normalize(data['crsd_alert_night']) * 2.0)
-        max_score = (4*2 + 4*2 + 4*2) # 24
-        results['Circadian Rhythm Disorder'] = (score / max_score) * 100
-
-        # --- 6. PARASOMNIA ---
-        score = (ScoringEngine.normalize(data['para_act']) * 3.0 +
-                 ScoringEngine.normalize(data['para_nightmare']) * 1.5 +
-                 ScoringEngine.normalize(data['para_dream']) * 1.0)
-        max_score = (4*3 + 4*1.5 + 4*1) # 22
-        results['Parasomnia'] = (score / max_score) * 100
-
-        return results
\ No newline at end of file
+        for disorder, weights, max_score in _SCORING_PLAN:
+            score = 0
+            for key, weight in weights:
+                score += (data[key] - SCALE_MIN) * weight  # normalize() inlined
+            results[disorder] = (score / max_score) * 100
+        return results
+
+    @staticmethod
+    def explain(data):
+        """
+        Per disorder, each symptom's share of calculate_confidence():
+        {disorder: ((symptom key, answer, points), ...)}, points summing to the
+        confidence. Used by tracing (src/logic/trace.py), never by scoring.
+        """
+        return {
+            disorder: tuple((key, data[key], (data[key] - SCALE_MIN) * weight / max_score * 100)
+                            for key, weight in weights)
+            for disorder, weights, max_score in _SCORING_PLAN
+        }
+
+    @staticmethod
+    def calculate_confidence_table(data):
+        """
+        Table-driven mode: same results as calculate_confidence(), six lookups.
+        Benchmark-only (benchmarks/run.py); no front end scores this way.
+        """
+        return get_lookup_tables().calculate_confidence(data)
+
+    @staticmethod
+    def to_matrix(data):
+        """
+        Converts batch input to an (N x 21) float array in SYMPTOM_KEYS order.
+        data: an (N x 21) array-like, a mapping of symptom key -> column, or
+        a PackedAssessments buffer.
+        """
+        import numpy as np
+        if hasattr(data, 'symptom_matrix'):
+            return np.asarray(data.symptom_matrix(), dtype=float)
+        if hasattr(data, 'keys'):
+            missing = [k for k in SYMPTOM_KEYS if k not in data]
+            if missing:
+                raise KeyError(f"Missing symptom columns: {', '.join(missing)}")
+            return np.column_stack([np.asarray(data[k], dtype=float) for k in SYMPTOM_KEYS])
+
+        matrix = np.asarray(data, dtype=float)
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1)
+        if matrix.ndim != 2 or matrix.shape[1] != len(SYMPTOM_KEYS):
+            raise ValueError(f"Expected an (N x {len(SYMPTOM_KEYS)}) array, got shape {matrix.shape}")
+        return matrix
+
+    @staticmethod
+    def calculate_confidence_batch(data):
+        """
+        Scores N assessments at once. Returns an (N x 6) array whose columns
+        follow ScoringEngine.DISORDERS.
+
+        All weights are multiples of 0.5 and answers are whole numbers, so
+        every partial sum is exact in float64 and the matrix product matches
+        calculate_confidence() bit-for-bit regardless of summation order.
+        """
+        weight_matrix, max_score_vector = get_weight_arrays()
+        scores = (ScoringEngine.to_matrix(data) - SCALE_MIN) @ weight_matrix
+        return (scores / max_score_vector) * 100
+
+    @staticmethod
+    def batch_to_dicts(confidences):
+        """Converts rows of calculate_confidence_batch() back into result dicts."""
+        import numpy as np
+        return [dict(zip(DISORDERS, row)) for row in np.asarray(confidences).tolist()]
+
+
+# ============================================
+# LOOKUP TABLES (optional table-driven mode)
+# ============================================
+# Each disorder reads only 3-4 answers on a 1-5 scale, so every possible
+# confidence fits in a table of at most 5^4 = 625 doubles (2,250 in total,
+# about 18 KB). A table is indexed by sum((answer - 1) * 5^i).
+# The front ends score arithmetically; table mode is measured by
+# benchmarks/run.py and checked by `python -m src.logic.scoring`.
+
+_ANSWER_CODES = {answer: answer - SCALE_MIN for answer in range(SCALE_MIN, SCALE_MAX + 1)}
+
+
+def _invalid_answer(data, keys):
+    """The error for the first of keys that is missing or not an answer on the scale."""
+    for key in keys:
+        value = data.get(key)
+        if value is None:
+            return KeyError(key)
+        try:
+            if value in _ANSWER_CODES:
+                continue
+        except TypeError:  # unhashable
+            pass
+        return ValueError(f"{key} must be an answer {SCALE_MIN}-{SCALE_MAX}, got {value!r}")
+    return ValueError("invalid answers")
+
+class LookupTables:
+    def __init__(self):
+        levels = SCALE_MAX - SCALE_MIN + 1
+        self.layout = {}   # disorder -> ((symptom key, stride), ...)
+        self.tables = {}   # disorder -> array('d') of confidences
+        for disorder, weights in DISORDER_WEIGHTS.items():
+            keys = [key for key, _ in weights]
+            strides = [levels ** i for i in range(len(keys))]
+            table = array('d', bytes(8 * levels ** len(keys)))
+            for answers in itertools.product(range(SCALE_MIN, SCALE_MAX + 1), repeat=len(keys)):
+                index = sum((a - SCALE_MIN) * s for a, s in zip(answers, strides))
+                table[index] = ScoringEngine.score_disorder(disorder, dict(zip(keys, answers)))
+            self.layout[disorder] = tuple(zip(keys, strides))
+            self.tables[disorder] = table
+        self.calculate_confidence = self._compile()
+
+    def _compile(self):
+        """
+        Generates a straight-line lookup function, e.g.
+            {'Insomnia': T0[C[x['insomnia_fall']]*1 + C[x['insomnia_stay']]*5 + ...], ...}
+        so scoring is six indexed reads with no loops or float math. C maps
+        each answer on the scale to its 0-based code, so an answer off the
+        scale raises ValueError (a missing one KeyError) instead of reading
+        another combination's entry.
+        """
+        namespace = {"C": _ANSWER_CODES, "invalid": _invalid_answer, "KEYS": SYMPTOM_KEYS}
+        entries = []
+        for i, (disorder, layout) in enumerate(self.layout.items()):
+            namespace[f"T{i}"] = self.tables[disorder]
+            index = " + ".join(f"C[x[{key!r}]]*{stride}" for key, stride in layout)
+            entries.append(f"{disorder!r}: T{i}[{index}]")
+        source = ("def lookup(x):\n"
+                  "    try:\n"
+                  "        return {" + ", ".join(entries) + "}\n"
+                  "    except (KeyError, TypeError):\n"
+                  "        raise invalid(x, KEYS) from None\n")
+        exec(compile(source, "<scoring lookup tables>", "exec"), namespace)
+        return namespace["lookup"]
+
+    @property
+    def nbytes(self):
+        return sum(t.itemsize * len(t) for t in self.tables.values())
+
+    def verify(self):
+        """
+        Proves the tables equal the arithmetic path: every answer combination
+        of every disorder is scored by score_disorder() and by the batch
+        matrix path, and must match the table entry exactly.
+        Returns the number of combinations checked; raises ValueError otherwise.
+        """
+        import numpy as np
+        checked = 0
+        for disorder, layout in self.layout.items():
+            keys = [key for key, _ in layout]
+            combos = list(itertools.product(range(SCALE_MIN, SCALE_MAX + 1), repeat=len(keys)))
+            # Fill the other symptoms with 1s so the full-matrix path can run
+            rows = np.full((len(combos), len(SYMPTOM_KEYS)), SCALE_MIN)
+            columns = [SYMPTOM_KEYS.index(key) for key in keys]
+            rows[:, columns] = combos
+            batch = ScoringEngine.calculate_confidence_batch(rows)[:, DISORDERS.index(disorder)]
+            for answers, batch_value in zip(combos, batch.tolist()):
+                data = dict(zip(keys, answers))
+                expected = ScoringEngine.score_disorder(disorder, data)
+                index = sum((a - SCALE_MIN) * s for a, (_, s) in zip(answers, layout))
+                if not (self.tables[disorder][index] == expected == batch_value):
+                    raise ValueError(f"lookup table mismatch for {disorder} at {data}: "
+                                     f"{self.tables[disorder][index]!r} != {expected!r}")
+                checked += 1
+        return checked
+
+
+_lookup_tables = None
+_lookup_lock = threading.Lock()
+
+
+def get_lookup_tables():
+    """Builds the tables on first use (a few milliseconds) and reuses them."""
+    global _lookup_tables
+    if _lookup_tables is None:
+        with _lookup_lock:
+            if _lookup_tables is None:
+                _lookup_tables = LookupTables()
+    return _lookup_tables
+
+
+# ============================================
+# ENGINE SELECTION
+# ============================================
+# The front ends score with get_scoring_engine(): ScoringEngine ("linear",
+# the default) or the naive Bayes engine in src/logic/bayes.py ("bayes"),
+# picked by $EXLEEP_SCORING_ENGINE. Both offer calculate_confidence() and
+# calculate_confidence_batch() with the same output shapes.
+
+SCORING_ENGINES = ("linear", "bayes")
+
+
+def get_scoring_engine(name=None):
+    """The configured engine; prints an error and uses the linear one if it can't load."""
+    name = name or os.environ.get("EXLEEP_SCORING_ENGINE") or "linear"
+    if name == "bayes":
+        from src.logic.bayes import ModelError, get_bayes_engine
+        try:
+            return get_bayes_engine()
+        except (ModelError, OSError) as e:
+            print(f"Error: could not load the Bayes model: {e}; using the linear engine")
+    elif name != "linear":
+        print(f"Error: unknown scoring engine {name!r} (expected one of {', '.join(SCORING_ENGINES)}); "
+              f"using the linear engine")
+    return ScoringEngine
+
+
+if __name__ == "__main__":
+    tables = get_lookup_tables()
+    print(f"Lookup tables: {tables.nbytes} bytes, {tables.verify()} combinations verified")
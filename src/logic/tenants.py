@@ -0,0 +1,333 @@
+# src/logic/tenants.py
+"""
+Many named knowledge bases (one per clinic) in one process.
+
+    registry = TenantRegistry(memory_budget=64 * 1024 * 1024)
+    registry.register_directory("clinics/")        # clinics/<name>.json
+    registry.assess("north", symptoms, user_data)
+
+Tenants are loaded on first use and hot-reloaded like the default rules file.
+Rules that are identical across tenants (same JSON content) are compiled
+once and shared, and their strings are interned, so a variant that only
+rewords a few rules costs little more than those rules. When the estimated
+footprint exceeds memory_budget, the least recently used tenants are
+unloaded; their next request loads them again.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from src.logic.scoring import FLAG_THRESHOLD
+from src.logic.coaching import (
+    CompiledRule, JSONCoachingEngine, OPERATORS, RELOAD_CHECK_INTERVAL, RuleSet, RuleSyntaxError,
+    _stat_key, resolve_rules_path,
+)
+from src.logic.pipeline import assess
+
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+
+
+# ============================================
+# 1. MEMORY ESTIMATES
+# ============================================
+
+_ATOMIC = (str, bytes, int, float, bool, type(None))
+
+
+def deep_sizeof(obj, seen):
+    """
+    sys.getsizeof() of obj plus everything it references, skipping ids in
+    seen (shared objects are counted once). Functions and classes are free.
+    """
+    if id(obj) in seen or callable(obj) and not hasattr(obj, "__slots__"):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, _ATOMIC):
+        return size
+    if isinstance(obj, dict):
+        return size + sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return size + sum(deep_sizeof(item, seen) for item in obj)
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            if hasattr(obj, name):
+                size += deep_sizeof(getattr(obj, name), seen)
+    if hasattr(obj, "__dict__"):
+        size += deep_sizeof(obj.__dict__, seen)
+    return size
+
+
+# ============================================
+# 2. SHARED COMPILED RULES
+# ============================================
+
+def _intern(value):
+    """Interns every string inside a parsed JSON value."""
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, dict):
+        return {sys.intern(k): _intern(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_intern(v) for v in value]
+    return value
+
+
+class RulePool:
+    """
+    Content-addressed CompiledRules shared between tenants, reference counted
+    so a rule is dropped once no loaded tenant uses it.
+    """
+
+    def __init__(self):
+        self._entries = {}  # canonical JSON -> [CompiledRule, refs, bytes]
+        self.nbytes = 0
+
+    @staticmethod
+    def key(raw):
+        return json.dumps(raw, sort_keys=True, ensure_ascii=False, default=str)
+
+    def acquire(self, key, raw):
+        """CompiledRule for raw (compiled on first use). Raises RuleSyntaxError."""
+        entry = self._entries.get(key)
+        if entry is None:
+            rule = CompiledRule(_intern(raw))
+            entry = self._entries[key] = [rule, 0, deep_sizeof(rule, set())]
+            self.nbytes += entry[2]
+        entry[1] += 1
+        return entry[0]
+
+    def release(self, keys):
+        for key in keys:
+            entry = self._entries[key]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._entries[key]
+                self.nbytes -= entry[2]
+
+    def refs(self, key):
+        entry = self._entries.get(key)
+        return entry[1] if entry else 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# ============================================
+# 3. REGISTRY
+# ============================================
+
+class Tenant:
+    """One registered knowledge base and, while loaded, its RuleSet."""
+    __slots__ = ("name", "rules_file", "path", "threshold", "rule_set", "keys",
+                 "stat_key", "checked_at", "last_used", "own_bytes", "loads")
+
+    def __init__(self, name, rules_file, threshold):
+        self.name = name
+        self.rules_file = rules_file
+        self.path = resolve_rules_path(rules_file)
+        self.threshold = threshold
+        self.rule_set = None
+        self.keys = ()        # pool keys held by rule_set
+        self.stat_key = None
+        self.checked_at = 0.0
+        self.last_used = 0.0
+        self.own_bytes = 0    # tenant-specific structures (index, rule list, failed rules)
+        self.loads = 0
+
+
+class TenantEngine(JSONCoachingEngine):
+    """
+    JSONCoachingEngine view over one tenant's RuleSet in a TenantRegistry.
+    It holds no RuleSet of its own, so an evicted tenant's rules are freed.
+    """
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.tenant = name
+        self.rules_file = registry.tenant(name).rules_file
+        self.ops = OPERATORS
+
+    @property
+    def rule_set(self):
+        return self.registry.rule_set(self.tenant)
+
+    def refresh(self, force=False):
+        return self.registry.rule_set(self.tenant, force_check=force)
+
+
+class TenantRegistry:
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET, clock=time.monotonic):
+        self.memory_budget = memory_budget
+        self.clock = clock
+        self.pool = RulePool()
+        self._tenants = {}
+        self._loaded = OrderedDict()  # name -> Tenant, least recently used first
+        self._engines = {}
+        self._lock = threading.RLock()
+        self.evictions = 0
+
+    # --- registration ---
+    def register(self, name, rules_file, threshold=FLAG_THRESHOLD):
+        with self._lock:
+            if name in self._tenants:
+                self.unload(name)
+            self._tenants[name] = Tenant(name, rules_file, threshold)
+            self._engines.pop(name, None)
+
+    def register_directory(self, directory, thresholds=None, default=FLAG_THRESHOLD):
+        """
+        Registers every <name>.json in directory as tenant <name>, with
+        thresholds[name] or else default (a number or a Thresholds). Returns the names.
+        """
+        thresholds = thresholds or {}
+        names = []
+        for path in sorted(glob.glob(os.path.join(os.path.abspath(directory), "*.json"))):
+            name = os.path.splitext(os.path.basename(path))[0]
+            self.register(name, path, thresholds.get(name, default))
+            names.append(name)
+        return names
+
+    def tenant(self, name):
+        try:
+            return self._tenants[name]
+        except KeyError:
+            raise KeyError(f"unknown tenant {name!r}") from None
+
+    def __contains__(self, name):
+        return name in self._tenants
+
+    def names(self):
+        return list(self._tenants)
+
+    # --- access ---
+    def rule_set(self, name, force_check=False):
+        """The tenant's current RuleSet, loading or reloading it as needed."""
+        now = self.clock()
+        with self._lock:
+            tenant = self.tenant(name)
+            if tenant.rule_set is None:
+                self._load(tenant, now)
+            elif force_check or now - tenant.checked_at >= RELOAD_CHECK_INTERVAL:
+                tenant.checked_at = now
+                if _stat_key(tenant.path) != tenant.stat_key:
+                    self._load(tenant, now)
+            tenant.last_used = now
+            self._loaded.move_to_end(name)
+            return tenant.rule_set
+
+    def engine(self, name):
+        with self._lock:
+            engine = self._engines.get(name)
+            if engine is None:
+                engine = self._engines[name] = TenantEngine(self, name)
+            return engine
+
+    def assess(self, name, symptoms, user_data):
+        """pipeline.assess() with the tenant's rules and threshold."""
+        return assess(symptoms, user_data, self.engine(name), self.tenant(name).threshold)
+
+    # --- loading / eviction ---
+    def _load(self, tenant, now):
+        stat_key = _stat_key(tenant.path)
+        try:
+            with open(tenant.path, "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            print(f"Error: Could not find rules file for tenant {tenant.name} at {tenant.path}")
+            if tenant.rule_set is not None:
+                tenant.stat_key, tenant.checked_at = stat_key, now
+                return  # e.g. mid atomic save or deploy: keep the last good version
+            raw = b"[]"
+        digest = hashlib.sha256(raw).hexdigest()
+        if tenant.rule_set is not None and tenant.rule_set.digest == digest:
+            tenant.stat_key, tenant.checked_at = stat_key, now
+            return
+
+        try:
+            rules = json.loads(raw.decode("utf-8"))
+        except ValueError as e:
+            print(f"Error: Could not parse rules file for tenant {tenant.name}: {e}")
+            if tenant.rule_set is not None:
+                tenant.stat_key, tenant.checked_at = stat_key, now
+                return  # keep serving the last good version
+            rules = []
+
+        keys, compiled, sources = [], [], []
+        for raw_rule in rules:
+            key = RulePool.key(raw_rule)
+            try:
+                rule = self.pool.acquire(key, raw_rule)
+            except RuleSyntaxError as e:
+                print(f"Error compiling {e} (tenant {tenant.name})")
+                sources.append(raw_rule)
+                continue
+            keys.append(key)
+            compiled.append(rule)
+            sources.append(rule.source)
+
+        version = tenant.rule_set.version + 1 if tenant.rule_set is not None else tenant.loads + 1
+        rule_set = RuleSet(tenant.path, sources, compiled, digest, version)
+        if tenant.rule_set is not None:
+            self.pool.release(tenant.keys)
+        tenant.rule_set, tenant.keys = rule_set, tuple(keys)
+        tenant.stat_key, tenant.checked_at = stat_key, now
+        tenant.loads += 1
+        # Count only what this tenant owns: pooled rules are accounted in the pool
+        seen = {id(rule) for rule in compiled} | {id(rule.source) for rule in compiled}
+        tenant.own_bytes = deep_sizeof(rule_set, seen)
+        self._loaded[tenant.name] = tenant
+        self._evict(keep=tenant.name)
+
+    def total_bytes(self):
+        return self.pool.nbytes + sum(t.own_bytes for t in self._loaded.values())
+
+    def _evict(self, keep):
+        while self.total_bytes() > self.memory_budget:
+            victim = next((name for name in self._loaded if name != keep), None)
+            if victim is None:
+                break  # a single tenant over budget is still served
+            self.unload(victim)
+            self.evictions += 1
+
+    def unload(self, name):
+        """Drops a tenant's compiled rules (it stays registered)."""
+        with self._lock:
+            tenant = self._loaded.pop(name, None)
+            if tenant is None:
+                return
+            self.pool.release(tenant.keys)
+            tenant.rule_set, tenant.keys, tenant.own_bytes = None, (), 0
+            tenant.stat_key = None
+
+    # --- reporting ---
+    def memory_report(self):
+        """Estimated bytes per loaded tenant, plus the shared pool."""
+        now = self.clock()
+        with self._lock:
+            tenants = {}
+            for name, tenant in self._loaded.items():
+                shared = sum(1 for key in tenant.keys if self.pool.refs(key) > 1)
+                tenants[name] = {
+                    "rules": len(tenant.rule_set),
+                    "shared_rules": shared,
+                    "own_bytes": tenant.own_bytes,
+                    "idle_s": round(now - tenant.last_used, 1),
+                    "loads": tenant.loads,
+                }
+            return {
+                "budget_bytes": self.memory_budget,
+                "total_bytes": self.total_bytes(),
+                "pool_bytes": self.pool.nbytes,
+                "pool_rules": len(self.pool),
+                "registered": len(self._tenants),
+                "loaded": len(self._loaded),
+                "evictions": self.evictions,
+                "tenants": tenants,
+            }
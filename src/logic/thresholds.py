@@ -0,0 +1,194 @@
+# src/logic/thresholds.py
+"""
+Per-disorder flag and "high probability" cutoffs, as configuration.
+
+    {"flag": 50.0, "high": 75.0, "engine": "linear",
+     "disorders": {"Insomnia": {"flag": 46.7, "high": 71.7}, ...}}
+
+Disorders without an entry (or an entry without "high") use the top-level
+values. The file is written by the calibration tool (python -m
+src.calibration) or by hand, and read by both front ends from
+$EXLEEP_THRESHOLDS, else src/data/thresholds.json. Without a file every
+disorder uses FLAG_THRESHOLD / HIGH_RISK_THRESHOLD, as before.
+
+"engine" names the scoring engine the cutoffs were calibrated on (linear
+confidences and Bayes posteriors are not on the same scale); a file for
+another engine than the caller's is refused. Files without it apply to any
+engine.
+
+Everything that accepts a `threshold` number (pipeline, cache, incremental
+and what-if assessments) also accepts a Thresholds.
+"""
+
+import json
+import os
+import threading
+
+from src.logic.scoring import DISORDERS, FLAG_THRESHOLD, HIGH_RISK_THRESHOLD
+
+DEFAULT_THRESHOLDS_FILE = "src/data/thresholds.json"
+
+
+class Thresholds:
+    """Immutable per-disorder cutoffs; equal configurations compare and hash equal."""
+    __slots__ = ("flag", "high", "flags", "highs", "source", "engine")
+
+    def __init__(self, flag=FLAG_THRESHOLD, high=HIGH_RISK_THRESHOLD, disorders=None, source=None,
+                 engine=None):
+        self.flag = float(flag)
+        self.high = float(high)
+        self.flags = {d: self.flag for d in DISORDERS}
+        self.highs = {d: self.high for d in DISORDERS}
+        for disorder, cutoffs in (disorders or {}).items():
+            self.flags[disorder] = float(cutoffs.get("flag", self.flag))
+            self.highs[disorder] = float(cutoffs.get("high", self.high))
+        self.source = source  # file the values came from, if any
+        self.engine = engine  # scoring engine name they were calibrated on; None = any
+
+    def flag_for(self, disorder):
+        return self.flags.get(disorder, self.flag)
+
+    def high_for(self, disorder):
+        return self.highs.get(disorder, self.high)
+
+    def is_flagged(self, disorder, score):
+        return score >= self.flags.get(disorder, self.flag)
+
+    def active(self, scores):
+        """Thresholding step: disorders whose confidence reaches their flag cutoff."""
+        flags = self.flags
+        return [d for d, s in scores.items() if s >= flags.get(d, self.flag)]
+
+    def level(self, disorder, score):
+        """'high', 'moderate' or 'low' for one disorder's confidence."""
+        if score >= self.highs.get(disorder, self.high):
+            return "high"
+        if score >= self.flags.get(disorder, self.flag):
+            return "moderate"
+        return "low"
+
+    @property
+    def uniform(self):
+        """True when every disorder uses the top-level cutoffs."""
+        return (all(v == self.flag for v in self.flags.values())
+                and all(v == self.high for v in self.highs.values()))
+
+    # --- serialization ---
+    def _key(self):
+        return (self.flag, self.high, tuple(sorted(self.flags.items())), tuple(sorted(self.highs.items())),
+                self.engine)
+
+    def __eq__(self, other):
+        return isinstance(other, Thresholds) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return f"Thresholds(flag={self.flag}, high={self.high}, uniform={self.uniform})"
+
+    def to_dict(self):
+        disorders = {}
+        for d in self.flags:
+            entry = {}
+            if self.flags[d] != self.flag:
+                entry["flag"] = self.flags[d]
+            if self.highs[d] != self.high:
+                entry["high"] = self.highs[d]
+            if entry:
+                disorders[d] = entry
+        data = {"flag": self.flag, "high": self.high, "disorders": disorders}
+        if self.engine is not None:
+            data["engine"] = self.engine
+        return data
+
+    @classmethod
+    def from_dict(cls, data, source=None):
+        """Raises ValueError for malformed entries, unknown disorders or cutoffs outside 0-100."""
+        if not isinstance(data, dict):
+            raise ValueError("expected a JSON object")
+        disorders = data.get("disorders") or {}
+        if not isinstance(disorders, dict):
+            raise ValueError("'disorders' must be an object")
+        unknown = [d for d in disorders if d not in DISORDERS]
+        if unknown:
+            raise ValueError(f"unknown disorders: {', '.join(unknown)}")
+        for where, entry in [("top level", data), *disorders.items()]:
+            if not isinstance(entry, dict):
+                raise ValueError(f"{where}: expected an object with 'flag' / 'high'")
+            for name in ("flag", "high"):
+                value = entry.get(name, 0.0)
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    raise ValueError(f"{where}: '{name}' must be a number, got {value!r}")
+        engine = data.get("engine")
+        if engine is not None and not isinstance(engine, str):
+            raise ValueError(f"'engine' must be a scoring engine name, got {engine!r}")
+        thresholds = cls(data.get("flag", FLAG_THRESHOLD), data.get("high", HIGH_RISK_THRESHOLD),
+                         disorders, source, engine)
+        for d in DISORDERS:
+            flag, high = thresholds.flags[d], thresholds.highs[d]
+            if not (0.0 <= flag <= 100.0 and 0.0 <= high <= 100.0):
+                raise ValueError(f"{d}: cutoffs must be between 0 and 100")
+            if high < flag:
+                raise ValueError(f"{d}: high cutoff {high} is below the flag cutoff {flag}")
+        return thresholds
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+            f.write("\n")
+        os.replace(tmp_path, path)
+
+
+DEFAULT_THRESHOLDS = Thresholds()
+
+
+def flag_threshold(threshold, disorder):
+    """The flag cutoff for disorder, from a number or a Thresholds."""
+    return threshold.flag_for(disorder) if isinstance(threshold, Thresholds) else threshold
+
+
+def load_thresholds(path, engine="linear"):
+    """
+    Thresholds from a JSON file, for scores of the named engine. A missing
+    file gives the defaults; an unreadable or invalid one, or one calibrated
+    on another engine, prints an error and gives the defaults.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        thresholds = Thresholds.from_dict(data, source=path)
+    except FileNotFoundError:
+        return DEFAULT_THRESHOLDS
+    except (OSError, ValueError) as e:
+        print(f"Error: could not load thresholds from {path}: {e}; using the defaults")
+        return DEFAULT_THRESHOLDS
+    if thresholds.engine is not None and thresholds.engine != engine:
+        print(f"Error: thresholds in {path} were calibrated on the {thresholds.engine} engine, "
+              f"but scores come from the {engine} engine; using the defaults")
+        return DEFAULT_THRESHOLDS
+    return thresholds
+
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def get_thresholds(path=None, engine="linear"):
+    """
+    Process-wide thresholds from path, else $EXLEEP_THRESHOLDS, else
+    src/data/thresholds.json, for scores of the named engine (callers using
+    get_scoring_engine() pass its name). Read once per process, like the
+    front ends' other startup configuration.
+    """
+    from src.logic.coaching import resolve_rules_path
+
+    path = path or os.environ.get("EXLEEP_THRESHOLDS") or resolve_rules_path(DEFAULT_THRESHOLDS_FILE)
+    thresholds = _loaded.get((path, engine))
+    if thresholds is None:
+        with _loaded_lock:
+            thresholds = _loaded.get((path, engine))
+            if thresholds is None:
+                thresholds = _loaded[(path, engine)] = load_thresholds(path, engine)
+    return thresholds
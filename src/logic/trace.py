@@ -0,0 +1,149 @@
+# src/logic/trace.py
+"""
+Explanation traces: why an assessment got its scores and its advice.
+
+    trace = explain(assessment, threshold=get_thresholds(), engine=get_scoring_engine())
+    trace.to_json()        # compact, for logs / downloads
+    print(trace.format_text())
+
+A trace records, per disorder, each answer's contribution to the confidence
+(percentage points for the linear engine, log-odds for the Bayes engine) and
+the cutoffs it was compared against; per coaching rule whose condition held,
+whether it fired or was suppressed by 'required_diagnosis' (the diagnosis
+wasn't flagged) or 'block_if_diagnosis' (it was).
+
+Tracing is a separate pass over the same answers, run only when asked for
+(the app's "Explain results" toggle, EXLEEP_TRACE=1 in the CLI): the scoring
+and coaching hot paths have no tracing code in them, so with tracing off
+they cost exactly what they did before.
+"""
+
+import json
+
+from src.logic.scoring import ScoringEngine, DISORDERS, FLAG_THRESHOLD, HIGH_RISK_THRESHOLD
+from src.logic.coaching import JSONCoachingEngine
+from src.logic.thresholds import Thresholds
+
+# Why a rule whose condition held did not fire (names match the rule profiler's counters)
+REQUIRED_MISSING = "required_missing"
+CONTEXT_BLOCKED = "context_blocked"
+
+UNITS = {"linear": "points", "bayes": "log-odds"}
+
+
+class Trace:
+    """
+    disorders:  {disorder: (score, flag, high, ((key, answer, contribution), ...))}
+    fired:      rule ids, in knowledge-base order
+    suppressed: ((rule id, REQUIRED_MISSING | CONTEXT_BLOCKED, diagnosis), ...)
+    """
+    __slots__ = ("engine", "units", "disorders", "active", "fired", "suppressed", "evaluated",
+                 "rules_version")
+
+    def __init__(self, engine, disorders, active, fired, suppressed, evaluated, rules_version=None):
+        self.engine = engine
+        self.units = UNITS.get(engine, "points")
+        self.disorders = disorders
+        self.active = tuple(active)
+        self.fired = tuple(fired)
+        self.suppressed = tuple(suppressed)
+        self.evaluated = evaluated
+        self.rules_version = rules_version
+
+    @property
+    def scores(self):
+        return {d: entry[0] for d, entry in self.disorders.items()}
+
+    def contributions(self, disorder, top=None):
+        """(key, answer, contribution) for one disorder, largest effect first."""
+        terms = sorted(self.disorders[disorder][3], key=lambda t: -abs(t[2]))
+        return terms[:top] if top else terms
+
+    def __repr__(self):
+        return (f"Trace({self.engine}, active={list(self.active)}, fired={len(self.fired)}, "
+                f"suppressed={len(self.suppressed)})")
+
+    # --- serialization ---
+    def to_dict(self):
+        return {
+            "engine": self.engine,
+            "rules_version": self.rules_version,
+            "disorders": {
+                d: {"score": score, "flag": flag, "high": high, "terms": [list(t) for t in terms]}
+                for d, (score, flag, high, terms) in self.disorders.items()
+            },
+            "active": list(self.active),
+            "rules": {"evaluated": self.evaluated, "fired": list(self.fired),
+                      "suppressed": [list(s) for s in self.suppressed]},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        disorders = {
+            d: (entry["score"], entry["flag"], entry["high"], tuple(tuple(t) for t in entry["terms"]))
+            for d, entry in data["disorders"].items()
+        }
+        rules = data["rules"]
+        return cls(data["engine"], disorders, data["active"], rules["fired"],
+                   (tuple(s) for s in rules["suppressed"]), rules["evaluated"], data.get("rules_version"))
+
+    def to_json(self, indent=None):
+        separators = None if indent else (",", ":")
+        return json.dumps(self.to_dict(), indent=indent, separators=separators)
+
+    def format_text(self, top=None):
+        """Plain-text explanation, one block per disorder then the rules."""
+        lines = []
+        for disorder, (score, flag, high, _) in self.disorders.items():
+            status = "flagged" if disorder in self.active else "not flagged"
+            lines.append(f"{disorder}: {score:.1f}% ({status}; flag {flag:g}%, high {high:g}%)")
+            for key, answer, value in self.contributions(disorder, top):
+                answer = "" if answer is None else f" = {answer}"
+                lines.append(f"    {key}{answer}".ljust(32) + f"{value:+.2f} {self.units}")
+        lines.append(f"Rules: {len(self.fired)} fired of {self.evaluated} evaluated"
+                     + (f": {', '.join(self.fired)}" if self.fired else ""))
+        for rule_id, reason, diagnosis in self.suppressed:
+            why = f"requires {diagnosis}" if reason == REQUIRED_MISSING else f"blocked by {diagnosis}"
+            lines.append(f"    suppressed {rule_id}: {why}")
+        return "\n".join(lines)
+
+
+def trace_rules(rules, person_data, diagnoses):
+    """
+    Walks every compiled rule like the unindexed evaluate() path.
+    Returns (fired ids, suppressed entries, number of rules evaluated).
+    """
+    fired = []
+    suppressed = []
+    for rule in rules:
+        if not rule.predicate(person_data):
+            continue
+        if rule.required_diagnosis is not None and rule.required_diagnosis not in diagnoses:
+            suppressed.append((rule.id, REQUIRED_MISSING, rule.required_diagnosis))
+        elif rule.block_if_diagnosis is not None and rule.block_if_diagnosis in diagnoses:
+            suppressed.append((rule.id, CONTEXT_BLOCKED, rule.block_if_diagnosis))
+        else:
+            fired.append(rule.id)
+    return fired, suppressed, len(rules)
+
+
+def explain(data, coach=None, threshold=FLAG_THRESHOLD, engine=ScoringEngine):
+    """
+    Trace for one assessment. data: every answer in one mapping (or an
+    Assessment), as the engines read it. threshold: a number or a Thresholds.
+    engine: ScoringEngine or a NaiveBayesEngine (anything with explain()).
+    """
+    rule_set = (coach or JSONCoachingEngine()).refresh()
+    scores = engine.calculate_confidence(data)
+    terms = engine.explain(data)
+    disorders = {}
+    for disorder in DISORDERS:
+        if isinstance(threshold, Thresholds):
+            flag, high = threshold.flag_for(disorder), threshold.high_for(disorder)
+        else:
+            flag, high = threshold, HIGH_RISK_THRESHOLD
+        disorders[disorder] = (scores[disorder], flag, high, terms[disorder])
+    active = [d for d, (score, flag, _, _) in disorders.items() if score >= flag]
+    fired, suppressed, evaluated = trace_rules(rule_set.compiled, data, active)
+    return Trace(getattr(engine, "name", "linear"), disorders, active, fired, suppressed, evaluated,
+                 rule_set.version)
@@ -0,0 +1,272 @@
+# src/logic/whatif.py
+"""
+What-if sensitivity analysis: the smallest answer changes that would move a
+disorder across its flag / high-probability boundaries (50% / 75% unless
+configured per disorder, see thresholds.py) or change the fired advice.
+
+    analysis = analyze(symptoms, user_data)
+    analysis["boundaries"]["Insomnia"]["50.0"]["single"][0]
+    # {"changes": [{"key": "insomnia_stay", "from": 4, "to": 2}], "steps": 2, "score": 41.7}
+
+The neighbourhood of the assessment (every single-symptom change, every
+pair of symptom changes) is scored with one calculate_confidence_batch()
+call. Advice is re-evaluated once per distinct set of active diagnoses in
+that neighbourhood, and habit changes re-run only the rules whose condition
+reads the changed answer (see RuleDependencies).
+"""
+
+import itertools
+
+from src.logic.scoring import (
+    ScoringEngine, DISORDERS, SYMPTOM_KEYS, SCALE_MIN, SCALE_MAX, FLAG_THRESHOLD, HIGH_RISK_THRESHOLD,
+)
+from src.logic.coaching import JSONCoachingEngine
+from src.logic.incremental import RuleDependencies
+from src.logic.assessment import field_values
+from src.logic.thresholds import Thresholds, flag_threshold
+from src.logic.schema import USER_DATA_KEYS
+
+MAX_RESULTS = 5  # options kept per question
+
+
+def _change(key, old, new):
+    return {"key": key, "from": old, "to": new}
+
+
+class WhatIfAnalysis:
+    def __init__(self, symptoms, user_data, coach=None, threshold=FLAG_THRESHOLD,
+                 boundaries=None, max_results=MAX_RESULTS):
+        import numpy as np
+
+        self.symptoms = dict(symptoms)
+        self.user_data = dict(user_data)
+        self.coach = coach or JSONCoachingEngine()
+        self.threshold = threshold
+        # disorder -> boundaries to report; a Thresholds gives each disorder its own
+        if boundaries is not None:
+            self.boundaries = {d: tuple(boundaries) for d in DISORDERS}
+        elif isinstance(threshold, Thresholds):
+            self.boundaries = {d: (threshold.flag_for(d), threshold.high_for(d)) for d in DISORDERS}
+        else:
+            self.boundaries = {d: (threshold, HIGH_RISK_THRESHOLD) for d in DISORDERS}
+        self.max_results = max_results
+        self.rule_set = self.coach.refresh()
+        self.deps = RuleDependencies(self.rule_set)
+        self._fired_cache = {}
+
+        # --- the symptom neighbourhood, as one matrix ---
+        base = np.array([[self.symptoms[k] for k in SYMPTOM_KEYS]], dtype=float)
+        levels = np.arange(SCALE_MIN, SCALE_MAX + 1)
+        singles = [(i, int(v)) for i in range(len(SYMPTOM_KEYS)) for v in levels if v != base[0, i]]
+        doubles = [(a, b) for a, b in itertools.combinations(singles, 2) if a[0] != b[0]]
+
+        n_single, n_double = len(singles), len(doubles)
+        matrix = np.repeat(base, 1 + n_single + n_double, axis=0)
+        rows = np.arange(1, 1 + n_single)
+        matrix[rows, [i for i, _ in singles]] = [v for _, v in singles]
+        rows = np.arange(1 + n_single, 1 + n_single + n_double)
+        matrix[rows, [a[0] for a, _ in doubles]] = [a[1] for a, _ in doubles]
+        matrix[rows, [b[0] for _, b in doubles]] = [b[1] for _, b in doubles]
+
+        self.scores = ScoringEngine.calculate_confidence_batch(matrix)  # (N x 6), row 0 = as answered
+        self.singles = singles
+        self.doubles = doubles
+        self.steps = np.concatenate([
+            [0],
+            [abs(v - base[0, i]) for i, v in singles],
+            [abs(a[1] - base[0, a[0]]) + abs(b[1] - base[0, b[0]]) for a, b in doubles],
+        ])
+
+        # Which diagnoses are active in every row, as a bitmask
+        weights = 1 << np.arange(len(DISORDERS))
+        flags = [flag_threshold(threshold, d) for d in DISORDERS]
+        self.masks = ((self.scores >= np.array(flags)) * weights).sum(axis=1).astype(int)
+
+    # ============================================
+    # 1. HELPERS
+    # ============================================
+
+    def _row_changes(self, row):
+        n_single = len(self.singles)
+        if row == 0:
+            return []
+        picks = [self.singles[row - 1]] if row <= n_single else list(self.doubles[row - 1 - n_single])
+        return [_change(SYMPTOM_KEYS[i], self.symptoms[SYMPTOM_KEYS[i]], v) for i, v in picks]
+
+    def _diagnoses(self, mask):
+        return [d for i, d in enumerate(DISORDERS) if mask >> i & 1]
+
+    def _fired(self, mask, overrides=None):
+        """Fired rule ids for an active-diagnosis mask and changed habit answers."""
+        if not overrides:
+            fired = self._fired_cache.get(mask)
+            if fired is None:
+                diagnoses = self._diagnoses(mask)
+                fired = self._fired_cache[mask] = frozenset(
+                    rule.id for rule in self.rule_set.compiled
+                    if rule.predicate(self.user_data) and rule.context_met(diagnoses))
+            return fired
+
+        # Only the rules reading a changed answer can flip
+        rules = self.rule_set.compiled
+        dirty = set()
+        for key in overrides:
+            dirty.update(self.deps.by_variable.get(key, ()))
+        data = {**self.user_data, **overrides}
+        diagnoses = self._diagnoses(mask)
+        fired = set(self._fired(mask))
+        for i in dirty:
+            rule = rules[i]
+            if rule.predicate(data) and rule.context_met(diagnoses):
+                fired.add(rule.id)
+            else:
+                fired.discard(rule.id)
+        return frozenset(fired)
+
+    def _advice_delta(self, fired):
+        base = self._fired(int(self.masks[0]))
+        order = [rule.id for rule in self.rule_set.compiled]
+        return ([r for r in order if r in fired and r not in base],
+                [r for r in order if r in base and r not in fired])
+
+    # ============================================
+    # 2. DIAGNOSIS BOUNDARIES
+    # ============================================
+
+    def boundary_options(self, disorder, boundary):
+        """Single and double symptom changes that move disorder across boundary."""
+        import numpy as np
+
+        column = self.scores[:, DISORDERS.index(disorder)]
+        above = column >= boundary
+        crosses = above != above[0]
+        n_single = len(self.singles)
+
+        # A pair only counts if neither of its changes crosses on its own
+        single_cross = {change: bool(crosses[1 + k]) for k, change in enumerate(self.singles)}
+        pair_ok = np.array([not single_cross[a] and not single_cross[b] for a, b in self.doubles], dtype=bool)
+
+        def best(rows):
+            if rows.size == 0:
+                return []
+            # Fewest answer steps first, then the largest move past the boundary
+            order = np.lexsort((-np.abs(column[rows] - boundary), self.steps[rows]))
+            return [{"changes": self._row_changes(int(row)), "steps": int(self.steps[row]),
+                     "score": round(float(column[row]), 2)}
+                    for row in rows[order][:self.max_results]]
+
+        single_rows = 1 + np.flatnonzero(crosses[1:1 + n_single])
+        double_rows = 1 + n_single + np.flatnonzero(crosses[1 + n_single:] & pair_ok)
+        return {
+            "score": round(float(column[0]), 2),
+            "direction": "drop below" if above[0] else "reach",
+            "single": best(single_rows),
+            "double": best(double_rows),
+        }
+
+    # ============================================
+    # 3. ADVICE CHANGES
+    # ============================================
+
+    def _habit_singles(self):
+        for key in USER_DATA_KEYS:
+            if key not in self.user_data or key not in self.deps.by_variable:
+                continue
+            for value in field_values(key):
+                if value != self.user_data[key]:
+                    yield key, value
+
+    def advice_options(self):
+        """Single and double answer changes (symptoms or habits) that change the fired advice."""
+        import numpy as np
+
+        base_mask = int(self.masks[0])
+        base = self._fired(base_mask)
+        n_single = len(self.singles)
+        singles, doubles = [], []
+
+        # Symptom changes: advice moves only if the set of active diagnoses does
+        mask_changes = {}
+        single_mask = {change: int(self.masks[1 + k]) for k, change in enumerate(self.singles)}
+        changed_masks = {int(m) for m in np.unique(self.masks) if self._fired(int(m)) != base}
+        for row in np.flatnonzero(np.isin(self.masks, list(changed_masks))):
+            row = int(row)
+            entry = {"changes": self._row_changes(row), "steps": int(self.steps[row]),
+                     "mask": int(self.masks[row])}
+            if row <= n_single:
+                singles.append(entry)
+            elif all(single_mask[c] not in changed_masks for c in self.doubles[row - 1 - n_single]):
+                doubles.append(entry)
+        for row in range(1, 1 + n_single):
+            mask = int(self.masks[row])
+            if mask != base_mask:
+                mask_changes.setdefault(mask, []).append(row)
+
+        # Habit changes (under the current diagnoses, or a changed symptom's)
+        habit_singles = list(self._habit_singles())
+        changing = set()
+        for key, value in habit_singles:
+            fired = self._fired(base_mask, {key: value})
+            if fired != base:
+                changing.add((key, value))
+                singles.append({"changes": [_change(key, self.user_data[key], value)], "steps": 1,
+                                "fired": fired})
+        for (k1, v1), (k2, v2) in itertools.combinations(habit_singles, 2):
+            if k1 == k2 or (k1, v1) in changing or (k2, v2) in changing:
+                continue
+            if not set(self.deps.by_variable[k1]) & set(self.deps.by_variable[k2]):
+                continue  # no rule reads both, so the pair can't do more than each alone
+            fired = self._fired(base_mask, {k1: v1, k2: v2})
+            if fired != base:
+                doubles.append({"changes": [_change(k1, self.user_data[k1], v1),
+                                            _change(k2, self.user_data[k2], v2)],
+                                "steps": 2, "fired": fired})
+        for mask, rows in mask_changes.items():
+            if mask in changed_masks:
+                continue
+            for key, value in habit_singles:
+                if (key, value) in changing:
+                    continue
+                fired = self._fired(mask, {key: value})
+                if fired != base:
+                    for row in rows:
+                        doubles.append({"changes": self._row_changes(row) + [
+                            _change(key, self.user_data[key], value)],
+                            "steps": int(self.steps[row]) + 1, "fired": fired})
+
+        def finish(options):
+            options.sort(key=lambda o: o["steps"])
+            out = []
+            for option in options[:self.max_results]:
+                fired = option.pop("fired", None)
+                if fired is None:
+                    fired = self._fired(option.pop("mask"))
+                option["advice_added"], option["advice_removed"] = self._advice_delta(fired)
+                out.append(option)
+            return out
+
+        return {"single": finish(singles), "double": finish(doubles)}
+
+    # ============================================
+    # 4. FULL REPORT
+    # ============================================
+
+    def run(self, disorders=None):
+        base_scores = dict(zip(DISORDERS, self.scores[0].tolist()))
+        return {
+            "scores": base_scores,
+            "active_diagnoses": self._diagnoses(int(self.masks[0])),
+            "neighbourhood": int(self.scores.shape[0]),
+            "boundaries": {
+                disorder: {str(boundary): self.boundary_options(disorder, boundary)
+                           for boundary in self.boundaries[disorder]}
+                for disorder in (disorders or DISORDERS)
+            },
+            "advice": self.advice_options(),
+        }
+
+
+def analyze(symptoms, user_data, coach=None, threshold=FLAG_THRESHOLD, disorders=None,
+            max_results=MAX_RESULTS):
+    """What-if report for one assessment (see WhatIfAnalysis.run())."""
+    return WhatIfAnalysis(symptoms, user_data, coach, threshold, max_results=max_results).run(disorders)
@@ -0,0 +1,196 @@
+# src/metrics.py
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+def _pick(ordered, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+class LatencyWindow:
+    """
+    Keeps the last `size` latency samples (seconds) and reports percentiles.
+    Recording is O(1); percentiles sort the window on demand.
+    """
+
+    def __init__(self, size=10000):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+            self.count += 1
+
+    def percentile(self, p):
+        with self._lock:
+            ordered = sorted(self.samples)
+        return _pick(ordered, p)
+
+    def snapshot(self):
+        """Summary in milliseconds: count, p50, p90, p99, max."""
+        with self._lock:
+            ordered = sorted(self.samples)
+            count = self.count
+        return {
+            "count": count,
+            "p50_ms": round(_pick(ordered, 50) * 1000, 3),
+            "p90_ms": round(_pick(ordered, 90) * 1000, 3),
+            "p99_ms": round(_pick(ordered, 99) * 1000, 3),
+            "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+        }
+
+
+# ============================================
+# PER-STAGE REQUEST TIMING
+# ============================================
+
+# Bucket upper bounds in milliseconds (roughly log-spaced); the last is +inf
+DEFAULT_BUCKETS_MS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50,
+                      100, 250, 500, 1000, 2500, float("inf"))
+
+metrics_logger = logging.getLogger("exleep.metrics")
+
+
+def _ensure_log_handler():
+    # Emit the JSON lines to stderr even when the host app never configured logging
+    if not metrics_logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        metrics_logger.addHandler(handler)
+        metrics_logger.setLevel(logging.INFO)
+        metrics_logger.propagate = False
+
+
+class Histogram:
+    """Fixed-bucket latency histogram. O(log buckets) per observation, no sample storage."""
+
+    def __init__(self, buckets_ms=DEFAULT_BUCKETS_MS):
+        self.bounds = tuple(buckets_ms)
+        self.counts = [0] * len(self.bounds)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        ms = seconds * 1000
+        index = bisect.bisect_left(self.bounds, ms)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += ms
+            if ms > self.max:
+                self.max = ms
+
+    def percentile(self, p):
+        """Upper bound (ms) of the bucket holding the p-th percentile."""
+        with self._lock:
+            counts = list(self.counts)
+            count = self.count
+            largest = self.max
+        if not count:
+            return 0.0
+        rank = p / 100 * count
+        seen = 0
+        for bound, n in zip(self.bounds, counts):
+            seen += n
+            if seen >= rank and n:
+                return min(bound, largest)
+        return largest
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "max_ms": round(self.max, 3),
+        }
+
+
+class MetricsRegistry:
+    """Process-wide named histograms (shared by every Streamlit session)."""
+
+    def __init__(self):
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name):
+        hist = self.histograms.get(name)
+        if hist is None:
+            with self._lock:
+                hist = self.histograms.setdefault(name, Histogram())
+        return hist
+
+    def observe(self, name, seconds):
+        self.histogram(name).observe(seconds)
+
+    def snapshot(self):
+        return {name: hist.snapshot() for name, hist in sorted(self.histograms.items())}
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+
+
+REGISTRY = MetricsRegistry()
+
+
+class RequestTimer:
+    """
+    Times the stages of one request:
+
+        timer = RequestTimer("assess")
+        with timer.stage("scoring"):
+            ...
+        timer.finish()
+
+    Each stage is recorded into REGISTRY as "<prefix>.<stage>", and finish()
+    records "<prefix>.total" and optionally logs one JSON line.
+    """
+
+    def __init__(self, prefix="assess", registry=REGISTRY):
+        self.prefix = prefix
+        self.registry = registry
+        self.timings = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed
+            self.registry.observe(f"{self.prefix}.{name}", elapsed)
+
+    def finish(self, log=None):
+        total = time.perf_counter() - self.started
+        self.timings["total"] = total
+        self.registry.observe(f"{self.prefix}.total", total)
+        if log is None:
+            log = bool(os.environ.get("EXLEEP_METRICS_LOG"))
+        if log:
+            _ensure_log_handler()
+            metrics_logger.info(json.dumps({
+                "event": self.prefix,
+                "ts": round(time.time(), 3),
+                "timings_ms": self.as_ms(),
+            }))
+        return self.timings
+
+    def as_ms(self):
+        return {name: round(seconds * 1000, 3) for name, seconds in self.timings.items()}
@@ -0,0 +1,339 @@
+# src/patients.py
+"""
+Longitudinal tracking: one running summary per patient, updated as each
+weekly reassessment is recorded.
+
+Layout of a tracker directory:
+
+    trends.db       dbm key/value file: patient id -> JSON summary
+    entries.jsonl   append-only log of every recorded assessment
+
+Recording an assessment reads and rewrites only that patient's summary
+(running mean/variance, exponentially weighted level and trend, streaks
+above the flag threshold, rule firing counts and the latest change in
+fired rules), so both recording and trend queries cost the same after one
+entry or after years of entries.
+
+Summaries are flushed to trends.db at most every SYNC_INTERVAL seconds and
+on close() (the shared tracker closes at exit). On the dbm.dumb fallback a
+flush rewrites the whole index, so it costs time proportional to the number
+of patients; entries.jsonl is flushed on every write either way.
+
+    python -m src.patients DIR PATIENT_ID
+"""
+
+import argparse
+import atexit
+import dbm
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+from src.logic.scoring import DISORDERS, FLAG_THRESHOLD, get_scoring_engine
+from src.logic.thresholds import flag_threshold, get_thresholds
+
+DEFAULT_ALPHA = 0.3          # EWMA weight of the newest assessment
+TREND_EPSILON = 1.0          # points per assessment below which a trend is "stable"
+SYNC_INTERVAL = 5.0          # seconds between flushes of trends.db
+
+
+# ============================================
+# 1. RUNNING STATISTICS
+# ============================================
+
+class DisorderTrend:
+    """O(1) running statistics for one disorder's confidence scores."""
+    __slots__ = ("count", "mean", "m2", "minimum", "maximum", "last", "ewma", "ewma_delta",
+                 "streak", "longest_streak")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0          # sum of squared deviations (Welford)
+        self.minimum = None
+        self.maximum = None
+        self.last = None
+        self.ewma = None       # smoothed level
+        self.ewma_delta = 0.0  # smoothed change per assessment (negative = improving)
+        self.streak = 0        # consecutive assessments at or above the threshold
+        self.longest_streak = 0
+
+    def update(self, score, alpha=DEFAULT_ALPHA, threshold=FLAG_THRESHOLD):
+        self.count += 1
+        delta = score - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (score - self.mean)
+        self.minimum = score if self.minimum is None else min(self.minimum, score)
+        self.maximum = score if self.maximum is None else max(self.maximum, score)
+
+        if self.ewma is None:
+            self.ewma = score
+        else:
+            self.ewma_delta = alpha * (score - self.last) + (1 - alpha) * self.ewma_delta
+            self.ewma = alpha * score + (1 - alpha) * self.ewma
+        self.last = score
+
+        if score >= threshold:
+            self.streak += 1
+            self.longest_streak = max(self.longest_streak, self.streak)
+        else:
+            self.streak = 0
+
+    @property
+    def stdev(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    @property
+    def direction(self):
+        """'improving', 'worsening' or 'stable' (lower confidence is better)."""
+        if self.count < 2 or abs(self.ewma_delta) < TREND_EPSILON:
+            return "stable"
+        return "improving" if self.ewma_delta < 0 else "worsening"
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        trend = cls()
+        for name in cls.__slots__:
+            setattr(trend, name, data[name])
+        return trend
+
+    def summary(self):
+        return {
+            "assessments": self.count,
+            "last": self.last,
+            "mean": round(self.mean, 2),
+            "stdev": round(self.stdev, 2),
+            "min": self.minimum,
+            "max": self.maximum,
+            "ewma": None if self.ewma is None else round(self.ewma, 2),
+            "trend_per_assessment": round(self.ewma_delta, 2),
+            "direction": self.direction,
+            "streak_above_threshold": self.streak,
+            "longest_streak": self.longest_streak,
+        }
+
+
+class PatientTrend:
+    """Everything tracked for one patient; update() is O(disorders + fired rules)."""
+
+    def __init__(self, patient_id):
+        self.patient_id = patient_id
+        self.entries = 0
+        self.first_at = None
+        self.last_at = None
+        self.disorders = {d: DisorderTrend() for d in DISORDERS}
+        self.fired = []          # rule ids fired by the latest assessment
+        self.fired_counts = {}   # rule id -> assessments it fired in
+        self.gained = []         # rules that started firing at the latest assessment
+        self.lost = []           # rules that stopped firing at the latest assessment
+
+    def update(self, result, at, alpha=DEFAULT_ALPHA, threshold=FLAG_THRESHOLD):
+        """result: a pipeline result (scores, advice_ids, ...)."""
+        self.entries += 1
+        self.first_at = at if self.first_at is None else self.first_at
+        self.last_at = at
+        for disorder, score in result["scores"].items():
+            if score is None:
+                continue  # adaptive intake skipped its symptoms: only a range is known
+            trend = self.disorders.get(disorder)
+            if trend is None:
+                trend = self.disorders[disorder] = DisorderTrend()
+            trend.update(score, alpha, flag_threshold(threshold, disorder))
+
+        fired = list(dict.fromkeys(result.get("advice_ids", ())))
+        if self.entries > 1:
+            previous = set(self.fired)
+            current = set(fired)
+            self.gained = [rule_id for rule_id in fired if rule_id not in previous]
+            self.lost = [rule_id for rule_id in self.fired if rule_id not in current]
+        else:
+            self.gained, self.lost = list(fired), []
+        for rule_id in fired:
+            self.fired_counts[rule_id] = self.fired_counts.get(rule_id, 0) + 1
+        self.fired = fired
+
+    def to_dict(self):
+        return {
+            "patient_id": self.patient_id,
+            "entries": self.entries,
+            "first_at": self.first_at,
+            "last_at": self.last_at,
+            "disorders": {d: t.to_dict() for d, t in self.disorders.items()},
+            "fired": self.fired,
+            "fired_counts": self.fired_counts,
+            "gained": self.gained,
+            "lost": self.lost,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        patient = cls(data["patient_id"])
+        patient.entries = data["entries"]
+        patient.first_at = data["first_at"]
+        patient.last_at = data["last_at"]
+        patient.disorders = {d: DisorderTrend.from_dict(t) for d, t in data["disorders"].items()}
+        patient.fired = data["fired"]
+        patient.fired_counts = data["fired_counts"]
+        patient.gained = data["gained"]
+        patient.lost = data["lost"]
+        return patient
+
+    def summary(self):
+        return {
+            "patient_id": self.patient_id,
+            "assessments": self.entries,
+            "first_at": self.first_at,
+            "last_at": self.last_at,
+            "disorders": {d: t.summary() for d, t in self.disorders.items()},
+            "rules_fired": self.fired,
+            "rules_gained": self.gained,
+            "rules_lost": self.lost,
+            "rule_counts": self.fired_counts,
+        }
+
+
+# ============================================
+# 2. PERSISTENT TRACKER
+# ============================================
+
+class PatientTracker:
+    """
+    Records scored assessments per patient. path=None keeps everything in
+    memory (e.g. for a single session); otherwise summaries live in
+    path/trends.db and each entry is appended to path/entries.jsonl.
+    threshold: the streak cutoff, a number or a Thresholds.
+    """
+
+    def __init__(self, path=None, alpha=DEFAULT_ALPHA, threshold=FLAG_THRESHOLD, clock=time.time):
+        self.path = path
+        self.alpha = alpha
+        self.threshold = threshold
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._synced_at = time.monotonic()
+        if path is None:
+            self._db = {}
+            self._log = None
+        else:
+            os.makedirs(path, exist_ok=True)
+            self._db = dbm.open(os.path.join(path, "trends.db"), "c")
+            self._log = open(os.path.join(path, "entries.jsonl"), "a", encoding="utf-8")
+
+    def _load(self, patient_id):
+        raw = self._db.get(patient_id.encode("utf-8"))
+        return None if raw is None else PatientTrend.from_dict(json.loads(raw))
+
+    def record(self, patient_id, result, at=None):
+        """Adds one assessment result for patient_id. Returns the updated PatientTrend."""
+        if not patient_id:
+            raise ValueError("patient_id is required")
+        at = self.clock() if at is None else at
+        with self._lock:
+            patient = self._load(patient_id) or PatientTrend(patient_id)
+            patient.update(result, at, self.alpha, self.threshold)
+            if self._log is not None:
+                self._log.write(json.dumps({"patient_id": patient_id, "at": at,
+                                            "scores": result["scores"],
+                                            "advice_ids": result.get("advice_ids", [])}) + "\n")
+                self._log.flush()
+            self._db[patient_id.encode("utf-8")] = json.dumps(patient.to_dict()).encode("utf-8")
+            if time.monotonic() - self._synced_at >= SYNC_INTERVAL:
+                self._sync()
+        return patient
+
+    def _sync(self):
+        # dbm.dumb (the fallback backend) writes its index only on sync()/close()
+        sync = getattr(self._db, "sync", None)
+        if sync is not None:
+            sync()
+        self._synced_at = time.monotonic()
+
+    def sync(self):
+        """Flushes every recorded summary to trends.db."""
+        with self._lock:
+            self._sync()
+
+    def trend(self, patient_id):
+        """The patient's PatientTrend, or None if nothing was recorded yet."""
+        with self._lock:
+            return self._load(patient_id)
+
+    def __contains__(self, patient_id):
+        return patient_id.encode("utf-8") in self._db
+
+    def patients(self):
+        with self._lock:
+            return sorted(key.decode("utf-8") for key in self._db.keys())
+
+    def close(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._db.close()
+                self._log = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_shared_tracker = None
+_shared_lock = threading.Lock()
+
+
+def get_patient_tracker():
+    """Process-wide tracker at $EXLEEP_PATIENTS_DIR, or None when tracking is off."""
+    global _shared_tracker
+    path = os.environ.get("EXLEEP_PATIENTS_DIR")
+    if not path:
+        return None
+    if _shared_tracker is None or _shared_tracker.path != path:
+        with _shared_lock:
+            if _shared_tracker is None or _shared_tracker.path != path:
+                # Streaks compare the front end's scores: the configured engine's cutoffs
+                _shared_tracker = PatientTracker(path, threshold=get_thresholds(engine=get_scoring_engine().name))
+                atexit.register(_shared_tracker.close)
+    return _shared_tracker
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show a patient's longitudinal trends.")
+    parser.add_argument("path", help="tracker directory")
+    parser.add_argument("patient_id", nargs="?", help="patient to show (default: list patients)")
+    args = parser.parse_args(argv)
+
+    with PatientTracker(args.path) as tracker:
+        if args.patient_id is None:
+            for patient_id in tracker.patients():
+                print(patient_id)
+            return 0
+        patient = tracker.trend(args.patient_id)
+        if patient is None:
+            print(f"Error: no assessments recorded for {args.patient_id}")
+            return 1
+
+    summary = patient.summary()
+    print(f"{args.patient_id}: {summary['assessments']} assessments")
+    for disorder, row in summary["disorders"].items():
+        if row["last"] is None:
+            print(f"  {disorder.ljust(26)} no exact score yet (adaptive intakes)")
+            continue
+        print(f"  {disorder.ljust(26)} last {row['last']:5.1f}%  mean {row['mean']:5.1f}%  "
+              f"trend {row['trend_per_assessment']:+5.1f} ({row['direction']})  "
+              f"streak {row['streak_above_threshold']}")
+    if summary["rules_gained"] or summary["rules_lost"]:
+        print(f"  rules gained: {', '.join(summary['rules_gained']) or '-'}")
+        print(f"  rules lost:   {', '.join(summary['rules_lost']) or '-'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,368 @@
+# src/reports.py
+"""
+Assessment reports as plain text, Markdown or HTML.
+
+    python -m src.batch intake.jsonl -o reports.html     # or .md / .txt
+    render_report(result, "text")                        # one report, as a string
+
+A result is a pipeline row: {"scores", "active_diagnoses", "advice", ...},
+optionally with an "id" (or an {"id", "error"} row from the bulk runner).
+A score of None is shown as the range in "score_bounds" (adaptive intake).
+
+Reports are built from small templates compiled once into straight-line
+functions, and every repeated fragment is rendered once and reused: score
+rows per (disorder, score), flag lines per diagnosis set, advice lines per
+advice text and the advice section per set of advice. Advice severity comes from the compiled rules
+(CompiledRule.severity, classified at load time). Writing 100k reports is
+mostly dictionary lookups and file writes.
+
+Risk levels use the per-disorder cutoffs of a Thresholds (thresholds.py);
+the default is the fixed 50% / 75% bands.
+"""
+
+import html
+import string
+
+from src.logic.coaching import JSONCoachingEngine, advice_severity
+from src.logic.thresholds import DEFAULT_THRESHOLDS
+
+# Most distinct fragments a format keeps before starting over
+FRAGMENT_CACHE_SIZE = 65536
+
+
+# ============================================
+# 1. CLASSIFICATION
+# ============================================
+
+RISK_LABELS = {"high": "HIGH PROBABILITY", "moderate": "MODERATE RISK", "low": "LOW RISK"}
+
+
+def unique_advice(advice):
+    """The report's advice list: duplicates removed, sorted."""
+    return sorted(set(advice))
+
+
+def severity_table(coach=None):
+    """advice text -> severity, from the rules compiled by coach."""
+    coach = coach or JSONCoachingEngine()
+    return {rule.advice: rule.severity for rule in coach.compiled_rules}
+
+
+# ============================================
+# 2. COMPILED TEMPLATES
+# ============================================
+
+def compile_template(source, name="template"):
+    """
+    Turns "| {disorder} | {score:.1f}% |" into a function taking the fields
+    as keyword arguments (others are ignored) and returning one f-string, so
+    rendering does no template parsing.
+    """
+    pieces, fields = [], []
+    for literal, field, spec, conversion in string.Formatter().parse(source):
+        if literal:
+            pieces.append("f" + repr(literal.replace("{", "{{").replace("}", "}}")))
+        if field is None:
+            continue
+        if not field.isidentifier():
+            raise ValueError(f"{name}: template fields must be plain names, got {field!r}")
+        if field not in fields:
+            fields.append(field)
+        expression = field + (f"!{conversion}" if conversion else "") + (f":{spec}" if spec else "")
+        pieces.append("f" + repr("{" + expression + "}"))
+    body = " ".join(pieces) or "''"
+    code = f"def {name}({''.join(f + ', ' for f in fields)}**unused):\n    return {body}\n"
+    namespace = {}
+    exec(compile(code, f"<report template {name}>", "exec"), namespace)
+    return namespace[name]
+
+
+class ReportFormat:
+    """
+    One output format. Subclasses provide TEMPLATES (compiled when the
+    format is created) and may override escape(), bar() and status().
+    thresholds: a Thresholds for the risk levels (default 50% / 75%).
+    """
+    name = None
+    extension = None
+    TEMPLATES = {}
+
+    def __init__(self, severities=None, thresholds=None):
+        self.t = {key: compile_template(source, key) for key, source in self.TEMPLATES.items()}
+        self.severities = dict(severities) if severities is not None else severity_table()
+        self.thresholds = thresholds or DEFAULT_THRESHOLDS
+        self._threshold = f"{self.thresholds.flag}%" if self.thresholds.uniform else "per disorder"
+        self.rule_set = None  # set by get_format()
+        self._scores = {}
+        self._flags = {}
+        self._items = {}
+        self._advice = {}
+
+    # --- hooks ---
+    def escape(self, text):
+        return text
+
+    def bar(self, score):
+        return ""
+
+    def status(self, level):
+        return RISK_LABELS[level]
+
+    # --- cached fragments ---
+    def _score_rows(self, scores, bounds=None):
+        rows = self._scores
+        out = []
+        for disorder, score in scores.items():
+            key = (disorder, score) if score is not None else (disorder, *bounds[disorder])
+            row = rows.get(key)
+            if row is None:
+                if len(rows) >= FRAGMENT_CACHE_SIZE:
+                    rows.clear()
+                if score is not None:
+                    level = self.thresholds.level(disorder, score)
+                    row = self.t["score_row"](
+                        disorder=self.escape(disorder), bar=self.bar(score), score=score,
+                        level=level, status=self.status(level))
+                else:
+                    low, high = bounds[disorder]  # both ends are in the same band
+                    level = self.thresholds.level(disorder, low)
+                    row = self.t["score_range_row"](
+                        disorder=self.escape(disorder), bar=self.bar(low), low=low, high=high,
+                        level=level, status=self.status(level))
+                rows[key] = row
+            out.append(row)
+        return "".join(out)
+
+    def _flag_line(self, active):
+        key = tuple(active)
+        line = self._flags.get(key)
+        if line is None:
+            if len(self._flags) >= FRAGMENT_CACHE_SIZE:
+                self._flags.clear()
+            if active:
+                line = self.t["flags"](diagnoses=self.escape(", ".join(active)))
+            else:
+                line = self.t["no_flags"]()
+            self._flags[key] = line
+        return line
+
+    def _render_item(self, item):
+        """One advice line, rendered once per distinct advice text."""
+        if len(self._items) >= FRAGMENT_CACHE_SIZE:
+            self._items.clear()
+        line = self._items[item] = self.t["advice_item"](
+            severity=self.severities.get(item) or advice_severity(item), advice=self.escape(item))
+        return line
+
+    def _advice_section(self, advice):
+        key = tuple(advice)
+        section = self._advice.get(key)
+        if section is None:
+            if len(self._advice) >= FRAGMENT_CACHE_SIZE:
+                self._advice.clear()
+            items = unique_advice(advice)
+            if items:
+                rendered = self._items
+                section = "".join([rendered.get(item) or self._render_item(item) for item in items])
+            else:
+                section = self.t["no_advice"]()
+            section = self._advice[key] = self.t["advice_section"](items=section)
+        return section
+
+    # --- rendering ---
+    def document_start(self):
+        return self.t["document_start"]()
+
+    def document_end(self):
+        return self.t["document_end"]()
+
+    def render(self, result):
+        """One report as a string (no document header/footer)."""
+        report_id = result.get("id")
+        title = "" if report_id is None else self.t["title"](id=self.escape(str(report_id)))
+        if "error" in result:
+            return title + self.t["error"](error=self.escape(str(result["error"])))
+        return (self.t["report_start"](title=title, threshold=self._threshold)
+                + self._score_rows(result["scores"], result.get("score_bounds"))
+                + self.t["scores_end"]()
+                + self._flag_line(result["active_diagnoses"])
+                + self._advice_section(result["advice"])
+                + self.t["report_end"]())
+
+
+# ============================================
+# 3. FORMATS
+# ============================================
+
+_TEXT_BARS = tuple("█" * n + "░" * (20 - n) for n in range(21))
+_TEXT_STATUS = {"high": "🔴 HIGH PROBABILITY", "moderate": "🟠 MODERATE RISK", "low": "🟢 LOW RISK"}
+_RULE = "-" * 60
+_BANNER = "#################################################"
+
+
+class TextFormat(ReportFormat):
+    """The console report printed by the CLI."""
+    name = "text"
+    extension = ".txt"
+    TEMPLATES = {
+        "document_start": "",
+        "document_end": "",
+        "title": "Report: {id}\n",
+        "error": "ERROR: {error}\n",
+        "report_start": ("\n\n\n" + _BANNER + "\n              FINAL ASSESSMENT REPORT            \n" + _BANNER + "\n"
+                         "{title}\n📊 CLINICAL CONFIDENCE SCORES (Threshold: {threshold})\n" + _RULE + "\n"),
+        "score_row": "{disorder:<25} | {bar} {score:.1f}%  {status}\n",
+        "score_range_row": "{disorder:<25} | {bar} {low:.1f}-{high:.1f}%  {status}\n",
+        "scores_end": "",
+        "flags": "",
+        "no_flags": "",
+        "advice_section": "\n📋 EXPERT COACHING & RECOMMENDATIONS:\n" + _RULE + "\n{items}" + _RULE + "\n",
+        "advice_item": "   • {advice}\n",
+        "no_advice": "   ✅ Your habits look great! No specific corrective advice generated.\n",
+        "report_end": _BANNER + "\n",
+    }
+
+    def bar(self, score):
+        return _TEXT_BARS[int(score / 5)]  # 100% = 20 chars
+
+    def status(self, level):
+        return _TEXT_STATUS[level]
+
+
+class MarkdownFormat(ReportFormat):
+    name = "markdown"
+    extension = ".md"
+    TEMPLATES = {
+        "document_start": "# Sleep Assessment Reports\n\n",
+        "document_end": "",
+        "title": " {id}",
+        "error": "**Error:** {error}\n\n---\n\n",
+        "report_start": "## Assessment{title}\n\n| Disorder | Confidence | Status |\n|---|---:|---|\n",
+        "score_row": "| {disorder} | {score:.1f}% | {status} |\n",
+        "score_range_row": "| {disorder} | {low:.1f}–{high:.1f}% | {status} |\n",
+        "scores_end": "\n",
+        "flags": "⚠️ **Potential clinical flags:** {diagnoses}\n\n",
+        "no_flags": "✅ No major clinical disorders detected.\n\n",
+        "advice_section": "### Coach recommendations\n\n{items}\n",
+        "advice_item": "- **[{severity}]** {advice}\n",
+        "no_advice": "Your sleep habits are optimized! No specific corrections needed.\n",
+        "report_end": "---\n\n",
+    }
+
+    def escape(self, text):
+        return text.replace("|", "\\|")
+
+
+class HTMLFormat(ReportFormat):
+    name = "html"
+    extension = ".html"
+    TEMPLATES = {
+        "document_start": (
+            "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Sleep Assessment Reports</title>\n"
+            "<style>body{{font-family:Helvetica,sans-serif;max-width:52em;margin:auto;color:#2C3E50}}"
+            "table{{border-collapse:collapse}}td,th{{padding:2px 8px;text-align:left}}"
+            ".high{{color:#c0392b}}.moderate{{color:#d35400}}.low{{color:#27ae60}}"
+            "li.critical{{color:#c0392b}}li.warning{{color:#d35400}}</style>\n"
+            "</head><body>\n"),
+        "document_end": "</body></html>\n",
+        "title": " {id}",
+        "error": "<p class=\"error\">Error: {error}</p>\n",
+        "report_start": "<section class=\"report\">\n<h2>Assessment{title}</h2>\n<table>\n"
+                        "<tr><th>Disorder</th><th>Confidence</th><th>Status</th></tr>\n",
+        "score_row": "<tr class=\"{level}\"><td>{disorder}</td><td>{score:.1f}%</td><td>{status}</td></tr>\n",
+        "score_range_row": "<tr class=\"{level}\"><td>{disorder}</td><td>{low:.1f}–{high:.1f}%</td>"
+                           "<td>{status}</td></tr>\n",
+        "scores_end": "</table>\n",
+        "flags": "<p class=\"flags\">⚠️ Potential clinical flags: {diagnoses}</p>\n",
+        "no_flags": "<p class=\"flags\">✅ No major clinical disorders detected.</p>\n",
+        "advice_section": "<h3>Coach recommendations</h3>\n<ul>\n{items}</ul>\n",
+        "advice_item": "<li class=\"{severity}\">{advice}</li>\n",
+        "no_advice": "<li>Your sleep habits are optimized! No specific corrections needed.</li>\n",
+        "report_end": "</section>\n",
+    }
+
+    def escape(self, text):
+        return html.escape(text)
+
+
+FORMATS = {cls.name: cls for cls in (TextFormat, MarkdownFormat, HTMLFormat)}
+EXTENSIONS = {cls.extension: cls.name for cls in FORMATS.values()}
+
+
+def format_for_path(path, default=None):
+    """'html' for reports.html etc., or default for other extensions."""
+    for extension, name in EXTENSIONS.items():
+        if path and path.lower().endswith(extension):
+            return name
+    return default
+
+
+_formats = {}
+
+
+def get_format(name, coach=None, thresholds=None):
+    """Shared ReportFormat instance per (format, knowledge base, thresholds)."""
+    coach = coach or JSONCoachingEngine()
+    rule_set = coach.refresh()
+    thresholds = thresholds or DEFAULT_THRESHOLDS
+    key = (name, rule_set.path, thresholds)
+    fmt = _formats.get(key)
+    if fmt is None or fmt.rule_set is not rule_set:
+        fmt = FORMATS[name](severity_table(coach), thresholds)
+        fmt.rule_set = rule_set
+        _formats[key] = fmt
+    return fmt
+
+
+def render_report(result, fmt="text", coach=None, thresholds=None):
+    """One complete report (document header/footer included) as a string."""
+    fmt = get_format(fmt, coach, thresholds)
+    return fmt.document_start() + fmt.render(result) + fmt.document_end()
+
+
+# ============================================
+# 4. STREAMING
+# ============================================
+
+class ReportWriter:
+    """
+    Writes reports to a text stream as they arrive; the bulk runner's writer
+    interface (write(row) / close()). Reports are buffered in memory only
+    until buffer_size characters are pending.
+    """
+
+    def __init__(self, stream, fmt="html", coach=None, buffer_size=1 << 20, thresholds=None):
+        self.stream = stream
+        self.format = fmt if isinstance(fmt, ReportFormat) else FORMATS[fmt](severity_table(coach), thresholds)
+        self.buffer_size = buffer_size
+        self._pending = [self.format.document_start()]
+        self._pending_size = 0
+        self.reports = 0
+
+    def write(self, row):
+        text = self.format.render(row)
+        self._pending.append(text)
+        self._pending_size += len(text)
+        self.reports += 1
+        if self._pending_size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.stream.write("".join(self._pending))
+        self._pending.clear()
+        self._pending_size = 0
+
+    def close(self):
+        self._pending.append(self.format.document_end())
+        self.flush()
+
+
+def write_reports(results, path, fmt=None, coach=None):
+    """Streams an iterable of results to path. Returns the number of reports."""
+    fmt = fmt or format_for_path(path, "text")
+    with open(path, "w", encoding="utf-8", newline="") as stream:
+        writer = ReportWriter(stream, fmt, coach)
+        for result in results:
+            writer.write(result)
+        writer.close()
+    return writer.reports
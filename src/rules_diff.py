@@ -0,0 +1,425 @@
+# src/rules_diff.py
+"""
+Blast radius of a knowledge-base edit: replays a corpus of assessments
+through two versions of the coaching rules and reports what changes.
+
+    python -m src.rules_diff HEAD:src/data/rules.json src/data/rules.json --synthetic 1000000
+    python -m src.rules_diff old_rules.json new_rules.json intake.jsonl --workers 4 -o diff.json
+    python -m src.rules_diff old_rules.json new_rules.json history/ --fail-above 5
+
+A version is a rules file or a git revision of one (REV:path). The corpus
+is a JSONL/CSV intake file (parsed across --workers processes), an
+assessment history store directory, or N seeded synthetic assessments.
+
+Rules are matched by id. Rules whose definition is identical in both
+versions fire for exactly the same patients, so only added, removed and
+edited rules are replayed. Every answer is a 4-bit code (src/logic/
+assessment.py), so each such rule's compiled condition is evaluated once
+per combination of the codes it reads, into a lookup table, and the corpus
+is replayed with one table read per rule and column, vectorized; the
+diagnosis context comes from one batch scoring pass. --verify replays a
+sample through both JSONCoachingEngine instances, row by row, and checks
+the two agree.
+
+Reported per changed rule: patients it fires for before and after, who
+gained or lost it, patients who now see different advice text, and sample
+rows. "Patients affected" counts assessments whose advice changed at all.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.logic.scoring import DISORDERS, SYMPTOM_KEYS, get_scoring_engine
+from src.logic.coaching import JSONCoachingEngine
+from src.logic.assessment import Assessment, FIELDS, FIELD_INDEX, PackedAssessments, field_values
+from src.logic.pipeline import validate_symptoms
+from src.logic.thresholds import get_thresholds
+
+# Largest condition lookup table (product of the answer codes a condition
+# reads); conditions beyond it are evaluated row by row
+MAX_TABLE_SIZE = 1 << 20
+
+DEFAULT_SAMPLES = 3
+DEFAULT_VERIFY = 1000
+
+
+# ============================================
+# 1. LOADING
+# ============================================
+
+def resolve_version(spec, tmpdir):
+    """A rules file path, or REV:path read from git into tmpdir."""
+    if os.path.exists(spec) or ":" not in spec:
+        return os.path.abspath(spec)
+    out = subprocess.run(["git", "show", spec], capture_output=True, check=False)
+    if out.returncode:
+        raise ValueError(f"could not read {spec} from git: {out.stderr.decode().strip()}")
+    path = os.path.join(tmpdir, f"{len(os.listdir(tmpdir))}_{os.path.basename(spec.split(':', 1)[1])}")
+    with open(path, "wb") as f:
+        f.write(out.stdout)
+    return path
+
+
+def _pack_chunk(chunk):
+    """Worker: (line_no, record) pairs -> (packed bytes, line numbers, skipped count)."""
+    from src.batch import split_record
+
+    packed, lines, skipped = [], [], 0
+    for line_no, record in chunk:
+        try:
+            if isinstance(record, str):
+                record = json.loads(record)
+            _, symptoms, user_data = split_record(record)
+            validate_symptoms(symptoms)  # the diagnosis context needs every symptom
+            packed.append(Assessment.from_dicts(symptoms, user_data).packed)
+            lines.append(line_no)
+        except (ValueError, TypeError):
+            skipped += 1
+    return b"".join(packed), lines, skipped
+
+
+def read_corpus(path, input_format=None, workers=1, chunk_size=10000):
+    """
+    (PackedAssessments, row labels, records skipped) from an intake file (the
+    labels are line numbers) or a history store directory (store row numbers).
+    Off-schema records and records with unanswered symptoms are skipped.
+    """
+    if os.path.isdir(path):
+        from src.history_store import HistoryStore
+        store = HistoryStore(path, read_only=True)
+        codes = np.column_stack([np.asarray(store.field(key)) for key in FIELDS]) if len(store) else \
+            np.zeros((0, len(FIELDS)), dtype=np.uint8)
+        # Adaptive intakes leave symptoms unanswered (code 0)
+        complete = np.all(codes[:, :len(SYMPTOM_KEYS)] != 0, axis=1)
+        rows = np.nonzero(complete)[0]
+        return PackedAssessments.from_codes(codes[rows]), rows.tolist(), len(codes) - len(rows)
+
+    from src.batch import _chunked, _detect_format, read_csv, read_jsonl
+    input_format = _detect_format(path, input_format)
+    with open(path, newline="", encoding="utf-8") as stream:
+        records = read_csv(stream) if input_format == "csv" else read_jsonl(stream)
+        chunks = _chunked(records, chunk_size)
+        if workers <= 1:
+            results = [_pack_chunk(chunk) for chunk in chunks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_pack_chunk, chunks))
+    buffer = b"".join(packed for packed, _, _ in results)
+    lines = [line for _, chunk_lines, _ in results for line in chunk_lines]
+    return PackedAssessments(buffer), lines, sum(skipped for _, _, skipped in results)
+
+
+# ============================================
+# 2. RULE CHANGES
+# ============================================
+
+def _keyed(compiled):
+    """{(id, occurrence): rule}; the occurrence tells apart rules sharing an id."""
+    seen = {}
+    keyed = {}
+    for rule in compiled:
+        n = seen[rule.id] = seen.get(rule.id, 0) + 1
+        keyed[(rule.id, n)] = rule
+    return keyed
+
+
+def _label(key):
+    rule_id, n = key
+    return rule_id if n == 1 else f"{rule_id}#{n}"
+
+
+def rule_changes(old_rules, new_rules):
+    """
+    [(key, old rule or None, new rule or None, changed fields)] for every
+    added, removed or edited rule, in new-then-old knowledge-base order;
+    plus the number of unchanged rules.
+    """
+    old, new = _keyed(old_rules), _keyed(new_rules)
+    changes = []
+    unchanged = 0
+    for key in list(new) + [k for k in old if k not in new]:
+        before, after = old.get(key), new.get(key)
+        if before is not None and after is not None:
+            fields = sorted(f for f in set(before.source) | set(after.source)
+                            if before.source.get(f) != after.source.get(f))
+            if not fields:
+                unchanged += 1
+                continue
+        else:
+            fields = []
+        changes.append((key, before, after, fields))
+    return changes, unchanged
+
+
+# ============================================
+# 3. VECTORIZED REPLAY
+# ============================================
+
+def condition_mask(predicate, codes):
+    """
+    Rows of the (N x 41) code matrix where the compiled condition holds.
+    The condition is called on every combination of the answers it reads,
+    so the result is whatever the engine itself would return.
+    """
+    variables = sorted(predicate.variables())
+    known = [v for v in variables if v in FIELD_INDEX]
+    sizes = [len(field_values(v)) + 1 for v in known]  # code 0 = unanswered
+    if np.prod(sizes, dtype=np.int64) > MAX_TABLE_SIZE:
+        packed = PackedAssessments.from_codes(codes)
+        return np.fromiter((predicate(a) for a in packed), dtype=bool, count=len(packed))
+
+    decode = [(None,) + field_values(v) for v in known]
+    table = np.array([bool(predicate(dict(zip(known, (d[c] for d, c in zip(decode, combo))))))
+                      for combo in itertools.product(*(range(s) for s in sizes))], dtype=bool)
+    index = np.zeros(codes.shape[0], dtype=np.intp)
+    for var, size in zip(known, sizes):
+        index *= size
+        index += codes[:, FIELD_INDEX[var]]
+    return table[index]
+
+
+def context_mask(rule, flags):
+    """Rows whose flagged diagnoses let the rule fire (required / block)."""
+    mask = np.ones(flags.shape[0], dtype=bool)
+    for disorder, wanted in ((rule.required_diagnosis, True), (rule.block_if_diagnosis, False)):
+        if disorder is None:
+            continue
+        flagged = flags[:, DISORDERS.index(disorder)] if disorder in DISORDERS else np.zeros_like(mask)
+        mask &= flagged if wanted else ~flagged
+    return mask
+
+
+def fires(rule, codes, flags):
+    if rule is None:
+        return np.zeros(codes.shape[0], dtype=bool)
+    return condition_mask(rule.predicate, codes) & context_mask(rule, flags)
+
+
+def flag_matrix(corpus, threshold, engine):
+    """(N x 6) bool: DISORDERS flagged for every assessment, in one batch pass."""
+    scores = engine.calculate_confidence_batch(corpus)
+    cutoffs = np.array([threshold.flag_for(d) for d in DISORDERS])
+    return scores >= cutoffs
+
+
+def _sample(rows, k, rng):
+    if len(rows) <= k:
+        return rows.tolist()
+    return sorted(rng.choice(rows, size=k, replace=False).tolist())
+
+
+def replay(old_rules, new_rules, corpus, flags, samples=DEFAULT_SAMPLES, seed=0):
+    """
+    Diff report (dict) for two compiled rule lists over a PackedAssessments
+    corpus, given its flag_matrix().
+    """
+    codes = corpus.codes()
+    changes, unchanged = rule_changes(old_rules, new_rules)
+    rng = np.random.default_rng(seed)
+    affected = np.zeros(len(corpus), dtype=bool)
+    entries = []
+    for key, before, after, fields in changes:
+        old_mask, new_mask = fires(before, codes, flags), fires(after, codes, flags)
+        gained = np.flatnonzero(new_mask & ~old_mask)
+        lost = np.flatnonzero(old_mask & ~new_mask)
+        affected |= old_mask != new_mask
+        entry = {
+            "rule": _label(key),
+            "change": "added" if before is None else "removed" if after is None else "edited",
+            "fields": fields,
+            "fired_before": int(old_mask.sum()),
+            "fired_after": int(new_mask.sum()),
+            "gained": len(gained),
+            "lost": len(lost),
+            "samples": {"gained": _sample(gained, samples, rng), "lost": _sample(lost, samples, rng)},
+        }
+        if before is not None and after is not None and before.advice != after.advice:
+            reworded = old_mask & new_mask
+            entry["advice_changed"] = int(reworded.sum())
+            affected |= reworded
+        entries.append(entry)
+
+    return {
+        "rules_before": len(old_rules),
+        "rules_after": len(new_rules),
+        "unchanged": unchanged,
+        "assessments": len(corpus),
+        "patients_affected": int(affected.sum()),
+        "changes": entries,
+    }
+
+
+# ============================================
+# 4. VERIFICATION (row by row, through the engines)
+# ============================================
+
+def verify(old_file, new_file, corpus, flags, rows):
+    """
+    Replays the given rows through two JSONCoachingEngine instances, one
+    assessment at a time, and checks every rule's firing against the
+    vectorized replay. Returns a list of mismatch descriptions.
+    """
+    rows = sorted(rows)
+    old_coach, new_coach = JSONCoachingEngine(old_file), JSONCoachingEngine(new_file)
+    old_keyed, new_keyed = _keyed(old_coach.compiled_rules), _keyed(new_coach.compiled_rules)
+    subset = PackedAssessments.from_codes(corpus.codes()[rows]) if rows else corpus
+    codes, sub_flags = subset.codes(), flags[rows]
+    mismatches = []
+    for keyed, coach in ((old_keyed, old_coach), (new_keyed, new_coach)):
+        labels = {id(rule): _label(key) for key, rule in keyed.items()}
+        expected = {_label(key): fires(rule, codes, sub_flags) for key, rule in keyed.items()}
+        for i, row in enumerate(rows):
+            active = [d for d, flagged in zip(DISORDERS, sub_flags[i]) if flagged]
+            fired = {labels[id(rule)] for rule in coach.evaluate_rules(corpus[row], active)}
+            wrong = sorted(label for label, mask in expected.items() if mask[i] != (label in fired))
+            if wrong:
+                mismatches.append(f"row {row} ({coach.rules_file}): {', '.join(wrong)}")
+    return mismatches
+
+
+# ============================================
+# 5. CLI
+# ============================================
+
+def _describe_row(corpus, row, rules, flags, labels, unit="line"):
+    assessment = corpus[row]
+    variables = sorted(set().union(*(r.predicate.variables() for r in rules if r is not None)))
+    answers = ", ".join(f"{v}={assessment.get(v)}" for v in variables) or "-"
+    active = [d for d, flagged in zip(DISORDERS, flags[row]) if flagged]
+    where = f"{unit} {labels[row]}" if labels else f"row {row}"
+    return f"{where}: {answers} [{', '.join(active) or 'no flags'}]"
+
+
+def format_report(report, corpus, old_rules, new_rules, flags, labels=None, unit="line"):
+    n = report["assessments"]
+    lines = [f"Rules: {report['rules_before']} -> {report['rules_after']} "
+             f"({len(report['changes'])} changed, {report['unchanged']} unchanged)",
+             f"Replayed {n:,} assessments in {report['elapsed_s']:.2f}s"]
+    if not report["changes"]:
+        lines.append("No rule changes.")
+        return "\n".join(lines)
+    width = max(len("rule"), *(len(e["rule"]) for e in report["changes"]))
+    lines.append(f"{'rule'.ljust(width)}  {'change':<8} {'before':>10} {'after':>10} "
+                 f"{'gained':>10} {'lost':>10}  fields")
+    for e in report["changes"]:
+        lines.append(f"{e['rule'].ljust(width)}  {e['change']:<8} {e['fired_before']:>10,} "
+                     f"{e['fired_after']:>10,} {e['gained']:>10,} {e['lost']:>10,}  {', '.join(e['fields'])}"
+                     + (f" ({e['advice_changed']:,} see new wording)" if "advice_changed" in e else ""))
+    pct = report["patients_affected"] / n * 100 if n else 0.0
+    lines.append(f"Patients affected: {report['patients_affected']:,} of {n:,} ({pct:.2f}%)")
+
+    old, new = _keyed(old_rules), _keyed(new_rules)
+    by_label = {_label(k): (old.get(k), new.get(k)) for k in set(old) | set(new)}
+    for e in report["changes"]:
+        for kind in ("gained", "lost"):
+            for row in e["samples"][kind]:
+                lines.append(f"  {e['rule']} {kind}: "
+                             + _describe_row(corpus, row, by_label[e["rule"]], flags, labels, unit))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay assessments through two versions of the coaching rules.")
+    parser.add_argument("old", help="rules before the edit (file, or REV:path from git)")
+    parser.add_argument("new", help="rules after the edit (file, or REV:path from git)")
+    parser.add_argument("corpus", nargs="?", help="JSONL/CSV intake file or history store directory")
+    parser.add_argument("--input-format", choices=["jsonl", "csv"])
+    parser.add_argument("--synthetic", type=int, metavar="N", help="replay N seeded synthetic assessments instead")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processes parsing the corpus file (default: all cores)")
+    parser.add_argument("--thresholds", help="thresholds file (default: the app's)")
+    parser.add_argument("--samples", type=int, default=DEFAULT_SAMPLES, help="sample rows per rule and direction")
+    parser.add_argument("--verify", type=int, default=DEFAULT_VERIFY, metavar="N",
+                        help="also replay N random rows through both engines and check (0 = off)")
+    parser.add_argument("--fail-above", type=float, metavar="PCT",
+                        help="exit 1 when more than PCT%% of patients are affected")
+    parser.add_argument("-o", "--output", help="write the report as JSON here")
+    args = parser.parse_args(argv)
+
+    if (args.corpus is None) == (args.synthetic is None):
+        parser.error("give a corpus file or --synthetic N")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        try:
+            old_file = resolve_version(args.old, tmpdir)
+            new_file = resolve_version(args.new, tmpdir)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return 2
+        for path in (old_file, new_file):
+            if not os.path.exists(path):
+                print(f"Error: Could not find rules file at {path}")
+                return 2
+
+        t0 = time.perf_counter()
+        labels = None
+        unit = "row" if args.corpus is not None and os.path.isdir(args.corpus) else "line"
+        if args.synthetic is not None:
+            from src.synthetic import packed_corpus
+            corpus = packed_corpus(args.synthetic, args.seed)
+        else:
+            try:
+                corpus, labels, skipped = read_corpus(args.corpus, args.input_format, args.workers)
+            except (OSError, ValueError) as e:
+                print(f"Error: could not read {args.corpus}: {e}")
+                return 2
+            if skipped:
+                print(f"Skipped {skipped:,} records outside the intake schema or with unanswered symptoms",
+                      file=sys.stderr)
+        loaded = time.perf_counter() - t0
+
+        engine = get_scoring_engine()
+        threshold = get_thresholds(args.thresholds, engine.name)
+        old_rules = JSONCoachingEngine(old_file).compiled_rules
+        new_rules = JSONCoachingEngine(new_file).compiled_rules
+        t0 = time.perf_counter()
+        flags = flag_matrix(corpus, threshold, engine)
+        report = replay(old_rules, new_rules, corpus, flags, args.samples, args.seed)
+        report["elapsed_s"] = time.perf_counter() - t0
+        report["load_s"] = loaded
+        report["old"], report["new"] = args.old, args.new
+        print(format_report(report, corpus, old_rules, new_rules, flags, labels, unit))
+
+        status = 0
+        if args.verify and len(corpus):
+            # Random rows plus every reported sample
+            rng = np.random.default_rng(args.seed + 1)
+            rows = set(rng.choice(len(corpus), size=min(args.verify, len(corpus)), replace=False).tolist())
+            for entry in report["changes"]:
+                rows.update(entry["samples"]["gained"] + entry["samples"]["lost"])
+            mismatches = verify(old_file, new_file, corpus, flags, rows)
+            checked = report["verified"] = len(rows)
+            if mismatches:
+                print(f"Error: the engines disagree with the replay on {len(mismatches)} checks:")
+                print("\n".join(f"  {m}" for m in mismatches[:20]))
+                status = 1
+            else:
+                print(f"Verified {checked:,} rows against both JSONCoachingEngine versions")
+
+    if labels:
+        for entry in report["changes"]:
+            entry["samples"] = {kind: [labels[row] for row in rows] for kind, rows in entry["samples"].items()}
+        report["samples_are"] = "store rows" if unit == "row" else "line numbers"
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    pct = report["patients_affected"] / report["assessments"] * 100 if report["assessments"] else 0.0
+    if args.fail_above is not None and pct > args.fail_above:
+        print(f"{pct:.2f}% of patients affected (limit {args.fail_above:g}%)")
+        status = status or 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+# src/server.py
+"""
+Local HTTP scoring service (asyncio, standard library only).
+
+    python -m src.server --port 8000
+
+Endpoints (JSON in, JSON out):
+    POST /score    {"symptoms": {...}}                     -> {"scores": {...}}
+    POST /assess   {"symptoms": {...}, "user_data": {...}} -> scores, active_diagnoses, advice
+                   (with --tenants DIR, add "tenant": "<name>" to use DIR/<name>.json)
+    GET  /metrics  latency percentiles, batch sizes, in-flight requests
+    GET  /health
+
+Concurrent requests are collected into micro-batches and scored with one
+vectorized ScoringEngine call. Requests beyond --max-inflight are rejected
+with 503 instead of queueing without bound.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from src.logic.scoring import ScoringEngine, DISORDERS, SYMPTOM_KEYS, FLAG_THRESHOLD
+from src.logic.coaching import JSONCoachingEngine, DEFAULT_RULES_FILE
+from src.logic.pipeline import build_result, validate_symptoms
+from src.logic.tenants import TenantRegistry, DEFAULT_MEMORY_BUDGET
+from src.logic.thresholds import get_thresholds
+from src.metrics import LatencyWindow
+
+MAX_BODY_BYTES = 64 * 1024
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# ============================================
+# 1. MICRO-BATCHING
+# ============================================
+
+class MicroBatcher:
+    """
+    Queues (symptoms, user_data) items and scores them in batches of up to
+    max_batch, waiting at most max_wait seconds for a batch to fill.
+    user_data=None means score only (no coaching). Items may carry their own
+    coach and threshold (per-tenant knowledge bases). A coaching failure
+    fails only its own item.
+    """
+
+    def __init__(self, coach, max_batch=256, max_wait=0.002):
+        self.coach = coach
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, symptoms, user_data=None, coach=None, threshold=FLAG_THRESHOLD):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((symptoms, user_data, coach or self.coach, threshold, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            # Drain whatever is already queued without yielding
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            remaining = deadline - time.perf_counter()
+            if len(batch) >= self.max_batch or remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            self.batches += 1
+            self.items += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            try:
+                matrix = [[item[0][k] for k in SYMPTOM_KEYS] for item in batch]
+                rows = ScoringEngine.calculate_confidence_batch(matrix).tolist()
+                for row, (_, user_data, coach, threshold, future) in zip(rows, batch):
+                    if future.cancelled():
+                        continue
+                    scores = dict(zip(DISORDERS, row))
+                    if user_data is None:
+                        future.set_result({"scores": scores})
+                        continue
+                    try:
+                        future.set_result(build_result(scores, user_data, coach, threshold))
+                    except Exception as e:
+                        future.set_exception(e)
+            except Exception as e:
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+
+# ============================================
+# 2. SERVICE
+# ============================================
+
+class ScoringService:
+    def __init__(self, rules_file=DEFAULT_RULES_FILE, max_batch=256, max_wait=0.002,
+                 max_inflight=1024, tenants_dir=None, memory_budget=DEFAULT_MEMORY_BUDGET):
+        self.coach = JSONCoachingEngine(rules_file)
+        # Calibrated cutoffs (src/data/thresholds.json or $EXLEEP_THRESHOLDS), like the app and CLI
+        self.thresholds = get_thresholds()
+        self.tenants = None
+        if tenants_dir:
+            self.tenants = TenantRegistry(memory_budget)
+            self.tenants.register_directory(tenants_dir, default=self.thresholds)
+        self.batcher = MicroBatcher(self.coach, max_batch, max_wait)
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.rejected = 0
+        self.latency = {"/score": LatencyWindow(), "/assess": LatencyWindow()}
+        self.started = time.time()
+
+    def metrics(self):
+        batcher = self.batcher
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "inflight": self.inflight,
+            "max_inflight": self.max_inflight,
+            "rejected": self.rejected,
+            "batches": batcher.batches,
+            "avg_batch_size": round(batcher.items / batcher.batches, 2) if batcher.batches else 0.0,
+            "largest_batch": batcher.largest_batch,
+            "rules_version": self.coach.refresh().version,
+            "latency": {path: window.snapshot() for path, window in self.latency.items()},
+            **({"tenants": self.tenants.memory_report()} if self.tenants else {}),
+        }
+
+    async def handle(self, method, path, body):
+        """Returns (status, payload)."""
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/metrics":
+            return 200, self.metrics()
+        if path not in self.latency:
+            raise HTTPError(404, f"unknown path {path}")
+        if method != "POST":
+            raise HTTPError(405, f"{path} expects POST")
+
+        # Backpressure: fail fast rather than building an unbounded queue
+        if self.inflight >= self.max_inflight:
+            self.rejected += 1
+            raise HTTPError(503, "server busy, retry later")
+
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError as e:
+            raise HTTPError(400, f"invalid JSON: {e}")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "expected a JSON object")
+        symptoms = payload.get("symptoms")
+        try:
+            if not isinstance(symptoms, dict):
+                raise ValueError("'symptoms' must be an object")
+            validate_symptoms(symptoms)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        user_data = payload.get("user_data", {}) if path == "/assess" else None
+        if user_data is not None and not isinstance(user_data, dict):
+            raise HTTPError(400, "'user_data' must be an object")
+        coach, threshold = None, self.thresholds
+        tenant = payload.get("tenant")
+        if tenant is not None and user_data is not None:
+            if self.tenants is None or not isinstance(tenant, str) or tenant not in self.tenants:
+                raise HTTPError(400, f"unknown tenant {tenant!r}")
+            coach, threshold = self.tenants.engine(tenant), self.tenants.tenant(tenant).threshold
+
+        self.inflight += 1
+        started = time.perf_counter()
+        try:
+            result = await self.batcher.submit(symptoms, user_data, coach, threshold)
+        finally:
+            self.inflight -= 1
+        self.latency[path].record(time.perf_counter() - started)
+        return 200, result
+
+
+# ============================================
+# 3. MINIMAL HTTP/1.1 FRONT END
+# ============================================
+
+async def _read_request(reader):
+    """Returns (method, path, headers, body) or None when the client closed."""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    raw_length = headers.get("content-length", "") or "0"
+    if not (raw_length.isascii() and raw_length.isdigit()):  # also rejects "-1", "+5"
+        raise HTTPError(400, f"invalid Content-Length {raw_length!r}")
+    length = int(raw_length)
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target.split("?", 1)[0], headers, body
+
+
+def _write_response(writer, status, payload, keep_alive):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = (f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n")
+    if status == 503:
+        head += "Retry-After: 1\r\n"
+    writer.write(head.encode("latin-1") + b"\r\n" + body)
+
+
+async def _serve_connection(service, reader, writer):
+    try:
+        while True:
+            keep_alive = False
+            try:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                status, payload = await service.handle(method, path, body)
+            except HTTPError as e:
+                status, payload = e.status, {"error": str(e)}
+            except asyncio.IncompleteReadError:
+                break
+            except Exception as e:
+                # e.g. a rule that fails on this request's answers: answer, don't drop the socket
+                print(f"Error: request failed: {e!r}")
+                status, payload = 500, {"error": "internal error"}
+            _write_response(writer, status, payload, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host="127.0.0.1", port=8000, **service_options):
+    service = ScoringService(**service_options)
+    service.batcher.start()
+    server = await asyncio.start_server(
+        lambda r, w: _serve_connection(service, r, w), host, port)
+    print(f"Sleep Expert scoring service listening on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.batcher.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the local HTTP scoring service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--rules", default=DEFAULT_RULES_FILE, help="rules.json to use")
+    parser.add_argument("--max-batch", type=int, default=256, help="largest micro-batch")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0,
+                        help="how long a batch may wait to fill up")
+    parser.add_argument("--max-inflight", type=int, default=1024,
+                        help="requests in flight before answering 503")
+    parser.add_argument("--tenants", metavar="DIR",
+                        help="serve DIR/<name>.json as tenant <name> (select with \"tenant\" in /assess)")
+    parser.add_argument("--tenant-memory-mb", type=float, default=DEFAULT_MEMORY_BUDGET / 2**20,
+                        help="estimated memory for loaded tenants before idle ones are unloaded")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, rules_file=args.rules, max_batch=args.max_batch,
+                          max_wait=args.max_wait_ms / 1000, max_inflight=args.max_inflight,
+                          tenants_dir=args.tenants, memory_budget=int(args.tenant_memory_mb * 2**20)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
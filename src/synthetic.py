@@ -0,0 +1,99 @@
+# src/synthetic.py
+# Seeded generators for synthetic assessments and rule sets (benchmarks,
+# load tests, rule-change replays). Same seed -> same data, on every machine.
+
+import random
+
+import numpy as np
+
+from src.logic.scoring import ScoringEngine, DISORDERS, SYMPTOM_KEYS, SCALE_MIN, SCALE_MAX
+from src.logic.schema import CHOICE_FIELDS, BOOLEAN_FIELDS, USER_DATA_KEYS
+
+
+def random_symptoms(rng):
+    return {key: rng.randint(SCALE_MIN, SCALE_MAX) for key in SYMPTOM_KEYS}
+
+
+def random_user_data(rng):
+    values = {}
+    for key in USER_DATA_KEYS:
+        if key in CHOICE_FIELDS:
+            values[key] = rng.choice(CHOICE_FIELDS[key])
+        elif key in BOOLEAN_FIELDS:
+            values[key] = rng.random() < 0.5
+        else:
+            values[key] = rng.randint(SCALE_MIN, SCALE_MAX)
+    return values
+
+
+def generate_assessments(n, seed=0):
+    """Yields n (symptoms, user_data) pairs covering the full 1-5 answer space."""
+    rng = random.Random(seed)
+    for _ in range(n):
+        yield random_symptoms(rng), random_user_data(rng)
+
+
+def symptom_matrix(n, seed=0):
+    """(n x 21) int matrix of random answers, for the batch scoring path."""
+    return np.random.default_rng(seed).integers(SCALE_MIN, SCALE_MAX + 1, size=(n, len(SYMPTOM_KEYS)))
+
+
+def packed_corpus(n, seed=0):
+    """n fully answered assessments as PackedAssessments, drawn uniformly per field."""
+    from src.logic.assessment import FIELDS, PackedAssessments, field_values
+
+    rng = np.random.default_rng(seed)
+    codes = np.column_stack([rng.integers(1, len(field_values(key)) + 1, size=n, dtype=np.uint8)
+                             for key in FIELDS])
+    return PackedAssessments.from_codes(codes)
+
+
+def _random_comparison(rng):
+    key = rng.choice(USER_DATA_KEYS)
+    if key in CHOICE_FIELDS:
+        op = rng.choice(("==", "!="))
+        return f"{key} {op} '{rng.choice(CHOICE_FIELDS[key])}'"
+    if key in BOOLEAN_FIELDS:
+        return f"{key} == {rng.choice(('True', 'False'))}"
+    op = rng.choice((">=", "<=", ">", "<", "=="))
+    return f"{key} {op} {rng.randint(SCALE_MIN, SCALE_MAX)}"
+
+
+def synthetic_rules(n, seed=0, compound_ratio=0.2, gated_ratio=0.3):
+    """
+    n rule dicts in rules.json format. A share of them use compound
+    'and'/'or' conditions, and a share are gated on a diagnosis.
+    """
+    rng = random.Random(seed)
+    rules = []
+    for i in range(n):
+        condition = _random_comparison(rng)
+        if rng.random() < compound_ratio:
+            joiner = rng.choice((" and ", " or "))
+            condition = condition + joiner + _random_comparison(rng)
+        rule = {
+            "id": f"synthetic_{i}",
+            "category": "Synthetic",
+            "condition": condition,
+            "advice": f"SYNTHETIC ADVICE {i}",
+        }
+        if rng.random() < gated_ratio:
+            gate = rng.choice(("required_diagnosis", "block_if_diagnosis"))
+            rule[gate] = rng.choice(DISORDERS)
+        rules.append(rule)
+    return rules
+
+
+def labeled_matrix(n, seed=0, spread=8.0):
+    """
+    (n x 21) answers plus an (n x 6) bool matrix of "confirmed" diagnoses,
+    for calibration. Each disorder is confirmed with a logistic probability
+    of its confidence, centred somewhere in 40-65% so the best cutoff
+    differs per disorder.
+    """
+    rng = np.random.default_rng(seed)
+    matrix = rng.integers(SCALE_MIN, SCALE_MAX + 1, size=(n, len(SYMPTOM_KEYS)))
+    centres = rng.uniform(40.0, 65.0, size=len(DISORDERS))
+    scores = ScoringEngine.calculate_confidence_batch(matrix)
+    probability = 1.0 / (1.0 + np.exp(-(scores - centres) / spread))
+    return matrix, rng.random(size=scores.shape) < probability